@@ -30,14 +30,20 @@ GNU General Public License v3.0: See the LICENSE file.
 
 
 import argparse
-from collections import Counter, defaultdict
+import copy
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import itertools
+import json
 import math
-from typing import Dict, List, Set, Tuple
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterable, List, Set, Tuple, Union
 from bidict import bidict
 from AoE2ScenarioParser.aoe2_scenario import AoE2Scenario
-from AoE2ScenarioParser.objects.condition_obj import ConditionObject
-from AoE2ScenarioParser.objects.effect_obj import EffectObject
-from AoE2ScenarioParser.objects.trigger_obj import TriggerObject
 from AoE2ScenarioParser.pieces.structs.unit import UnitStruct
 from AoE2ScenarioParser.pieces.structs.changed_variable import (
     ChangedVariableStruct
@@ -48,7 +54,14 @@ from AoE2ScenarioParser.datasets import (
 from AoE2ScenarioParser.datasets.players import Player
 import event
 from event import Fight, Minigame
+import trigger_ir
+from trigger_ir import ConditionIR, EffectIR, TriggerIR
+import trigger_module
+from trigger_module import (
+    EffectBlock, ModuleCache, Placement, ResearchSlot, Symbol, TriggerModule
+)
 import util
+import util_scn
 import util_techs
 import util_triggers
 from util_triggers import ChangeVarOp, VarValComp
@@ -83,6 +96,26 @@ ALL_MINIGAMES_EVENTS = 'event-minigames.json'
 ALL_MINIGAMES_OUTPUT = 'Minigames.aoe2scenario'
 
 
+# The maximum number of built scenarios that wait to be written to files
+# when building several scenarios. Bounds the memory used by the builds.
+WRITE_QUEUE_DEPTH = 2
+
+
+# Directory in which the modules of fights are cached between builds.
+MODULE_CACHE_DIR = os.path.join(util_scn.INFLATE_CACHE_DIR, 'modules')
+
+
+# The maximum total size in bytes of the cached modules.
+MODULE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+# A suggested maximum number of triggers that a trigger activates at once.
+# With --activation-batch, the activations of a trigger that activates
+# more are spread over chained batch triggers, one batch per game tick,
+# see ScnData._add_activation_batches. Batching is off by default.
+ACTIVATION_BATCH_SIZE = 64
+
+
 # String names of all minigames.
 MINIGAME_NAMES = (
     'Steal the Bacon',
@@ -107,8 +140,17 @@ INDIVIDUAL_MINIGAME_EVENTS = {
 NUM_VARIABLES = 256
 
 
+# The number of trigger groups that a round can kill with a single effect.
+KILL_SWITCH_COUNT = 8
+
+
+# The variable of each kill switch, see ScnData._add_trigger_group.
+KILL_SWITCH_VARIABLES = [f'kill-switch-{k}' for k in range(KILL_SWITCH_COUNT)]
+
+
 # Initial variables for keeping track of player scores and round progress,
-# stored as (variable-name, initial-value) pairs.
+# and the kill switch variables, stored as (variable-name, initial-value)
+# pairs.
 INITIAL_VARIABLES = [
     ('p1-score', 0),
     ('p2-score', 0),
@@ -116,19 +158,46 @@ INITIAL_VARIABLES = [
     ('p1-wins', 0),
     ('p2-wins', 0),
     ('round', 0),
-    ('p1-boar', 0),
-    ('p2-boar', 0),
-    ('p1-battlefield-points', 0),
-    ('p2-battlefield-points', 0),
-    ('p1-most-relics', 0),
-    ('p2-most-relics', 0),
-    ('p1-castle-constructed', 0),
-    ('p2-castle-constructed', 0),
-    ('p1-castle-destroyed', 0),
-    ('p2-castle-destroyed', 0),
-    ('p1-hero-killed', 0),
-    ('p2-hero-killed', 0)
-]
+] + [(name, 0) for name in KILL_SWITCH_VARIABLES]
+
+
+# Maps a minigame name to the variables used only in its round, stored as
+# (variable-name, initial-value) pairs. The variables of rounds that are
+# not played at the same time share the same variable slots, and are set
+# to their initial values when their round is initialized.
+MINIGAME_VARIABLES = {
+    'Steal the Bacon': [('p1-boar', 0), ('p2-boar', 0)],
+    'Tower Battlefield': [
+        ('p1-battlefield-points', 0), ('p2-battlefield-points', 0)
+    ],
+    'Capture the Relic': [
+        ('p1-most-relics', 0), ('p2-most-relics', 0),
+        ('p1-relics', 0), ('p2-relics', 0), ('relics-captured', 0),
+        ('p1-relic-points', 0), ('p2-relic-points', 0)
+    ],
+    'DauT Castle': [
+        ('p1-castle-constructed', 0), ('p2-castle-constructed', 0)
+    ],
+    'Castle Siege': [
+        ('p1-castle-destroyed', 0), ('p2-castle-destroyed', 0)
+    ],
+    'Regicide': [('p1-hero-killed', 0), ('p2-hero-killed', 0)],
+}
+
+
+# Format of the scenario name of the kth shared slot of minigame variables.
+MINIGAME_VARIABLE_NAME = 'minigame-{}'
+
+
+# A trigger that deactivates more than this number of triggers of its
+# round deactivates them with kill switches instead.
+KILL_SWITCH_THRESHOLD = 32
+
+
+# Variables of the shared fight engine, stored as (variable-name,
+# initial-value) pairs. A fight sets them to the bonus points each player
+# earns for winning it, see ScnData._add_fight_engine.
+FIGHT_BONUS_VARIABLES = [('p1-fight-bonus', 0), ('p2-fight-bonus', 0)]
 
 
 # The number of seconds to wait between launching the scenario and
@@ -197,11 +266,20 @@ ROUND_OBJ_NAME = '[O] Round Objective Header'
 TIEBREAKER_OBJ_NAME = '[O] Tiebreaker'
 
 
+# Name of the shared fight engine's trigger for cleaning up a fight.
+FIGHT_CLEANUP_NAME = '[F] Cleanup Fight'
+
+
+# Name of the shared fight engine's trigger for changing the round.
+FIGHT_INC_NAME = '[F] Increment Round'
+
+
 # Unit ID for a Map Revealer object.
 UNIT_ID_MAP_REVEALER = 837
 
 
-# Trigger name for hiding map revealers for center fights.
+# Prefix of the names of the triggers for hiding the map revealers of a
+# region, see revealer_hide_name.
 REVEALER_HIDE_NAME = '[I] Hide Map Revealers'
 
 
@@ -322,9 +400,16 @@ RELIC_POSITIONS = {(28, 125), (35, 132), (48, 112)}
 
 
 # The number of relics captured at the end of a round of Capture the Relic.
+# The units of round k are copied from the rows from 10 * (k - 1) to 10 * k
+# of the arena template.
 ROUND_RELICS = {1: 3, 2: 6, 3: 9}
 
 
+# The technologies researched at the beginning of a round of Capture the
+# Relic, for the rounds that research technologies.
+ROUND_RELIC_TECHS = {1: ['atonement'], 2: ['sanctity', 'redemption']}
+
+
 # Unit ID of Flag A.
 FLAG_A_UCONST = 600
 
@@ -354,6 +439,28 @@ REGICIDE_DEFAULT_BUFF = False
 # REGICIDE_DEFAULT_BUFF = True
 
 
+# Maps each Regicide hero to the name used for it in output file names.
+REGICIDE_HERO_NAMES = {
+    units.king: 'King',
+    UCONST_JOAN_OF_ARC: 'Joan',
+    UCONST_GENGHIS_KHAN: 'Khan',
+}
+
+
+# Maps the name of a minigame to the (x1, y1, x2, y2) corners of the
+# quadrant of the template map that contains the minigame's units.
+MINIGAME_AREAS = {
+    'Steal the Bacon': (160.0, 80.0, 240.0, 160.0),
+    'Tower Battlefield': (160.0, 160.0, 240.0, 240.0),
+    'Galley Micro': (80.0, 160.0, 160.0, 240.0),
+    'Xbow Timer': (0.0, 160.0, 80.0, 240.0),
+    'Capture the Relic': (0.0, 80.0, 80.0, 160.0),
+    'DauT Castle': (0.0, 0.0, 80.0, 80.0),
+    'Castle Siege': (80.0, 0.0, 160.0, 80.0),
+    'Regicide': (160.0, 0.0, 240.0, 80.0),
+}
+
+
 # Center positions of minigames to be used when changing the view.
 MINIGAME_CENTERS = {
     'Steal the Bacon': (200, 120),
@@ -383,6 +490,34 @@ def map_revealer_pos(pos: Tuple[int, int]) -> List[Tuple[int, int]]:
             for b in range(y - 27, y + 28, 3)]
 
 
+def map_revealer_area(pos: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Returns the minimum x, minimum y, maximum x, and maximum y tile
+    coordinates of the area containing the map revealer locations centered
+    around pos.
+    """
+    locations = map_revealer_pos(pos)
+    return (min(x for x, _ in locations), min(y for _, y in locations),
+            max(x for x, _ in locations), max(y for _, y in locations))
+
+
+def event_center(e) -> Tuple[int, int]:
+    """
+    Returns the tile at the center of the area of the map in which the
+    event e takes place, where its map revealers are created.
+    """
+    return (MINIGAME_CENTERS[e.name] if isinstance(e, Minigame)
+            else (FIGHT_CENTER_X, FIGHT_CENTER_Y))
+
+
+def revealer_hide_name(pos: Tuple[int, int]) -> str:
+    """
+    Returns the name of the trigger that hides the map revealers
+    centered around pos.
+    """
+    return f'{REVEALER_HIDE_NAME} at {pos}'
+
+
 def _tb_hold_flag_name(index: int, player: int, flag: str) -> str:
     """
     Returns the name of the trigger of tower battlefields in
@@ -405,6 +540,140 @@ def _tb_defeated_name(index: int, player: int, enemy_points: int) -> str:
     return f'[R{index}] Player {player} Defeated with {enemy_points} P2 Points Scored' # pylint: disable=line-too-long
 
 
+def _fight_wins_name(player: int) -> str:
+    """
+    Returns the name of the shared fight engine's trigger for the player
+    winning a fight. player is 1 or 2.
+    """
+    return f'[F] Player {player} Wins Fight'
+
+
+def _fight_bonus_name(player: int, pts: int) -> str:
+    """
+    Returns the name of the shared fight engine's trigger that awards pts
+    of the bonus points of the player winning a fight.
+    """
+    return f'[F] P{player} Bonus {pts}'
+
+
+def _fight_kill_name(player: int, unit_name: str, pts: int, k: int) -> str:
+    """
+    Returns the name of the shared fight engine's trigger that scores the
+    death of the player's unit_name, worth pts points, when fewer than
+    k + 1 remain.
+    """
+    return (f'[F] P{player} {util.pretty_print_name(unit_name)} {k}'
+            + f' ({pts} Points)')
+
+
+def _fight_end_name(index: int) -> str:
+    """
+    Returns the name of the shared fight engine's trigger that ends the
+    fight at index with the effects that depend on the fight's placement.
+    """
+    return f'[F] End Fight {index}'
+
+
+# Formats of the prefixes of the names of a round's triggers, and of the
+# objective triggers it refers to, that contain the round's index.
+_ROUND_NAME_FORMATS = (
+    '[R{}] ', '[O] Round {} ', '[O] Fight {} ',
+    '-- Minigame {} --', '-- Fight {} --',
+)
+
+
+def _relocate_name(name: str, old: int, new: int) -> str:
+    """
+    Returns the name of a trigger of the round at index old, or of a
+    trigger to which the round refers, renamed for the round at index new.
+    Names that do not contain the round's index are returned unchanged.
+    """
+    if old == new:
+        return name
+    for fmt in _ROUND_NAME_FORMATS:
+        prefix = fmt.format(old)
+        if name.startswith(prefix):
+            return fmt.format(new) + name[len(prefix):]
+    return name
+
+
+# Matches the number of player 1 or 2 in the name of a trigger.
+_PLAYER_NAME_PATTERN = re.compile(r'\b(P|Player )([12])\b')
+
+
+def _swap_player_names(name: str) -> str:
+    """
+    Returns the name of a trigger with the numbers of players 1 and 2
+    swapped, e.g. '[R3] P1 Archer 0' becomes '[R3] P2 Archer 0'.
+    """
+    return _PLAYER_NAME_PATTERN.sub(
+        lambda m: m.group(1) + ('2' if m.group(2) == '1' else '1'), name)
+
+
+def _name_player(name: str) -> int:
+    """
+    Returns the number of the player in the name of a trigger, or 0 if
+    the name does not contain a player's number.
+    """
+    match = _PLAYER_NAME_PATTERN.search(name)
+    return int(match.group(2)) if match else 0
+
+
+def _ctr_rounds_text(round_relics: Dict[int, int]) -> str:
+    """
+    Returns a sentence that describes the rounds of Capture the Relic and
+    the number of relics to capture in each, where round_relics maps each
+    round to the number of relics captured by its end, as ROUND_RELICS.
+    """
+    totals = [round_relics[k] for k in sorted(round_relics)]
+    counts = [b - a for a, b in zip([0] + totals, totals)]
+    relics = 'relic' if counts[-1] == 1 else 'relics'
+    if len(counts) == 1:
+        return f'There is 1 round, with {counts[0]} {relics} to capture.'
+    if len(set(counts)) == 1:
+        return (f'There are {len(counts)} rounds, each with {counts[0]}'
+                + f' {relics} to capture.')
+    listed = ', '.join(str(c) for c in counts[:-1])
+    return (f'There are {len(counts)} rounds, with {listed} and'
+            + f' {counts[-1]} {relics} to capture.')
+
+
+def _player_order(players: List[int], bounds: Iterable[int] = ()) -> List[int]:
+    """
+    Returns the indices of players, a list of the player numbers of a
+    sequence of triggers or effects, in the order in which the sequence
+    is reordered so that each segment of consecutive items of player 2
+    that is directly followed by a segment of player 1 comes after it.
+    The player number 0 is for items of neither player. Segments do not
+    cross the indices in bounds.
+
+    Rounds add the items of both players in pairs of segments, first for
+    player 1 and then for player 2. This order restores the pairs after
+    the players of the items are swapped.
+    """
+    bounds = set(bounds)
+    # (player, indices) pairs of the segments.
+    segments: List[Tuple[int, List[int]]] = []
+    for k, player in enumerate(players):
+        if segments and segments[-1][0] == player and k not in bounds:
+            segments[-1][1].append(k)
+        else:
+            segments.append((player, [k]))
+    order = []
+    k = 0
+    while k < len(segments):
+        player, indices = segments[k]
+        if (player == Player.TWO.value and k + 1 < len(segments)
+                and segments[k + 1][0] == Player.ONE.value
+                and segments[k + 1][1][0] not in bounds):
+            order += segments[k + 1][1] + indices
+            k += 2
+        else:
+            order += indices
+            k += 1
+    return order
+
+
 class _TriggerNames:
     """An instance represents the names of triggers for a specific index."""
 
@@ -477,11 +746,15 @@ class _RoundTriggers:
 
     # TODO figure out how to use ScnData as a type annotation for scn,
     # even though the class hasn't been created yet (gets a red line in pylint)
-    def __init__(self, scn_data, index: int):
+    def __init__(self, scn_data, index: int, shared_end: bool = False):
         """
         Initializes a base set of triggers in the scenario data
         for the given index.
 
+        If shared_end is True, only the init and begin triggers are added,
+        and the round is ended by the triggers of the shared fight engine.
+        The other triggers are then None.
+
         Raises a ValueError if index is negative.
         """
         if index < 0:
@@ -494,12 +767,12 @@ class _RoundTriggers:
         self._init = self._scn._add_trigger(self.names.init)
         if index:
             init_var = self._init.add_condition(conditions.variable_value)
-            init_var.amount_or_quantity = index
+            init_var.amount_or_quantity = Symbol.ROUND_INDEX
             init_var.variable = self._scn._var_ids['round']
             init_var.comparison = VarValComp.equal.value
             # Begins displaying the objective Round 1/n in round 1.
-            if index == 1:
-                self._scn._add_activate(self.names.init, ROUND_OBJ_NAME)
+            self._scn._add_activate(self.names.init, ROUND_OBJ_NAME,
+                                    Placement.FIRST_ROUND)
             # Displays the round objectives.
             obj_names = self._scn._round_objectives[index]
             for obj_name in obj_names:
@@ -510,19 +783,29 @@ class _RoundTriggers:
             self._init.enabled = False
             self._scn._add_activate(self.names.init, TIEBREAKER_OBJ_NAME)
 
+        # Resets the minigame's variables, whose slots are shared with
+        # the variables of other rounds.
+        e = self._scn._events[index]
+        if isinstance(e, Minigame):
+            for name, value in MINIGAME_VARIABLES.get(e.name, ()):
+                reset_var = self._init.add_effect(effects.change_variable)
+                reset_var.quantity = value
+                reset_var.operation = ChangeVarOp.set_op.value
+                reset_var.from_variable = self._scn._var_ids[name]
+                reset_var.message = name
+
         # Turns on the middle fight map revealers if the current
         # index is a fight and the revealers are currently off, that is,
         # if fight is the very first event or the previous event was
         # a minigame, or if the event is a minigame (which can't be repeated).
-        e = self._scn._events[index]
-        prev = self._scn._events[index - 1]
-        center_pos = (MINIGAME_CENTERS[e.name]
-                      if isinstance(e, Minigame)
-                      else (FIGHT_CENTER_X, FIGHT_CENTER_Y))
-        if (isinstance(e, Minigame)
-                or isinstance(e, Fight)
-                and (index == 1 or isinstance(prev, Minigame))):
+        center_pos = event_center(e)
+        if isinstance(e, Minigame):
             self._scn._add_revealers(self.init, center_pos)
+        else:
+            self._scn._add_revealers(
+                self._scn._add_effect_block(self.init,
+                                            Placement.AFTER_MINIGAME),
+                center_pos)
 
         for p in (Player.ONE, Player.TWO):
             change_view = self._init.add_effect(effects.change_view)
@@ -537,6 +820,11 @@ class _RoundTriggers:
         self._begin.enabled = False
         util_triggers.add_cond_timer(self._begin, DELAY_ROUND_BEFORE)
 
+        if shared_end:
+            self._p1_wins = self._p2_wins = None
+            self._cleanup = self._inc = None
+            return
+
         self._p1_wins = self._scn._add_trigger(self.names.p1_wins)
         self._p1_wins.enabled = False
         self._scn._add_activate(self.names.p1_wins, self.names.cleanup)
@@ -549,14 +837,15 @@ class _RoundTriggers:
         util_triggers.add_cond_timer(self._cleanup, DELAY_CLEANUP)
         self._scn._add_activate(self.names.cleanup, self.names.inc)
         # Disables the Round N/N counter for the final round.
-        if index == self._scn.num_rounds:
-            self._scn._add_deactivate(self.names.cleanup, ROUND_OBJ_NAME)
+        self._scn._add_deactivate(self.names.cleanup, ROUND_OBJ_NAME,
+                                  Placement.LAST_ROUND)
 
-        if ((isinstance(e, Fight)
-             and index != self._scn.num_rounds
-             and isinstance(self._scn._events[index + 1], Minigame)
-            ) or isinstance(e, Minigame)):
-            self._scn._add_activate(self.names.cleanup, REVEALER_HIDE_NAME)
+        hide_name = revealer_hide_name(center_pos)
+        if isinstance(e, Minigame):
+            self._scn._add_activate(self.names.cleanup, hide_name)
+        else:
+            self._scn._add_activate(self.names.cleanup, hide_name,
+                                    Placement.BEFORE_MINIGAME)
 
         # Deactivates round-specific objectives
         obj_names = self._scn._round_objectives[index]
@@ -623,6 +912,36 @@ class _RoundTriggers:
         return f'Triggers for round {self.index}.'
 
 
+class BuildOptions:
+    """An instance represents the options with which a scenario is built."""
+
+    def __init__(self, activation_batch: int = None,
+                 shared_fights: bool = False,
+                 compact_objectives: bool = False):
+        """
+        Initializes new build options.
+
+        Arguments:
+            activation_batch: The maximum number of triggers that a trigger
+                activates at once, or None for no maximum. The other
+                activations are made by batch triggers in the following
+                game ticks, see ScnData._add_activation_batches.
+            shared_fights: True to end the fights other than the
+                tiebreaker with the triggers of a shared fight engine,
+                rather than with triggers of their own, see
+                ScnData._add_fight_engine. The engine has a fixed cost of
+                about 530 triggers, so it pays off only for long lists of
+                fights. With the 10 fights of events.json it saves only
+                37 triggers, and the scenario file grows.
+            compact_objectives: True to keep the objective triggers that
+                are checked every tick for the whole match to a minimum,
+                see ScnData._add_objectives.
+        """
+        self.activation_batch = activation_batch
+        self.shared_fights = shared_fights
+        self.compact_objectives = compact_objectives
+
+
 class ScnData:
     """
     An instance represents data to mutate while processing a scenario.
@@ -632,22 +951,68 @@ class ScnData:
     2. Pass the parsed data to the initializer to create a ScnData object.
     3. Call the setup_scenario method.
     4. Call the write_to_file method.
+
+    To build several variants from the same inputs, call
+    setup_shared_stages once, then call setup_rounds on a checkpoint
+    of the ScnData object for each variant.
+
+    Each round is built as a TriggerModule and then linked into the
+    scenario. Scenarios built from the same templates can share their
+    modules, so a round that is in several scenarios is built only once.
     """
 
     # TODO annotate the type of the events list
-    def __init__(self, scn: AoE2Scenario, events, xbow_scn: AoE2Scenario,
-                 arena: AoE2Scenario, regicide_hero=REGICIDE_DEFAULT_HERO,
-                 regicide_buff=REGICIDE_DEFAULT_BUFF):
-        """Initializes a new ScnData object for the scenario scn."""
+    def __init__(self, scn: AoE2Scenario, events,
+                 xbow_scn: util_scn.UnitScenario,
+                 arena: util_scn.UnitScenario,
+                 regicide_hero=REGICIDE_DEFAULT_HERO,
+                 regicide_buff=REGICIDE_DEFAULT_BUFF,
+                 executor: Executor = None,
+                 modules: Dict[tuple, TriggerModule] = None,
+                 cache: ModuleCache = None,
+                 options: BuildOptions = None):
+        """
+        Initializes a new ScnData object for the scenario scn.
+        Each round's triggers are serialized by executor while the next
+        round is set up, or in this process if executor is None.
+
+        If modules is not None, it maps the keys of rounds to their built
+        modules. Rounds with a module in modules are linked from it
+        rather than built, and the modules of the other rounds are added
+        to it. The modules must come from scenarios built from the same
+        scenario, Xbow Timer, and arena templates as scn.
+
+        If cache is not None, the modules of fights are read from cache
+        rather than built, and the fights that are built are added to it.
+
+        The scenario is built with the given options, or with the
+        default BuildOptions if options is None.
+        """
         self._scn = scn
         self._events = events
 
         # Bidirectional map from a trigger's name to its index.
         self._trigger_ids = bidict()
 
-        # Bidirectional map from a variable's name to its index.
+        # Triggers that have not yet been lowered and flushed, in id order.
+        self._new_triggers: List[TriggerIR] = []
+
+        # Serializes the triggers of each round once the round is finished.
+        self._triggers = util_scn.TriggerStream(scn, executor)
+
+        # Bidirectional map from a variable's name to its index. Holds the
+        # variables of the whole scenario and of the round being set up.
         self._var_ids = bidict()
 
+        # self._round_var_ids[k] maps the name of each minigame variable
+        # of round k to its index.
+        self._round_var_ids: List[Dict[str, int]] = [
+            {} for __ in range(len(self._events))
+        ]
+
+        # Maps the index of each variable slot in the scenario to its name.
+        self._var_names: Dict[int, str] = {}
+
         # Maps the name of a trigger t to a set of triggers that t activates.
         self._activate_triggers: Dict[str, Set[str]] = defaultdict(set)
 
@@ -660,6 +1025,11 @@ class ScnData:
             [] for __ in range(len(self._events))
         ]
 
+        # Maps the name of each trigger with a condition that is never true
+        # to the trigger. These triggers are checked every tick while they
+        # are enabled, see _add_display_condition.
+        self._polling_triggers: Dict[str, TriggerIR] = {}
+
         # The set of technologies researched by the currently added triggers.
         self._researched_techs = set()
 
@@ -667,12 +1037,40 @@ class ScnData:
         # Also maps 'Fight' to the create fight map revealer trigger name.
         self._revealers = dict()
 
+        # Maps a player to the list of units that are replaced by triggers
+        # in the current round and still need to be removed from the
+        # scenario's units. Flushed in a single pass after each round.
+        self._removed_units: Dict[Player, List[UnitStruct]] = defaultdict(list)
+
         # Scenario for the Xbow Timer template units.
         self._xbow_scn = xbow_scn
 
         # Scenario for the arena template units.
         self._arena = arena
 
+        # Index of the next round to set up.
+        self._next_round = 0
+
+        # Maps the key of a round to its module, shared between scenarios.
+        self._modules = modules
+
+        # The module of the round currently being built, or None.
+        self._module: TriggerModule = None
+
+        # Persistent cache of the modules of fights, or None.
+        self._cache = cache
+
+        # The module of the last round that is set up, or None.
+        self._previous_module: TriggerModule = None
+
+        # The options with which the scenario is built.
+        self._options = options if options is not None else BuildOptions()
+
+        # Maps the name of each trigger group of the round that is being
+        # linked to the id of its kill switch variable and the name of the
+        # trigger that deactivates its looping members, or None.
+        self._trigger_groups: Dict[str, Tuple[int, str]] = {}
+
         # Hero unit to use for the Regicide minigame.
         self._regicide_hero = regicide_hero
 
@@ -689,30 +1087,147 @@ class ScnData:
         Modifies the internal scenario file to support the changes
         for Micro Wars!
         """
+        self.setup_shared_stages()
+        self.setup_rounds()
+
+    def setup_shared_stages(self):
+        """
+        Runs the setup stages that come before the rounds: clearing unused
+        units, naming variables, and adding the initial triggers.
+
+        These stages depend only on the scenario template and the events,
+        so variants built from the same inputs can continue from a
+        checkpoint taken after them.
+        """
         self._clear_unused_units()
         self._name_variables()
         self._add_initial_triggers()
-        self._setup_rounds()
-        self._add_activate_and_deactivate_effects()
+        if self._options.shared_fights:
+            self._add_fight_engine()
+
+    def setup_rounds(self, stop: int = None):
+        """
+        Adds the triggers for each round that is not yet set up, stopping
+        before the round with index stop, or after the last round if stop
+        is None. Must be called after setup_shared_stages.
+        """
+        self._setup_rounds(stop)
+        self._flush_triggers()
 
-    def write_to_file(self, file_path):
+    @property
+    def regicide_index(self) -> int:
+        """
+        Returns the index of the Regicide round, or None if there is no
+        Regicide round.
         """
-        Writes the current scn file to `file_path`.
+        for index, e in enumerate(self._events):
+            if isinstance(e, Minigame) and e.name == 'Regicide':
+                return index
+        return None
 
-        Overwrites any file currently at that path.
+    def set_regicide(self, hero: int, buff: bool) -> None:
+        """
+        Sets the hero and whether to buff the hero for the Regicide round.
+        Raises a ValueError if the Regicide round is already set up.
+        """
+        index = self.regicide_index
+        if index is not None and index < self._next_round:
+            raise ValueError('The Regicide round is already set up.')
+        self._regicide_hero = hero
+        self._regicide_buff = buff
+
+    def checkpoint(self) -> 'ScnData':
+        """
+        Returns a copy of this ScnData whose setup can be continued
+        independently of this one.
+
+        The parts of the scenario that are never modified, as well as the
+        xbow and arena templates, the modules, and the module cache, are
+        shared by the copy, not copied.
+        """
+        memo = util_scn.read_only_memo(self._scn)
+        for shared in (self._xbow_scn, self._arena, self._modules,
+                       self._cache, self._previous_module):
+            memo[id(shared)] = shared
+        return copy.deepcopy(self, memo)
+
+    @property
+    def num_variables(self) -> int:
+        """
+        Returns the number of variable slots used by the scenario, at most
+        NUM_VARIABLES.
+        """
+        return len(self._var_names)
+
+    def _round_polling_triggers(self, index: int) -> Set[str]:
+        """
+        Returns the set of names of the triggers with a condition that is
+        never true that are enabled while the round at index is played.
+        """
+        header = ROUND_OBJ_NAME if index else TIEBREAKER_OBJ_NAME
+        displayed = {header, *self._round_objectives[index]}
+        return {name for name, trigger in self._polling_triggers.items()
+                if trigger.enabled or name in displayed}
+
+    @property
+    def num_polling_triggers(self) -> int:
+        """
+        Returns the number of triggers with a condition that is never true
+        that are enabled from the start of the scenario. Each of these
+        triggers is checked every tick for the whole match.
+        """
+        return sum(1 for trigger in self._polling_triggers.values()
+                   if trigger.enabled)
+
+    @property
+    def max_round_polling_triggers(self) -> int:
         """
-        self._scn.write_to_file(file_path)
+        Returns the greatest number of triggers with a condition that is
+        never true that are enabled at once during a single round.
+        """
+        return max(len(self._round_polling_triggers(index))
+                   for index in range(len(self._events)))
+
+    def write_to_file(self, file_path: str, compression: str = 'max'):
+        """
+        Writes the current scn file to `file_path`, compressed with the
+        level named by `compression` (a key of util_scn.COMPRESSION_LEVELS).
+        Prints the size of the file, the time taken to write it, the
+        number of variable slots it uses, and the number of triggers that
+        are checked every tick only to display an objective.
 
-    def _add_trigger(self, name: str):
+        Overwrites any file currently at that path.
+        """
+        start = time.perf_counter()
+        size = util_scn.write_scenario(self._scn, file_path, compression,
+                                       self._triggers)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote '{file_path}': {size} bytes in {elapsed:.2f} s"
+              + f' ({compression} compression),'
+              + f' {self.num_variables}/{NUM_VARIABLES} variables,'
+              + f' {self.num_polling_triggers} always-polling triggers'
+              + f' (at most {self.max_round_polling_triggers} in a round).')
+
+    def _add_trigger(self, name: str, source: TriggerIR = None):
         """
         Adds a trigger named name to the scenario and trigger_ids bidict.
+        While a round is built, the trigger is added to the round's module
+        instead. If source is not None, the trigger has the same attributes
+        as source, other than its name, id, conditions, and effects.
         Raises a ValueError if a trigger with that name already exists.
         Returns the created trigger object.
         """
+        if self._module is not None:
+            assert source is None
+            return self._module.add_trigger(name)
         if name in self._trigger_ids:
             raise ValueError(f'{name} is already the name of a trigger.')
-        self._trigger_ids[name] = len(self._trigger_ids)
-        return self._scn.object_manager.trigger_manager.add_trigger(name)
+        trigger_id = len(self._trigger_ids)
+        self._trigger_ids[name] = trigger_id
+        trigger = (TriggerIR(name, trigger_id) if source is None
+                   else source.copy(name, trigger_id))
+        self._new_triggers.append(trigger)
+        return trigger
 
     def _add_trigger_header(self, name: str) -> None:
         """
@@ -729,47 +1244,338 @@ class ScnData:
         header = self._add_trigger(header_name)
         header.enabled = False
 
-    def _add_activate(self, name_source: str, name_target: str):
+    def _add_effect_block(self, trigger: TriggerIR,
+                          placement: Placement) -> EffectBlock:
+        """
+        Returns a block of effects to append to trigger, which are linked
+        only if placement holds. Must be called while a round is built.
+        """
+        if self._module is None:
+            raise ValueError('Effect blocks can only be added to rounds.')
+        return self._module.add_block(trigger, placement)
+
+    def _check_not_flushed(self, name: str) -> None:
+        """Raises a ValueError if the trigger named name has been flushed."""
+        trigger_id = self._trigger_ids.get(name)
+        if trigger_id is not None and trigger_id < self._triggers.watermark:
+            raise ValueError(f'{name} has already been flushed.')
+
+    def _add_activate(self, name_source: str, name_target: str,
+                      placement: Placement = None):
         """
         Appends name_target to the list of triggers activated by name_source.
-        Raises a ValueError if name_source already should activate name_target.
+        While a round is built, the activation is added to the round's
+        module, and is made only if placement holds when the module is
+        linked. Otherwise, placement must be None.
+        Raises a ValueError if name_source already should activate name_target,
+        or if name_source has already been flushed.
         """
+        if self._module is not None:
+            self._module.add_link(True, name_source, name_target, placement)
+            return
+        assert placement is None
+        self._check_not_flushed(name_source)
         if name_target in self._activate_triggers[name_source]:
             raise ValueError(f'{name_source} already activates {name_target}.')
         self._activate_triggers[name_source].add(name_target)
 
-    def _add_deactivate(self, name_source: str, name_target: str):
+    def _add_deactivate(self, name_source: str, name_target: str,
+                        placement: Placement = None):
         """
         Appends name_target to the list of triggers deactivated by name_source.
+        While a round is built, the deactivation is added to the round's
+        module, as in _add_activate.
         Raises a ValueError if name_source already should deactivate
-        name_target.
+        name_target, or if name_source has already been flushed.
         """
+        if self._module is not None:
+            self._module.add_link(False, name_source, name_target, placement)
+            return
+        assert placement is None
+        self._check_not_flushed(name_source)
         if name_target in self._deactivate_triggers[name_source]:
             raise ValueError(
                 f'{name_source} already deactivates {name_target}.')
         self._deactivate_triggers[name_source].add(name_target)
 
-    def _add_activate_and_deactivate_effects(self):
+    def _add_activate_and_deactivate_effects_before(self, end: int):
         """
-        Adds all activate and deactivate triggers specified in the fields.
-
-        This method should be called at the end of setup_scenario after all
-        triggers are created.
+        Adds the activate and deactivate triggers specified in the fields
+        to the triggers with ids less than end, and removes those
+        triggers' entries from the fields.
         """
-        trigger_mgr = self._scn.object_manager.trigger_manager
         effect_mapping_and_function = [
             (self._activate_triggers, util_triggers.add_effect_activate),
             (self._deactivate_triggers, util_triggers.add_effect_deactivate)
         ]
         for mapping, add_effect in effect_mapping_and_function:
+            added = []
             for source_name, target_names in mapping.items():
+                source_id = self._trigger_ids[source_name]
+                if source_id >= end:
+                    continue
+                source = self._new_triggers[
+                    source_id - self._triggers.watermark]
                 for target_name in target_names:
-                    source_id = self._trigger_ids[source_name]
-                    source = trigger_mgr.get_trigger(trigger_id=source_id)
                     target_id = self._trigger_ids[target_name]
                     add_effect(source, target_id)
+                added.append(source_name)
+            for source_name in added:
+                del mapping[source_name]
+
+    def _play_order(self, index: int) -> int:
+        """
+        Returns the position of the round at index in the order in which
+        the rounds are played, starting from 1. The tiebreaker is played
+        after the last round.
+        """
+        return index if index else self.num_rounds + 1
+
+    def _get_new_trigger(self, name: str) -> TriggerIR:
+        """
+        Returns the trigger named name.
+        Raises a ValueError if the trigger has already been flushed.
+        """
+        self._check_not_flushed(name)
+        return self._new_triggers[
+            self._trigger_ids[name] - self._triggers.watermark]
+
+    def _add_trigger_group(self, group: str, members: Iterable[str],
+                           index: int) -> None:
+        """
+        Adds a group named group of the triggers named by members, which
+        are triggers of the round at index, so all of them can be disabled
+        by a single effect added with _add_group_kill.
+
+        Each member that does not loop gets a first condition that its
+        group's kill switch variable is less than the round's play order.
+        The variable starts at 0 and a kill sets it to the play order, so
+        it only increases as the game goes on, and a group of an earlier
+        round can reuse the variable. A killed member that does not loop
+        remains active, but never fires again, so none of the members may
+        be activated after the group is killed. A looping member would
+        keep checking its conditions, so the looping members are instead
+        deactivated by a single trigger that each kill activates.
+
+        Raises a ValueError if the round already has a group named group
+        or has no unused kill switch, or if a member has been flushed.
+        """
+        if group in self._trigger_groups:
+            raise ValueError(f'{group} is already the name of a group.')
+        slot = len(self._trigger_groups)
+        if slot == KILL_SWITCH_COUNT:
+            raise ValueError(f'Round {index} has no unused kill switch.')
+        var_id = self._var_ids[KILL_SWITCH_VARIABLES[slot]]
+        name_loops = None
+        for name in members:
+            trigger = self._get_new_trigger(name)
+            if trigger.looping:
+                if name_loops is None:
+                    name_loops = f'{group} Deactivate Loops'
+                    loops = self._add_trigger(name_loops)
+                    loops.enabled = False
+                self._add_deactivate(name_loops, name)
+                continue
+            guard = ConditionIR(conditions.variable_value)
+            trigger.conditions.insert(0, guard)
+            guard.amount_or_quantity = self._play_order(index)
+            guard.variable = var_id
+            guard.comparison = VarValComp.less.value
+        self._trigger_groups[group] = (var_id, name_loops)
+
+    def _add_group_kill(self, name_source: str, group: str,
+                        index: int) -> None:
+        """
+        Adds an effect to the trigger named name_source, of the round at
+        index, that disables the members of the group named group, and
+        an activation of the trigger that deactivates its looping members.
+        Raises a ValueError if there is no such group, or if name_source
+        has been flushed.
+        """
+        if group not in self._trigger_groups:
+            raise ValueError(f'{group} is not the name of a group.')
+        var_id, name_loops = self._trigger_groups[group]
+        if name_loops is not None:
+            self._add_activate(name_source, name_loops)
+        kill = self._get_new_trigger(name_source).add_effect(
+            effects.change_variable)
+        kill.quantity = self._play_order(index)
+        kill.operation = ChangeVarOp.set_op.value
+        kill.from_variable = var_id
+        kill.message = self._var_ids.inverse[var_id]
+
+    def _group_large_deactivations(self, index: int, first_id: int) -> None:
+        """
+        Replaces the deactivations made by each trigger of the round at
+        index that deactivates more than KILL_SWITCH_THRESHOLD triggers of
+        the round with kills of trigger groups. The triggers of the round
+        are the triggers with ids from first_id.
+
+        The triggers are grouped by the set of triggers that deactivate
+        them, so each group is deactivated by all of those triggers. A
+        trigger that does not loop is counted as deactivating itself,
+        since it is done once it fires. A trigger joins a group only if
+        it is activated by no triggers other than the round's init and
+        begin triggers and the group's other members, so it cannot be
+        activated after the group is killed. The largest groups with at
+        least two members get the round's kill switches. Each kill also
+        deactivates a group's looping members through a single trigger,
+        see _add_trigger_group.
+        """
+        self._trigger_groups.clear()
+
+        def in_round(name: str) -> bool:
+            """Returns True if the trigger named name is in the round."""
+            return self._trigger_ids[name] >= first_id
+
+        sources = [
+            name for name, targets in self._deactivate_triggers.items()
+            if in_round(name)
+            and sum(in_round(target) for target in targets)
+            > KILL_SWITCH_THRESHOLD
+        ]
+        if not sources:
+            return
+        # Maps the name of each deactivated trigger to the set of the
+        # names of the sources that deactivate it.
+        killers = defaultdict(set)
+        for source in sources:
+            for target in self._deactivate_triggers[source]:
+                if in_round(target):
+                    killers[target].add(source)
+            if not self._get_new_trigger(source).looping:
+                killers[source].add(source)
+        classes = defaultdict(set)
+        for target, names in killers.items():
+            classes[frozenset(names)].add(target)
+
+        # Maps the name of each trigger to the names of its activators.
+        activators = defaultdict(set)
+        for source, targets in self._activate_triggers.items():
+            for target in targets:
+                activators[target].add(source)
+        names = _TriggerNames(index)
+        starters = {names.init, names.begin}
+        groups = []
+        for killer_names, members in classes.items():
+            # Removes the members that may be activated after the group
+            # is killed, until every remaining activator is allowed.
+            while True:
+                unsafe = {member for member in members
+                          if not activators[member] <= starters | members}
+                if not unsafe:
+                    break
+                members -= unsafe
+            if len(members) >= 2:
+                groups.append((killer_names, members))
+        groups.sort(key=lambda group: (
+            -len(group[1]), min(self._trigger_ids[m] for m in group[1])))
+
+        for k, (killer_names, members) in enumerate(
+                groups[:KILL_SWITCH_COUNT]):
+            group = f'{names.prefix} Kill Switch {k}'
+            self._add_trigger_group(
+                group, sorted(members, key=self._trigger_ids.get), index)
+            for source in sorted(killer_names, key=self._trigger_ids.get):
+                self._deactivate_triggers[source] -= members
+                self._add_group_kill(source, group, index)
+
+    def _insert_trigger(self, name: str, before: str) -> TriggerIR:
+        """
+        Adds a trigger named name to the scenario just before the trigger
+        named before, so it has a lower id. The ids of before and of the
+        triggers after it increase by one. Must not be called while a
+        round is built.
+        Raises a ValueError if a trigger with that name already exists,
+        or if before has already been flushed.
+        Returns the created trigger object.
+        """
+        assert self._module is None
+        if name in self._trigger_ids:
+            raise ValueError(f'{name} is already the name of a trigger.')
+        self._check_not_flushed(before)
+        trigger_id = self._trigger_ids[before]
+        position = trigger_id - self._triggers.watermark
+        # Moves the last trigger first, so its new id is free.
+        for trigger in reversed(self._new_triggers[position:]):
+            moved = self._trigger_ids.inverse[trigger.trigger_id]
+            trigger.trigger_id += 1
+            self._trigger_ids[moved] = trigger.trigger_id
+        self._trigger_ids[name] = trigger_id
+        trigger = TriggerIR(name, trigger_id)
+        self._new_triggers.insert(position, trigger)
+        return trigger
+
+    def _add_activation_batches(self) -> None:
+        """
+        Spreads the activations of each trigger that activates more than
+        the options' activation_batch triggers over a chain of batch
+        triggers.
+
+        The trigger activates the first activation_batch - 1 of its targets,
+        in id order, and the first batch trigger. Each batch trigger
+        activates the next targets and the next batch trigger. Each batch
+        trigger is inserted just before the trigger that activates it.
+        Triggers run in id order, so a trigger activated by a trigger with
+        a higher id first runs in the next game tick, as with the flag
+        ring of _add_steal_the_bacon, and each batch runs one tick after
+        the one before it. Each batch trigger is deactivated by every
+        trigger that deactivates one of the targets left to it, so a
+        pending batch does not fire after its targets' round is over.
+        A trigger's deactivations are not batched.
+        """
+        size = self._options.activation_batch
+        if size is None:
+            return
+        if size < 2:
+            raise ValueError(f'activation_batch {size} must be at least 2.')
+        large = [name for name, targets in self._activate_triggers.items()
+                 if len(targets) > size]
+        if not large:
+            return
+        # Maps the name of each trigger to the names of its deactivators.
+        deactivators = defaultdict(set)
+        for source, targets in self._deactivate_triggers.items():
+            for target in targets:
+                deactivators[target].add(source)
+        for source_name in large:
+            targets = sorted(self._activate_triggers[source_name],
+                             key=self._trigger_ids.get)
+            prev_name = source_name
+            k = 0
+            while len(targets) > size:
+                k += 1
+                batch_name = f'{source_name} Activation Batch {k}'
+                batch = self._insert_trigger(batch_name, prev_name)
+                batch.enabled = False
+                self._activate_triggers[prev_name] = set(targets[:size - 1])
+                self._activate_triggers[prev_name].add(batch_name)
+                targets = targets[size - 1:]
+                prev_name = batch_name
+                for target in targets:
+                    for source in deactivators[target]:
+                        self._deactivate_triggers[source].add(batch_name)
+            self._activate_triggers[prev_name] = set(targets)
+
+    def _flush_triggers(self) -> None:
+        """
+        Adds the activate and deactivate effects of all current triggers
+        and flushes them to the trigger stream, which lowers and serializes
+        them, so they are no longer held in memory. No trigger that is
+        flushed may be modified afterwards.
 
-    def _add_effect_p1_score(self, trigger: TriggerObject,
+        This method should be called after each round, and at the end of
+        setup_scenario after all triggers are created.
+        """
+        self._add_activation_batches()
+        self._add_activate_and_deactivate_effects_before(
+            len(self._trigger_ids))
+        # The list may still be waiting to be sent to a worker process,
+        # so it is replaced rather than cleared.
+        self._triggers.flush(self._new_triggers)
+        self._new_triggers = []
+
+    def _add_effect_p1_score(self, trigger: TriggerIR,
                              pts: int) -> None:
         """Adds effects to trigger that change p1's score by pts."""
         p1_plus = trigger.add_effect(effects.change_variable)
@@ -783,7 +1589,7 @@ class ScnData:
         diff_plus.from_variable = self._var_ids['score-difference']
         diff_plus.message = 'score-difference'
 
-    def _add_effect_p2_score(self, trigger: TriggerObject,
+    def _add_effect_p2_score(self, trigger: TriggerIR,
                              pts: int) -> None:
         """Adds effects to trigger that change p2's score by pts."""
         p2_plus = trigger.add_effect(effects.change_variable)
@@ -797,7 +1603,7 @@ class ScnData:
         diff_subtract.from_variable = self._var_ids['score-difference']
         diff_subtract.message = 'score-difference'
 
-    def _add_effect_score(self, trigger: TriggerObject, player: Player,
+    def _add_effect_score(self, trigger: TriggerIR, player: Player,
                           pts: int) -> None:
         """Adds effects to trigger to change the player's score by pts."""
         if player == Player.ONE:
@@ -808,8 +1614,8 @@ class ScnData:
             raise ValueError(f'{player} is not Player 1 or Player 2.')
 
     def _create_unit_sequence_explicit(
-            self, p: Player, unit: UnitStruct, init: TriggerObject,
-            begin: TriggerObject, remove=True,
+            self, p: Player, unit: UnitStruct, init: TriggerIR,
+            begin: TriggerIR, remove=True,
             buff=REGICIDE_DEFAULT_BUFF) -> None:
         """
         Same as _create_unit_sequence, but allows for manual specification
@@ -822,7 +1628,7 @@ class ScnData:
         units with various bonus stats.
         """
         if remove:
-            util_units.remove(self._scn, unit, p)
+            self._remove_unit(unit, p)
         x, y = int(unit.x), int(unit.y)
 
         create = init.add_effect(effects.create_object)
@@ -944,23 +1750,33 @@ class ScnData:
         self._create_unit_sequence_explicit(
             p, unit, rts.init, rts.begin, remove, buff)
 
-    def _add_effect_research_tech(self, trigger: TriggerObject,
+    def _add_effect_research_tech(self, trigger: TriggerIR,
                                   tech_name: str) -> None:
         """
         Adds an effect to trigger to research the technology given by
         tech_name if it's not already researched. The technology is researched
         for all players.
 
+        While a round is built, the effects are added when the round's
+        module is linked, if no earlier trigger researches the technology.
+
         Checks tech_name is a valid technology name.
         """
         assert util_techs.is_tech(tech_name), f'{tech_name} is not a tech.'
-        if tech_name not in self._researched_techs:
+        if self._module is not None:
+            self._module.add_research(trigger, tech_name)
+        elif tech_name not in self._researched_techs:
             self._researched_techs.add(tech_name)
-            tid = techs.tech_names.inverse[tech_name]
-            for p in (Player.GAIA, Player.ONE, Player.TWO):
-                util_triggers.add_effect_research_tech(trigger, tid, p.value)
+            self._add_research_effects(trigger, tech_name)
 
-    def _research_techs(self, trigger: TriggerObject, index: int) -> None:
+    @staticmethod
+    def _add_research_effects(trigger: TriggerIR, tech_name: str) -> None:
+        """Adds effects to trigger to research tech_name for all players."""
+        tid = techs.tech_names.inverse[tech_name]
+        for p in (Player.GAIA, Player.ONE, Player.TWO):
+            util_triggers.add_effect_research_tech(trigger, tid, p.value)
+
+    def _research_techs(self, trigger: TriggerIR, index: int) -> None:
         """
         Adds effects to trigger to research the initial techs for the event
         in the round given by index.
@@ -1036,74 +1852,98 @@ class ScnData:
         A future implementation actually may remove the units.
         """
         mgs = {e.name for e in self._events if isinstance(e, Minigame)}
-        umgr = self._scn.object_manager.unit_manager
-        overall_units = []
-        for p in (Player.GAIA, Player.ONE, Player.TWO):
-            if 'Steal the Bacon' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        160.0, 80.0, 240.0, 160.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Tower Battlefield' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        160.0, 160.0, 240.0, 240.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Galley Micro' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        80.0, 160.0, 160.0, 240.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Xbow Timer' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        0.0, 160.0, 80.0, 240.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Capture the Relic' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        0.0, 80.0, 80.0, 160.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'DauT Castle' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        0.0, 0.0, 80.0, 80.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Castle Siege' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        80.0, 0.0, 160.0, 80.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-            if 'Regicide' not in mgs:
-                overall_units.extend(
-                    (p, unit)
-                    for unit in umgr.get_units_in_area(
-                        160.0, 0.0, 240.0, 80.0, players=[p])
-                    if unit.unit_id != UCONST_INVISIBLE_OBJECT)
-        for p, unit in overall_units:
-            util_units.remove(self._scn, unit, p)
+        unused_areas = [area for name, area in MINIGAME_AREAS.items()
+                        if name not in mgs]
+
+        def is_unused(unit: UnitStruct) -> bool:
+            """Returns True if unit is a visible unit in an unused area."""
+            return unit.unit_id != UCONST_INVISIBLE_OBJECT and any(
+                x1 <= unit.x <= x2 and y1 <= unit.y <= y2
+                for x1, y1, x2, y2 in unused_areas)
+
+        if unused_areas:
+            for p in (Player.GAIA, Player.ONE, Player.TWO):
+                util_units.filter_units(self._scn, p, is_unused)
 
     def _name_variables(self) -> None:
-        """Sets the names for trigger variables in the scenario."""
+        """
+        Sets the names for trigger variables in the scenario.
+
+        Each variable of _scenario_variables has its own slot. The minigame
+        variables of the rounds are allocated slots by liveness: each is
+        live only while its round is played, so rounds that are not played
+        at the same time share slots. The shared slots are named by
+        MINIGAME_VARIABLE_NAME.
+
+        Raises a ValueError if the scenario needs more than NUM_VARIABLES
+        variables.
+        """
+        keys = [
+            (index, name)
+            for index, e in enumerate(self._events) if isinstance(e, Minigame)
+            for name, __ in MINIGAME_VARIABLES.get(e.name, ())
+        ]
+        slots = util.allocate_slots([
+            (self._play_order(index), self._play_order(index))
+            for index, __ in keys
+        ])
+        num_slots = max(slots, default=-1) + 1
+        scenario_variables = self._scenario_variables
+        names = [name for name, __ in scenario_variables]
+        names.extend(MINIGAME_VARIABLE_NAME.format(k) for k in range(num_slots))
+        if len(names) > NUM_VARIABLES:
+            msg = (f'The scenario needs {len(names)} variables,'
+                   + f' more than {NUM_VARIABLES}.')
+            raise ValueError(msg)
+
         # Accesses _parsed_data directly, since interface is not yet finished.
         trigger_piece = self._scn._parsed_data['TriggerPiece'] # pylint: disable=protected-access
         var_count = trigger_piece.retrievers[6]
         var_change = trigger_piece.retrievers[7].data
-        for name, __ in INITIAL_VARIABLES:
+        for name in names:
             var = ChangedVariableStruct()
             index = var_count.data
-            self._var_ids[name] = index
+            self._var_names[index] = name
             var.retrievers[0].data = index
             var.retrievers[1].data = name
             var_change.append(var)
             var_count.data += 1
+        var_ids = list(self._var_names)
+        for (name, __), var_id in zip(scenario_variables, var_ids):
+            self._var_ids[name] = var_id
+        slot_ids = var_ids[len(scenario_variables):]
+        for (index, name), slot in zip(keys, slots):
+            self._round_var_ids[index][name] = slot_ids[slot]
+
+    @property
+    def _scenario_variables(self) -> List[Tuple[str, int]]:
+        """
+        Returns the (variable-name, initial-value) pairs of the variables
+        used throughout the scenario: the INITIAL_VARIABLES, and the
+        FIGHT_BONUS_VARIABLES if there are fights that use the shared
+        fight engine.
+        """
+        if self._options.shared_fights and any(
+                isinstance(e, Fight) for e in self._events[1:]):
+            return INITIAL_VARIABLES + FIGHT_BONUS_VARIABLES
+        return INITIAL_VARIABLES
+
+    def _use_round_variables(self, index: int) -> None:
+        """
+        Sets the minigame variables in _var_ids to those of the round at
+        index.
+        """
+        for names in MINIGAME_VARIABLES.values():
+            for name, __ in names:
+                self._var_ids.pop(name, None)
+        self._var_ids.update(self._round_var_ids[index])
+
+    def _round_var_text(self, index: int, name: str) -> str:
+        """
+        Returns the text that displays the value of the minigame variable
+        named name of the round at index.
+        """
+        return f'<{self._var_names[self._round_var_ids[index][name]]}>'
 
     def _add_initial_triggers(self) -> None:
         """
@@ -1114,7 +1954,7 @@ class ScnData:
         self._initialize_variable_values()
         self._add_start_timer()
         self._set_start_views()
-        self._create_map_revealer_remover()
+        self._create_map_revealer_removers()
         self._remove_boar_food()
         self._change_train_locations()
         self._add_objectives()
@@ -1129,11 +1969,11 @@ class ScnData:
         init_vars = self._add_trigger(trigger_name)
         init_vars.description = 'Initializes variable starting values.'
 
-        for index, (name, value) in enumerate(INITIAL_VARIABLES):
+        for name, value in self._scenario_variables:
             change_var = init_vars.add_effect(effects.change_variable)
             change_var.quantity = value
             change_var.operation = ChangeVarOp.set_op.value
-            change_var.from_variable = index
+            change_var.from_variable = self._var_ids[name]
             change_var.message = name
 
     def _add_start_timer(self) -> None:
@@ -1168,11 +2008,12 @@ class ScnData:
             change_view.location_y = START_VIEW_Y
             change_view.scroll = False
 
-    def _add_revealers(self, trigger: TriggerObject,
+    def _add_revealers(self, trigger: Union[TriggerIR, EffectBlock],
                        center: Tuple[int, int]) -> None:
         """
-        Adds a sequence of effects to trigger for creating map revealers
-        centered at tile with x and y coordinates given by center.
+        Adds a sequence of effects to trigger (or to a block of effects)
+        for creating map revealers centered at tile with x and y
+        coordinates given by center.
         """
         for p in (Player.ONE, Player.TWO):
             for (x, y) in map_revealer_pos(center):
@@ -1181,20 +2022,27 @@ class ScnData:
                 create.player_source = p.value
                 create.location_x, create.location_y = x, y
 
-    def _create_map_revealer_remover(self) -> None:
+    def _create_map_revealer_removers(self) -> None:
         """
-        Creates a "Hide" trigger that removes all map revealers on the map.
-        Loops and disables itself.
+        Creates a "Hide" trigger for each area of the map in which the
+        events create map revealers. Each trigger removes the map revealers
+        in its area, rather than on the whole map. Loops and disables
+        itself.
         """
-        hide_revealers = self._add_trigger(REVEALER_HIDE_NAME)
-        hide_revealers.enabled = False
-        hide_revealers.looping = True
-        self._add_deactivate(REVEALER_HIDE_NAME, REVEALER_HIDE_NAME)
-        for p in (Player.GAIA, Player.ONE, Player.TWO):
-            remove = hide_revealers.add_effect(effects.remove_object)
-            remove.player_source = p.value
-            remove.object_list_unit_id = UNIT_ID_MAP_REVEALER
-            util_triggers.set_effect_area(remove, 0, 0, 239, 239)
+        # The areas in the order of their first events.
+        centers = dict.fromkeys(event_center(e) for e in self._events)
+        for center in centers:
+            hide_name = revealer_hide_name(center)
+            hide_revealers = self._add_trigger(hide_name)
+            hide_revealers.enabled = False
+            hide_revealers.looping = True
+            self._add_deactivate(hide_name, hide_name)
+            for p in (Player.GAIA, Player.ONE, Player.TWO):
+                remove = hide_revealers.add_effect(effects.remove_object)
+                remove.player_source = p.value
+                remove.object_list_unit_id = UNIT_ID_MAP_REVEALER
+                util_triggers.set_effect_area(remove,
+                                              *map_revealer_area(center))
 
     def _remove_boar_food(self) -> None:
         """
@@ -1253,12 +2101,29 @@ class ScnData:
                 unit.object_list_unit_id_2 = buildings.wonder
 
 
+    def _add_display_condition(self, trigger: TriggerIR) -> None:
+        """
+        Adds a condition that is never true to trigger, so its objective
+        is displayed without being checked off, and records trigger as
+        one that is checked every tick while it is enabled.
+        """
+        util_triggers.add_cond_gaia_defeated(trigger)
+        self._polling_triggers[trigger.name.rstrip('\x00')] = trigger
+
     def _add_objectives(self) -> None:
         """
         Sets up the player objectives to display the score both
         on the side of the screen and in the objectives menu.
+
+        If the objectives are compact, the triggers that are enabled for
+        the whole match are kept to a minimum: the title and description
+        are displayed by a single trigger, the score is displayed without
+        a header, and each score objective is displayed in both places by
+        the same trigger. The other polling triggers are enabled only for
+        their round, see _round_polling_triggers.
         """
         self._add_trigger_header('Objectives')
+        compact = self._options.compact_objectives
 
         # Menu objectives
         obj_title_name = '[O] Objectives Title'
@@ -1267,22 +2132,26 @@ class ScnData:
         obj_title.description_order = 200
         obj_title.header = True
         obj_title.description = 'Micro Wars!'
-        util_triggers.add_cond_gaia_defeated(obj_title)
-
-        obj_description_name = '[O] Objectives Description'
-        obj_description = self._add_trigger(obj_description_name)
-        obj_description.display_as_objective = True
-        obj_description.description_order = 199
-        obj_description.description = "Each round is worth 100 points. Win points by killing your opponent's units or by completing special objectives." # pylint: disable=line-too-long
-        util_triggers.add_cond_gaia_defeated(obj_description)
-
-        obj_score_header_name = '[O] Objectives Score Header'
-        obj_score_header = self._add_trigger(obj_score_header_name)
-        obj_score_header.display_as_objective = True
-        obj_score_header.description_order = 100
-        obj_score_header.description = 'Score:'
-        obj_score_header.header = True
-        util_triggers.add_cond_gaia_defeated(obj_score_header)
+        self._add_display_condition(obj_title)
+
+        obj_description_text = "Each round is worth 100 points. Win points by killing your opponent's units or by completing special objectives." # pylint: disable=line-too-long
+        if compact:
+            obj_title.description += f'\n{obj_description_text}'
+        else:
+            obj_description_name = '[O] Objectives Description'
+            obj_description = self._add_trigger(obj_description_name)
+            obj_description.display_as_objective = True
+            obj_description.description_order = 199
+            obj_description.description = obj_description_text
+            self._add_display_condition(obj_description)
+
+            obj_score_header_name = '[O] Objectives Score Header'
+            obj_score_header = self._add_trigger(obj_score_header_name)
+            obj_score_header.display_as_objective = True
+            obj_score_header.description_order = 100
+            obj_score_header.description = 'Score:'
+            obj_score_header.header = True
+            self._add_display_condition(obj_score_header)
 
         obj_score_p1_name = '[O] Objectives Score P1'
         obj_score_p1 = self._add_trigger(obj_score_p1_name)
@@ -1304,36 +2173,46 @@ class ScnData:
         obj_p2_wins_cond.variable = self._var_ids['p2-wins']
         obj_p2_wins_cond.comparison = VarValComp.equal.value
 
-        # Displayed Objectives
-        disp_score_header_name = '[O] Display Score Header'
-        disp_score_header = self._add_trigger(disp_score_header_name)
-        disp_score_header.display_on_screen = True
-        disp_score_header.description_order = 100
-        disp_score_header.short_description = 'Score:'
-        disp_score_header.header = True
-        util_triggers.add_cond_gaia_defeated(disp_score_header)
-
-        disp_score_p1_name = '[O] Display Score P1'
-        disp_score_p1 = self._add_trigger(disp_score_p1_name)
-        disp_score_p1.display_on_screen = True
-        disp_score_p1.description_order = 99
-        disp_score_p1.short_description = 'P1: <p1-score>'
-        disp_p1_wins_cond = disp_score_p1.add_condition(
-            conditions.variable_value)
-        disp_p1_wins_cond.amount_or_quantity = 1
-        disp_p1_wins_cond.variable = self._var_ids['p1-wins']
-        disp_p1_wins_cond.comparison = VarValComp.equal.value
-
-        disp_score_p2_name = '[O] Display Score P2'
-        disp_score_p2 = self._add_trigger(disp_score_p2_name)
-        disp_score_p2.display_on_screen = True
-        disp_score_p2.description_order = 98
-        disp_score_p2.short_description = 'P2: <p2-score>'
-        disp_p2_wins_cond = disp_score_p2.add_condition(
-            conditions.variable_value)
-        disp_p2_wins_cond.amount_or_quantity = 1
-        disp_p2_wins_cond.variable = self._var_ids['p2-wins']
-        disp_p2_wins_cond.comparison = VarValComp.equal.value
+        if compact:
+            # Labels the score objectives in place of the header, and
+            # displays them on the screen as well.
+            obj_score_p1.description = 'Player 1 Score: <p1-score>'
+            obj_score_p1.display_on_screen = True
+            obj_score_p1.short_description = 'P1 Score: <p1-score>'
+            obj_score_p2.description = 'Player 2 Score: <p2-score>'
+            obj_score_p2.display_on_screen = True
+            obj_score_p2.short_description = 'P2 Score: <p2-score>'
+        else:
+            # Displayed Objectives
+            disp_score_header_name = '[O] Display Score Header'
+            disp_score_header = self._add_trigger(disp_score_header_name)
+            disp_score_header.display_on_screen = True
+            disp_score_header.description_order = 100
+            disp_score_header.short_description = 'Score:'
+            disp_score_header.header = True
+            self._add_display_condition(disp_score_header)
+
+            disp_score_p1_name = '[O] Display Score P1'
+            disp_score_p1 = self._add_trigger(disp_score_p1_name)
+            disp_score_p1.display_on_screen = True
+            disp_score_p1.description_order = 99
+            disp_score_p1.short_description = 'P1: <p1-score>'
+            disp_p1_wins_cond = disp_score_p1.add_condition(
+                conditions.variable_value)
+            disp_p1_wins_cond.amount_or_quantity = 1
+            disp_p1_wins_cond.variable = self._var_ids['p1-wins']
+            disp_p1_wins_cond.comparison = VarValComp.equal.value
+
+            disp_score_p2_name = '[O] Display Score P2'
+            disp_score_p2 = self._add_trigger(disp_score_p2_name)
+            disp_score_p2.display_on_screen = True
+            disp_score_p2.description_order = 98
+            disp_score_p2.short_description = 'P2: <p2-score>'
+            disp_p2_wins_cond = disp_score_p2.add_condition(
+                conditions.variable_value)
+            disp_p2_wins_cond.amount_or_quantity = 1
+            disp_p2_wins_cond.variable = self._var_ids['p2-wins']
+            disp_p2_wins_cond.comparison = VarValComp.equal.value
 
         round_text = f'Round <round> / {self.num_rounds}:'
         round_obj = self._add_trigger(ROUND_OBJ_NAME)
@@ -1345,7 +2224,7 @@ class ScnData:
         round_obj.short_description = round_text
         round_obj.description = round_text
         round_obj.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(round_obj)
+        self._add_display_condition(round_obj)
 
         tiebreaker_text = 'Tiebreaker'
         tiebreaker_obj = self._add_trigger(TIEBREAKER_OBJ_NAME)
@@ -1357,7 +2236,7 @@ class ScnData:
         tiebreaker_obj.short_description = tiebreaker_text
         tiebreaker_obj.description = tiebreaker_text
         tiebreaker_obj.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(tiebreaker_obj)
+        self._add_display_condition(tiebreaker_obj)
 
         for e_index, e in enumerate(self._events):
             if e_index != 0:
@@ -1375,7 +2254,7 @@ class ScnData:
                     fight_obj.short_description = fight_obj_text
                     fight_obj.description = fight_obj_text
                     fight_obj.mute_objectives = True
-                    util_triggers.add_cond_gaia_defeated(fight_obj)
+                    self._add_display_condition(fight_obj)
 
     def _add_minigame_objective(self, mg: Minigame, index: int) -> None:
         """
@@ -1416,36 +2295,38 @@ class ScnData:
         obj_boar.display_on_screen = True
         obj_boar.description_order = 50
         obj_boar.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_boar)
+        self._add_display_condition(obj_boar)
 
         obj_boar_1_name = f'[O] Steal the Bacon Player 1 Boar'
         self._round_objectives[index].append(obj_boar_1_name)
         obj_boar_1 = self._add_trigger(obj_boar_1_name)
         obj_boar_1.enabled = False
-        obj_boar_1.description = '- Player 1: <p1-boar> / 5 Boar'
-        obj_boar_1.short_description = '- P1: <p1-boar> / 5 Boar'
+        boar1_text = self._round_var_text(index, 'p1-boar')
+        obj_boar_1.description = f'- Player 1: {boar1_text} / 5 Boar'
+        obj_boar_1.short_description = f'- P1: {boar1_text} / 5 Boar'
         obj_boar_1.display_as_objective = True
         obj_boar_1.display_on_screen = True
         obj_boar_1.description_order = 49
         obj_boar_1.mute_objectives = True
         boar1_var = obj_boar_1.add_condition(conditions.variable_value)
         boar1_var.amount_or_quantity = 5
-        boar1_var.variable = self._var_ids['p1-boar']
+        boar1_var.variable = self._round_var_ids[index]['p1-boar']
         boar1_var.comparison = VarValComp.equal.value
 
         obj_boar_2_name = f'[O] Steal the Bacon Player 2 Boar'
         self._round_objectives[index].append(obj_boar_2_name)
         obj_boar_2 = self._add_trigger(obj_boar_2_name)
         obj_boar_2.enabled = False
-        obj_boar_2.description = '- Player 2: <p2-boar> / 5 Boar'
-        obj_boar_2.short_description = '- P2: <p2-boar> / 5 Boar'
+        boar2_text = self._round_var_text(index, 'p2-boar')
+        obj_boar_2.description = f'- Player 2: {boar2_text} / 5 Boar'
+        obj_boar_2.short_description = f'- P2: {boar2_text} / 5 Boar'
         obj_boar_2.display_as_objective = True
         obj_boar_2.display_on_screen = True
         obj_boar_2.description_order = 48
         obj_boar_2.mute_objectives = True
         boar2_var = obj_boar_2.add_condition(conditions.variable_value)
         boar2_var.amount_or_quantity = 5
-        boar2_var.variable = self._var_ids['p2-boar']
+        boar2_var.variable = self._round_var_ids[index]['p2-boar']
         boar2_var.comparison = VarValComp.equal.value
 
     def _add_tower_battlefield_objectives(self, index: int) -> None:
@@ -1460,7 +2341,7 @@ class ScnData:
         obj_tower_header.display_on_screen = True
         obj_tower_header.description_order = 50
         obj_tower_header.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_tower_header)
+        self._add_display_condition(obj_tower_header)
 
         obj_tower_desc_name = f'[O] Round {index} Tower Battlefield Description'
         self._round_objectives[index].append(obj_tower_desc_name)
@@ -1470,36 +2351,38 @@ class ScnData:
         obj_tower_desc.display_as_objective = True
         obj_tower_desc.description_order = 49
         obj_tower_desc.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_tower_desc)
+        self._add_display_condition(obj_tower_desc)
 
         obj_tower_p1_name = f'[O] Round {index} Tower Battlefield P1 Points'
         self._round_objectives[index].append(obj_tower_p1_name)
         obj_tower_p1 = self._add_trigger(obj_tower_p1_name)
         obj_tower_p1.enabled = False
-        obj_tower_p1.description = 'Player 1: <p1-battlefield-points> / 100'
-        obj_tower_p1.short_description = 'P1: <p1-battlefield-points> / 100'
+        points1_text = self._round_var_text(index, 'p1-battlefield-points')
+        obj_tower_p1.description = f'Player 1: {points1_text} / 100'
+        obj_tower_p1.short_description = f'P1: {points1_text} / 100'
         obj_tower_p1.display_as_objective = True
         obj_tower_p1.display_on_screen = True
         obj_tower_p1.description_order = 48
         obj_tower_p1.mute_objectives = True
         var1_cond = obj_tower_p1.add_condition(conditions.variable_value)
         var1_cond.amount_or_quantity = event.MAX_POINTS
-        var1_cond.variable = self._var_ids['p1-battlefield-points']
+        var1_cond.variable = self._round_var_ids[index]['p1-battlefield-points']
         var1_cond.comparison = VarValComp.equal.value
 
         obj_tower_p2_name = f'[O] Round {index} Tower Battlefield P2 Points'
         self._round_objectives[index].append(obj_tower_p2_name)
         obj_tower_p2 = self._add_trigger(obj_tower_p2_name)
         obj_tower_p2.enabled = False
-        obj_tower_p2.description = 'Player 2: <p2-battlefield-points> / 100'
-        obj_tower_p2.short_description = 'P2: <p2-battlefield-points> / 100'
+        points2_text = self._round_var_text(index, 'p2-battlefield-points')
+        obj_tower_p2.description = f'Player 2: {points2_text} / 100'
+        obj_tower_p2.short_description = f'P2: {points2_text} / 100'
         obj_tower_p2.display_as_objective = True
         obj_tower_p2.display_on_screen = True
         obj_tower_p2.description_order = 47
         obj_tower_p2.mute_objectives = True
         var1_cond = obj_tower_p2.add_condition(conditions.variable_value)
         var1_cond.amount_or_quantity = event.MAX_POINTS
-        var1_cond.variable = self._var_ids['p2-battlefield-points']
+        var1_cond.variable = self._round_var_ids[index]['p2-battlefield-points']
         var1_cond.comparison = VarValComp.equal.value
 
     def _add_galley_micro_objectives(self, index: int) -> None:
@@ -1514,7 +2397,7 @@ class ScnData:
         obj_galley.display_on_screen = True
         obj_galley.description_order = 50
         obj_galley.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_galley)
+        self._add_display_condition(obj_galley)
 
     def _add_xbow_timer_objectives(self, index: int) -> None:
         """Adds the objectives the Xbow Timer minigame."""
@@ -1529,7 +2412,7 @@ class ScnData:
         obj_xbow.display_on_screen = True
         obj_xbow.description_order = 50
         obj_xbow.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_xbow)
+        self._add_display_condition(obj_xbow)
 
     def _add_ctr_objectives(self, index: int) -> None:
         """Adds the objectives for the Capture the Relic minigame."""
@@ -1537,44 +2420,52 @@ class ScnData:
         self._round_objectives[index].append(obj_ctr_name)
         obj_ctr = self._add_trigger(obj_ctr_name)
         obj_ctr.enabled = False
-        obj_ctr.description = 'Capturing a Relic is worth 10 points. There are 3 rounds, each with 3 relics to capture. Capturing the most relics in total is worth an additional 10 points.' # pylint: disable=line-too-long
+        obj_ctr.description = f'Capturing a Relic is worth 10 points. {_ctr_rounds_text(ROUND_RELICS)} Capturing the most relics in total is worth an additional 10 points.' # pylint: disable=line-too-long
         obj_ctr.display_as_objective = True
         obj_ctr.description_order = 50
         obj_ctr.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_ctr)
+        self._add_display_condition(obj_ctr)
 
         obj_ctr_p1_name = f'[O] Capture the Relic Player 1 Relics'
         self._round_objectives[index].append(obj_ctr_p1_name)
         obj_ctr_p1 = self._add_trigger(obj_ctr_p1_name)
         obj_ctr_p1.enabled = False
-        obj_ctr_p1.description = 'Player 1: <Relics Captured, 1> / 9 Relics'
-        obj_ctr_p1.short_description = 'P1: <Relics Captured, 1> / 9 Relics'
+        relics1_text = self._round_var_text(index, 'p1-relics')
+        total_relics = ROUND_RELICS[max(ROUND_RELICS)]
+        obj_ctr_p1.description = (
+            f'Player 1: {relics1_text} / {total_relics} Relics')
+        obj_ctr_p1.short_description = (
+            f'P1: {relics1_text} / {total_relics} Relics')
         obj_ctr_p1.display_as_objective = True
         obj_ctr_p1.display_on_screen = True
         obj_ctr_p1.description_order = 49
         obj_ctr_p1.mute_objectives = True
         obj_ctr_p1_var = obj_ctr_p1.add_condition(conditions.variable_value)
         obj_ctr_p1_var.amount_or_quantity = 1
-        obj_ctr_p1_var.variable = self._var_ids['p1-most-relics']
+        obj_ctr_p1_var.variable = self._round_var_ids[index]['p1-most-relics']
         obj_ctr_p1_var.comparison = VarValComp.equal.value
 
         obj_ctr_p2_name = f'[O] Capture the Relic Player 2 Relics'
         self._round_objectives[index].append(obj_ctr_p2_name)
         obj_ctr_p2 = self._add_trigger(obj_ctr_p2_name)
         obj_ctr_p2.enabled = False
-        obj_ctr_p2.description = 'Player 2: <Relics Captured, 2> / 9 Relics'
-        obj_ctr_p2.short_description = 'P2: <Relics Captured, 2> / 9 Relics'
+        relics2_text = self._round_var_text(index, 'p2-relics')
+        obj_ctr_p2.description = (
+            f'Player 2: {relics2_text} / {total_relics} Relics')
+        obj_ctr_p2.short_description = (
+            f'P2: {relics2_text} / {total_relics} Relics')
         obj_ctr_p2.display_as_objective = True
         obj_ctr_p2.display_on_screen = True
         obj_ctr_p2.description_order = 48
         obj_ctr_p2.mute_objectives = True
         obj_ctr_p2_var = obj_ctr_p2.add_condition(conditions.variable_value)
         obj_ctr_p2_var.amount_or_quantity = 1
-        obj_ctr_p2_var.variable = self._var_ids['p2-most-relics']
+        obj_ctr_p2_var.variable = self._round_var_ids[index]['p2-most-relics']
         obj_ctr_p2_var.comparison = VarValComp.equal.value
 
     def _add_daut_castle_objectives(self, index: int):
         """Adds the objectives for the DauT Castle minigame."""
+        round_vars = self._round_var_ids[index]
         obj_daut_name = f'[O] Round {index} DauT Castle'
         self._round_objectives[index].append(obj_daut_name)
         obj_daut = self._add_trigger(obj_daut_name)
@@ -1585,7 +2476,7 @@ class ScnData:
         obj_daut.display_on_screen = True
         obj_daut.description_order = 50
         obj_daut.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_daut)
+        self._add_display_condition(obj_daut)
 
         obj_daut_p1_name = f'[O] DauT Castle Player 1 Castle Constructed'
         self._round_objectives[index].append(obj_daut_p1_name)
@@ -1599,7 +2490,7 @@ class ScnData:
         obj_daut_p1.mute_objectives = True
         castle1_made = obj_daut_p1.add_condition(conditions.variable_value)
         castle1_made.amount_or_quantity = 1
-        castle1_made.variable = self._var_ids['p1-castle-constructed']
+        castle1_made.variable = round_vars['p1-castle-constructed']
         castle1_made.comparison = VarValComp.equal.value
 
         obj_daut_p2_name = f'[O] DauT Castle Player 2 Castle Constructed'
@@ -1614,11 +2505,12 @@ class ScnData:
         obj_daut_p2.mute_objectives = True
         castle2_made = obj_daut_p2.add_condition(conditions.variable_value)
         castle2_made.amount_or_quantity = 1
-        castle2_made.variable = self._var_ids['p2-castle-constructed']
+        castle2_made.variable = round_vars['p2-castle-constructed']
         castle2_made.comparison = VarValComp.equal.value
 
     def _add_castle_siege_objectives(self, index: int):
         """Adds the objectives for the Castle Siege minigame."""
+        round_vars = self._round_var_ids[index]
         obj_cs_name = f'[O] Round {index} Castle Siege'
         self._round_objectives[index].append(obj_cs_name)
         obj_cs = self._add_trigger(obj_cs_name)
@@ -1629,7 +2521,7 @@ class ScnData:
         obj_cs.display_on_screen = True
         obj_cs.description_order = 50
         obj_cs.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_cs)
+        self._add_display_condition(obj_cs)
 
         obj_cs_p1_name = f'[O] Castle Siege Player 1 Castle Destroyed'
         self._round_objectives[index].append(obj_cs_p1_name)
@@ -1643,7 +2535,7 @@ class ScnData:
         obj_cs_p1.mute_objectives = True
         castle1_destroyed = obj_cs_p1.add_condition(conditions.variable_value)
         castle1_destroyed.amount_or_quantity = 1
-        castle1_destroyed.variable = self._var_ids['p1-castle-destroyed']
+        castle1_destroyed.variable = round_vars['p1-castle-destroyed']
         castle1_destroyed.comparison = VarValComp.equal.value
 
         obj_cs_p2_name = f'[O] Castle Siege Player 2 Castle Destroyed'
@@ -1658,7 +2550,7 @@ class ScnData:
         obj_cs_p2.mute_objectives = True
         castle2_destroyed = obj_cs_p2.add_condition(conditions.variable_value)
         castle2_destroyed.amount_or_quantity = 1
-        castle2_destroyed.variable = self._var_ids['p2-castle-destroyed']
+        castle2_destroyed.variable = round_vars['p2-castle-destroyed']
         castle2_destroyed.comparison = VarValComp.equal.value
 
     def _add_regicide_objectives(self, index: int):
@@ -1671,7 +2563,7 @@ class ScnData:
         obj_king.display_as_objective = True
         obj_king.description_order = 50
         obj_king.mute_objectives = True
-        util_triggers.add_cond_gaia_defeated(obj_king)
+        self._add_display_condition(obj_king)
 
         obj_king1_killed_name = f"[O] Regicide Kill Player 1's Hero"
         self._round_objectives[index].append(obj_king1_killed_name)
@@ -1685,7 +2577,7 @@ class ScnData:
         obj_king1_killed.mute_objectives = True
         k1_destroyed = obj_king1_killed.add_condition(conditions.variable_value)
         k1_destroyed.amount_or_quantity = 1
-        k1_destroyed.variable = self._var_ids['p1-hero-killed']
+        k1_destroyed.variable = self._round_var_ids[index]['p1-hero-killed']
         k1_destroyed.comparison = VarValComp.equal.value
 
         obj_king2_killed_name = f"[O] Regicide Kill Player 2's Hero"
@@ -1700,7 +2592,7 @@ class ScnData:
         obj_king2_killed.mute_objectives = True
         k2_destroyed = obj_king2_killed.add_condition(conditions.variable_value)
         k2_destroyed.amount_or_quantity = 1
-        k2_destroyed.variable = self._var_ids['p2-hero-killed']
+        k2_destroyed.variable = self._round_var_ids[index]['p2-hero-killed']
         k2_destroyed.comparison = VarValComp.equal.value
 
     def _add_victory_conditions(self):
@@ -1824,12 +2716,74 @@ class ScnData:
         util_triggers.add_cond_timer(declare_victory_p2, DELAY_VICTORY)
         util_triggers.add_effect_delcare_victory(declare_victory_p2, 2)
 
-    def _setup_rounds(self) -> None:
+    def _setup_rounds(self, stop: int = None) -> None:
         """
         Copies the units from the fight data and adds triggers for each
-        round of units.
+        round of units, from the next round that is not yet set up up to,
+        but not including, the round with index stop (or through the last
+        round if stop is None).
+
+        Each round is linked from its module in the shared modules or in
+        the module cache, or is built into a new module first. The
+        triggers are flushed after each round, so peak memory is bounded
+        by the largest round rather than by the whole scenario.
         """
-        for index, e in enumerate(self._events):
+        if stop is None:
+            stop = len(self._events)
+        for index in range(self._next_round, stop):
+            self._use_round_variables(index)
+            key = self._round_key(index)
+            module = (self._modules.get(key)
+                      if self._modules is not None else None)
+            # A fight's module depends only on its key, not on the
+            # templates, so it is the same in every build.
+            cached = (self._cache is not None
+                      and isinstance(self._events[index], Fight))
+            if module is None and cached:
+                module = self._cache.get(key)
+            if module is None:
+                module = self._mirror_round(index)
+            if module is None:
+                module = self._build_round(index)
+                if cached:
+                    self._cache.put(key, module)
+            if self._modules is not None:
+                self._modules[key] = module
+            first_id = len(self._trigger_ids)
+            self._link_round(module, index)
+            self._add_activation_batches()
+            self._group_large_deactivations(index, first_id)
+            self._flush_removed_units()
+            self._flush_triggers()
+            self._previous_module = module
+            self._next_round = index + 1
+
+    def _round_key(self, index: int) -> tuple:
+        """
+        Returns the key of the round at index. Rounds with the same key
+        have the same module.
+        """
+        e = self._events[index]
+        if isinstance(e, Minigame):
+            key = (e.name, tuple(e.tech_names()))
+            if e.name == 'Regicide':
+                key += (self._regicide_hero, self._regicide_buff)
+        else:
+            key = (
+                tuple(e.techs), tuple(sorted(e.points.items())),
+                *(tuple((u.unit_id, u.x, u.y, u.rotation) for u in ulst)
+                  for ulst in (e.p1_units, e.p2_units))
+            )
+            if self._options.shared_fights and index:
+                key += ('shared',)
+        # The tiebreaker's triggers differ from those of other rounds.
+        return (index == 0, type(e).__name__, key)
+
+    def _build_round(self, index: int) -> TriggerModule:
+        """Builds the triggers of the round at index into a new module."""
+        self._module = TriggerModule(index, self._var_ids)
+        try:
+            e = self._events[index]
             if isinstance(e, Minigame):
                 self._add_trigger_header(f'Minigame {index}')
                 self._add_minigame(index, e)
@@ -1837,6 +2791,255 @@ class ScnData:
                 self._add_trigger_header(
                     f'Fight {index}' if index else 'Tiebreaker')
                 self._add_fight(index, e)
+            return self._module
+        finally:
+            self._module = None
+
+    def _mirror_round(self, index: int) -> TriggerModule:
+        """
+        Returns the module of the round at index derived from the module
+        of the round before it, if the round is the second round of an
+        asymmetrical fight. Returns None otherwise, or if the first round
+        is the tiebreaker or has units whose facing is not mirrored.
+        """
+        f = self._events[index]
+        if (not isinstance(f, Fight) or f.mirror is None or index < 2
+                or self._events[index - 1] is not f.mirror
+                or self._previous_module is None):
+            return None
+        # Stone walls are created with hard coded facings.
+        if any(u.unit_id == buildings.stone_wall
+               for ulst in (f.p1_units, f.p2_units) for u in ulst):
+            return None
+        return self._mirror_module(self._previous_module)
+
+    @staticmethod
+    def _mirror_module(module: TriggerModule) -> TriggerModule:
+        """
+        Returns the module of the second round of an asymmetrical fight,
+        given the module of its first round.
+
+        The fight's triggers are the same as those of the first round with
+        the players swapped: the player fields, the names, and the score
+        effects of players 1 and 2 are exchanged. Each unit is created on
+        the tile mirrored across the diagonal through the fight's center,
+        which is the same tile event.make_fights moves it to, facing the
+        mirrored direction.
+        """
+        swap = {Player.ONE.value: Player.TWO.value,
+                Player.TWO.value: Player.ONE.value}
+        # The mirror of (x, y) is (y + shift, x - shift).
+        shift = FIGHT_CENTER_X - FIGHT_CENTER_Y
+        p1_score = module.var_ids['p1-score']
+        p2_score = module.var_ids['p2-score']
+        difference = module.var_ids['score-difference']
+        # The variables of the bonus points of players 1 and 2, if the
+        # fight is ended by the shared fight engine.
+        bonus = [module.var_ids.get(name) for name, __ in FIGHT_BONUS_VARIABLES]
+
+        def mirror(record: Union[ConditionIR, EffectIR]):
+            """Returns a copy of record for the second round."""
+            record = record.copy()
+            # An unset player field is not a player, even if its default
+            # value is a player's number.
+            for attr in (('player',) if isinstance(record, ConditionIR)
+                         else ('player_source', 'player_target')):
+                value = getattr(record, attr)
+                if record.is_set(attr) and value in swap:
+                    setattr(record, attr, swap[value])
+            if isinstance(record, ConditionIR):
+                return record
+            if (record.effect_type == effects.create_object
+                    and record.object_list_unit_id != UNIT_ID_MAP_REVEALER):
+                record.location_x, record.location_y = (
+                    record.location_y + shift, record.location_x - shift)
+                num_facets = (32
+                              if record.object_list_unit_id
+                              == units.trebuchet_packed
+                              else 16)
+                record.facet = -record.facet % num_facets
+            elif record.effect_type == effects.change_ownership:
+                record.area_1_x, record.area_1_y = (
+                    record.area_1_y + shift, record.area_1_x - shift)
+                record.area_2_x, record.area_2_y = (
+                    record.area_2_y + shift, record.area_2_x - shift)
+            elif record.effect_type == effects.change_variable:
+                if record.from_variable in (p1_score, p2_score):
+                    p1 = record.from_variable == p1_score
+                    record.from_variable = p2_score if p1 else p1_score
+                    record.message = 'p2-score' if p1 else 'p1-score'
+                elif record.from_variable == difference:
+                    record.operation = (
+                        ChangeVarOp.subtract.value
+                        if record.operation == ChangeVarOp.add.value
+                        else ChangeVarOp.add.value)
+                elif record.from_variable in bonus:
+                    k = 1 - bonus.index(record.from_variable)
+                    record.from_variable = bonus[k]
+                    record.message = FIGHT_BONUS_VARIABLES[k][0]
+            return record
+
+        def effect_player(effect: EffectIR) -> int:
+            """Returns the number of the player of effect, or 0."""
+            if (effect.effect_type == effects.change_variable
+                    and effect.from_variable in bonus):
+                return bonus.index(effect.from_variable) + 1
+            for attr in ('player_source', 'player_target'):
+                if effect.is_set(attr) and getattr(effect, attr) in swap:
+                    return getattr(effect, attr)
+            return 0
+
+        def order_effects(effect_list: List[EffectIR],
+                          bounds: Iterable[int] = ()) -> List[EffectIR]:
+            """Returns effect_list ordered by _player_order."""
+            order = _player_order(
+                [effect_player(e) for e in effect_list], bounds)
+            return [effect_list[k] for k in order]
+
+        # The triggers, effects, and links of the players are ordered as
+        # they are built, with player 1's first. Of triggers with conditions
+        # met at the same time, such as the triggers for each player
+        # winning, the first one takes effect.
+        order = _player_order([
+            _name_player(_swap_player_names(t.name.rstrip('\x00')))
+            for t in module.triggers
+        ])
+        mirrored = module.transform(_swap_player_names, mirror, order)
+        # The order of the links determines the order of the activation
+        # and deactivation effects.
+        order = _player_order([
+            _name_player(source) or _name_player(target)
+            for _, source, target, _ in mirrored.links
+        ])
+        mirrored.links = [mirrored.links[k] for k in order]
+        for k, trigger in enumerate(mirrored.triggers):
+            slots = mirrored.slots.get(k, ())
+            trigger.effects = order_effects(
+                trigger.effects, (position for position, _ in slots))
+            for _, slot in slots:
+                if isinstance(slot, EffectBlock):
+                    slot.effects = order_effects(slot.effects)
+        return mirrored
+
+    def _placement_holds(self, placement: Placement, index: int) -> bool:
+        """Returns True if placement holds for the round at index."""
+        if placement == Placement.FIRST_ROUND:
+            return index == 1
+        if placement == Placement.LAST_ROUND:
+            return index == self.num_rounds
+        if placement == Placement.AFTER_MINIGAME:
+            return index == 1 or isinstance(self._events[index - 1], Minigame)
+        if placement == Placement.BEFORE_MINIGAME:
+            return (index != self.num_rounds
+                    and isinstance(self._events[index + 1], Minigame))
+        raise AssertionError(f'Placement {placement} is not implemented.')
+
+    def _link_round(self, module: TriggerModule, index: int) -> None:
+        """
+        Adds the triggers of module as the triggers of the round at index,
+        filling in the parts of the module that depend on the round's
+        placement.
+
+        Raises a ValueError if exactly one of index and the module's index
+        is the tiebreaker's index 0, if the module uses a variable that is
+        not named in this scenario, or if a unit the module removes is
+        not in this scenario.
+        """
+        if (module.index == 0) != (index == 0):
+            msg = (f'The module of round {module.index} cannot be linked '
+                   + f'as round {index}.')
+            raise ValueError(msg)
+        placements = {p for p in Placement if self._placement_holds(p, index)}
+        symbols = {Symbol.ROUND_INDEX: index}
+        var_map = {}
+        for name, var_id in module.var_ids.items():
+            if name not in self._var_ids:
+                raise ValueError(f'The variable {name} is not named.')
+            if self._var_ids[name] != var_id:
+                var_map[var_id] = self._var_ids[name]
+
+        def relocate(record: Union[ConditionIR, EffectIR]):
+            """Returns record with its linked values filled in."""
+            record = record.substitute(symbols)
+            if not var_map:
+                return record
+            if isinstance(record, ConditionIR):
+                if (record.condition_type == conditions.variable_value
+                        and record.variable in var_map):
+                    record = record.copy()
+                    record.variable = var_map[record.variable]
+            elif (record.effect_type == effects.change_variable
+                  and record.from_variable in var_map):
+                record = record.copy()
+                record.from_variable = var_map[record.from_variable]
+            return record
+
+        # Each technology is researched by the first slot that needs it.
+        researching = set()
+        for slot in module.researches:
+            if slot.tech_name not in self._researched_techs:
+                self._researched_techs.add(slot.tech_name)
+                researching.add(slot)
+
+        for k, source in enumerate(module.triggers):
+            name = _relocate_name(source.name.rstrip('\x00'), module.index,
+                                  index)
+            trigger = self._add_trigger(name, source)
+            trigger.conditions.extend(relocate(c) for c in source.conditions)
+            start = 0
+            for position, slot in module.slots.get(k, ()):
+                trigger.effects.extend(
+                    relocate(e) for e in source.effects[start:position])
+                start = position
+                if isinstance(slot, ResearchSlot):
+                    if slot in researching:
+                        self._add_research_effects(trigger, slot.tech_name)
+                elif slot.placement in placements:
+                    trigger.effects.extend(relocate(e) for e in slot.effects)
+            trigger.effects.extend(relocate(e) for e in source.effects[start:])
+
+        for activate, source, target, placement in module.links:
+            if placement is None or placement in placements:
+                add_link = (self._add_activate if activate
+                            else self._add_deactivate)
+                add_link(_relocate_name(source, module.index, index),
+                         _relocate_name(target, module.index, index))
+
+        player_units = {}
+        for p, reference_id in module.removed_units:
+            if p not in player_units:
+                player_units[p] = {
+                    u.reference_id: u
+                    for u in util_units.get_units_array(self._scn, p.value)
+                }
+            if reference_id not in player_units[p]:
+                msg = f'Player {p} has no unit with id {reference_id}.'
+                raise ValueError(msg)
+            self._remove_unit(player_units[p][reference_id], p)
+
+    def _remove_unit(self, unit: UnitStruct, p: Player) -> None:
+        """
+        Marks unit to be removed from player p's units in the scenario.
+
+        Removal is deferred until the end of the current round, so that
+        each player's unit list is rebuilt once per round, rather than
+        once per removed unit. While a round is built, the unit is removed
+        when the round's module is linked.
+        """
+        if self._module is not None:
+            self._module.remove_unit(p, unit.reference_id)
+        else:
+            self._removed_units[p].append(unit)
+
+    def _flush_removed_units(self) -> None:
+        """
+        Removes all units marked by _remove_unit from the scenario.
+
+        Raises a ValueError if a marked unit does not belong to its player.
+        """
+        for p, ulst in self._removed_units.items():
+            util_units.remove_units(self._scn, ulst, p)
+        self._removed_units.clear()
 
     def _add_minigame(self, index: int, mg: Minigame) -> None:
         """Adds the minigame mg with the given index."""
@@ -1872,13 +3075,6 @@ class ScnData:
 
         umgr = self._scn.object_manager.unit_manager
 
-        boar_units = {
-            unit
-            for unit in umgr.get_units_in_area(
-                x1=160.0, y1=80.0, x2=240.0, y2=160.0, players=[Player.GAIA])
-            if unit.unit_id == UCONST_BOAR
-        }
-
         scouts = dict()
         player_flags = {Player.ONE: set(), Player.TWO: set()}
 
@@ -1898,7 +3094,7 @@ class ScnData:
 
 
         for p, scout in scouts.items():
-            util_units.remove(self._scn, scout, p)
+            self._remove_unit(scout, p)
             x, y = int(scout.x), int(scout.y)
             create = rts.init.add_effect(effects.create_object)
             create.object_list_unit_id = units.scout_cavalry
@@ -1920,6 +3116,9 @@ class ScnData:
             to_p.area_1_x, to_p.area_1_y = x, y
             to_p.area_2_x, to_p.area_2_y = x, y
 
+            # The respawn check and the countdown activate each other, so
+            # only one of them is enabled at a time. The countdown's timer
+            # starts when it is activated.
             scout_respawn1_name = f'{prefix} P{p.value} Scout Respawn 1'
             scout_countdown_name = f'{prefix} P{p.value} Scout Countdown'
             scout_respawn1 = self._add_trigger(scout_respawn1_name)
@@ -1944,7 +3143,7 @@ class ScnData:
 
         for p, flags in player_flags.items():
             for flag in flags:
-                util_units.remove(self._scn, flag, p)
+                self._remove_unit(flag, p)
                 x, y = int(flag.x), int(flag.y)
 
                 create = rts.init.add_effect(effects.create_object)
@@ -1967,7 +3166,16 @@ class ScnData:
                 to_p.area_1_x, to_p.area_1_y = x, y
                 to_p.area_2_x, to_p.area_2_y = x, y
 
+        # Each flag is checked every tick by a trigger of its own, so a
+        # Boar that only crosses a flag is captured as well. The trigger
+        # does not loop, so it stops being checked once its flag captures
+        # a Boar and is replaced.
+        capture_names = []
+        for p, flags in player_flags.items():
+            for flag in sorted(flags, key=lambda flag: (flag.x, flag.y)):
+                x, y = int(flag.x), int(flag.y)
                 name = f'{prefix} P{p.value} Capture at ({flag.x}, {flag.y})'
+                capture_names.append(name)
                 self._add_activate(rts.names.begin, name)
                 capture = self._add_trigger(name)
                 capture.enabled = False
@@ -1990,10 +3198,7 @@ class ScnData:
                 replace.object_list_unit_id = FLAG_A_UCONST
                 replace.object_list_unit_id_2 = units.scout_cavalry
                 util_triggers.set_effect_area(replace, x, y, x, y)
-                if p == Player.ONE:
-                    self._add_effect_p1_score(capture, BOAR_POINTS)
-                else:
-                    self._add_effect_p2_score(capture, BOAR_POINTS)
+                self._add_effect_score(capture, p, BOAR_POINTS)
                 inc_var = capture.add_effect(effects.change_variable)
                 inc_var.quantity = 1
                 inc_var.operation = ChangeVarOp.add.value
@@ -2001,8 +3206,9 @@ class ScnData:
                 inc_var.from_variable = self._var_ids[var_name]
                 inc_var.message = var_name
 
-                for win_trigger_name in (rts.names.p1_wins, rts.names.p2_wins):
-                    self._add_deactivate(win_trigger_name, name)
+        for end_name in (rts.names.p1_wins, rts.names.p2_wins, boar_dead_name):
+            for name in capture_names:
+                self._add_deactivate(end_name, name)
 
         p1_boar = rts.p1_wins.add_condition(conditions.variable_value)
         p1_boar.amount_or_quantity = 5
@@ -2018,12 +3224,16 @@ class ScnData:
         self._add_deactivate(rts.names.p2_wins, rts.names.p1_wins)
         self._add_deactivate(rts.names.p2_wins, boar_dead_name)
 
+        # Boar that are captured are removed, and Boar that are killed are
+        # replaced by dead Boar, so all Boar are dead once no Boar remain.
         boar_dead = self._add_trigger(boar_dead_name)
         boar_dead.enabled = False
-        for boar in boar_units:
-            # util_triggers.add_cond_hp0(boar_dead, boar.reference_id)
-            destroy = boar_dead.add_condition(conditions.destroy_object)
-            destroy.unit_object = boar.reference_id
+        no_boar = boar_dead.add_condition(conditions.object_in_area)
+        no_boar.inverted = True
+        no_boar.amount_or_quantity = 1
+        no_boar.player = 0
+        no_boar.object_list = UCONST_BOAR
+        util_triggers.set_cond_area(no_boar, 160, 80, 239, 159)
         self._add_deactivate(boar_dead_name, rts.names.p1_wins)
         self._add_deactivate(boar_dead_name, rts.names.p2_wins)
         self._add_activate(boar_dead_name, rts.names.cleanup)
@@ -2061,7 +3271,7 @@ class ScnData:
             x, y = int(unit.x), int(unit.y)
             flag_positions[next_flag] = (x, y)
             next_flag = chr(ord(next_flag) + 1)
-            util_units.remove(self._scn, unit, Player.GAIA)
+            self._remove_unit(unit, Player.GAIA)
 
             create = rts.init.add_effect(effects.create_object)
             create.object_list_unit_id = unit.unit_id
@@ -2358,9 +3568,9 @@ class ScnData:
         res_xbow_1_name = f'{prefix} Xbow Timer Research Player 1'
         res_xbow_2_name = f'{prefix} Xbow Timer Research Player 2'
         x1, y1, x2, y2 = 0, 160, 79, 239
-        def set_condition_area(condition: ConditionObject):
+        def set_condition_area(condition: ConditionIR):
             util_triggers.set_cond_area(condition, x1, y1, x2, y2)
-        def set_effect_area(effect: EffectObject):
+        def set_effect_area(effect: EffectIR):
             util_triggers.set_effect_area(effect, x1, y1, x2, y2)
 
         timer_r1 = rts.begin.add_effect(effects.display_timer)
@@ -2585,19 +3795,21 @@ class ScnData:
         util_triggers.add_effect_modify_res(
             rts.init, 10000, util_triggers.ACC_ATTR_GOLD)
 
-        begin2_name = f'{prefix} Capture the Relic Begin Round 2'
-        begin3_name = f'{prefix} Capture the Relic Begin Round 3'
         create_relics_name = f'{prefix} Capture the Relic Create Relics'
         round_cleanup_name = f'{prefix} Capture the Relic Round Cleanup'
 
-        r1_cond_names = [f'{prefix} Capture the Relic {i}-{ROUND_RELICS[1]-i}'
-                         for i in range(ROUND_RELICS[1] + 1)]
-
-        r2_cond_names = [f'{prefix} Capture the Relic {i}-{ROUND_RELICS[2]-i}'
-                         for i in range(ROUND_RELICS[2] + 1)]
-
-        r3_cond_names = [f'{prefix} Capture the Relic {i}-{ROUND_RELICS[3]-i}'
-                         for i in range(ROUND_RELICS[3] + 1)]
+        # Maps each round of relics to the name of the trigger that begins
+        # it, and the name of the trigger that ends it once its relics are
+        # captured.
+        begin_names = {
+            k: (f'{prefix} Capture the Relic Begin Round {k}'
+                if k != 1 else rts.names.begin)
+            for k in ROUND_RELICS
+        }
+        captured_names = {k: f'{prefix} Capture the Relic Round {k} Captured'
+                          for k in ROUND_RELICS}
+        last_round = max(ROUND_RELICS)
+        total_relics = ROUND_RELICS[last_round]
 
         p1_template = util_units.get_units_array(self._arena, 1)
         p2_template = util_units.get_units_array(self._arena, 2)
@@ -2605,77 +3817,38 @@ class ScnData:
         p1_pos = (19, 100)
         p2_pos = (59, 141)
 
-        self._add_effect_research_tech(rts.begin, 'atonement')
-        begin2 = self._add_trigger(begin2_name)
-        begin2.enabled = False
-        util_triggers.add_cond_timer(begin2, 3)
-        for tech_name in ['sanctity', 'redemption']:
-            self._add_effect_research_tech(begin2, tech_name)
-        begin3 = self._add_trigger(begin3_name)
-        begin3.enabled = False
-        util_triggers.add_cond_timer(begin3, 3)
-
         # Invisible objects cause issues with Monks, uses Create Object instead.
-
-        # R1 - P1
-        r1p1 = util_units.units_in_area(p1_template, 0.0, 0.0, 10.0, 10.0)
-        for unit in r1p1:
-            create = rts.begin.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 1
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 0 + p1_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 0 + p1_pos[1] + 1
-
-        # R1 - P2
-        r1p2 = util_units.units_in_area(p2_template, 10.0, 0.0, 20.0, 10.0)
-        for unit in r1p2:
-            create = rts.begin.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 2
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 19 + p2_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 9 + p2_pos[1]
-
-        # R2 - P1
-        r2p1 = util_units.units_in_area(p1_template, 0.0, 10.0, 10.0, 20.0)
-        for unit in r2p1:
-            create = begin2.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 1
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 0 + p1_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 10 + p1_pos[1] + 1
-
-        # R2 - P2
-        r2p2 = util_units.units_in_area(p2_template, 10.0, 10.0, 20.0, 20.0)
-        for unit in r2p2:
-            create = begin2.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 2
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 19 + p2_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 19 + p2_pos[1]
-
-        # R3 - P1
-        r3p1 = util_units.units_in_area(p1_template, 0.0, 20.0, 10.0, 30.0)
-        for unit in r3p1:
-            create = begin3.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 1
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 0 + p1_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 20 + p1_pos[1] + 1
-
-        # R3 - P2
-        r3p2 = util_units.units_in_area(p2_template, 10.0, 20.0, 20.0, 30.0)
-        for unit in r3p2:
-            create = begin3.add_effect(effects.create_object)
-            create.object_list_unit_id = unit.unit_id
-            create.player_source = 2
-            create.facet = util_units.rad_to_facet(unit.rotation)
-            create.location_x = int(util_units.get_x(unit)) - 19 + p2_pos[0] + 1
-            create.location_y = int(util_units.get_y(unit)) - 29 + p2_pos[1]
+        for k, begin_name in begin_names.items():
+            if k == 1:
+                begin = rts.begin
+            else:
+                begin = self._add_trigger(begin_name)
+                begin.enabled = False
+                util_triggers.add_cond_timer(begin, 3)
+            for tech_name in ROUND_RELIC_TECHS.get(k, []):
+                self._add_effect_research_tech(begin, tech_name)
+            # The units of the round are between rows y1 and y2.
+            y1, y2 = 10 * (k - 1), 10 * k
+            for unit in util_units.units_in_area(p1_template,
+                                                 0.0, y1, 10.0, y2):
+                create = begin.add_effect(effects.create_object)
+                create.object_list_unit_id = unit.unit_id
+                create.player_source = 1
+                create.facet = util_units.rad_to_facet(unit.rotation)
+                create.location_x = (int(util_units.get_x(unit))
+                                     + p1_pos[0] + 1)
+                create.location_y = (int(util_units.get_y(unit)) - y1
+                                     + p1_pos[1] + 1)
+            for unit in util_units.units_in_area(p2_template,
+                                                 10.0, y1, 20.0, y2):
+                create = begin.add_effect(effects.create_object)
+                create.object_list_unit_id = unit.unit_id
+                create.player_source = 2
+                create.facet = util_units.rad_to_facet(unit.rotation)
+                create.location_x = (int(util_units.get_x(unit)) - 19
+                                     + p2_pos[0] + 1)
+                create.location_y = (int(util_units.get_y(unit))
+                                     - (y2 - 1) + p2_pos[1])
 
         for p in (Player.ONE, Player.TWO):
             for unit in umgr.get_units_in_area(0.0, 80.0, 80.0, 160.0,
@@ -2693,7 +3866,7 @@ class ScnData:
             create.location_y = y
             create.object_list_unit_id = UCONST_RELIC
 
-        for name in (rts.names.begin, begin2_name, begin3_name):
+        for name in begin_names.values():
             self._add_activate(name, create_relics_name)
 
         # Additional consts consists of Monks and all units added by
@@ -2717,84 +3890,133 @@ class ScnData:
                 remove.object_list_unit_id = uconst
                 util_triggers.set_effect_area(remove, 0, 80, 79, 159)
 
-        # Capturing 3 relics activates round 2.
-        for i, name in enumerate(r1_cond_names):
-            j = ROUND_RELICS[1] - i
-            relics1 = self._add_trigger(name)
-            relics1.enabled = False
-            self._add_activate(rts.names.begin, name)
-            if i:
-                acci = relics1.add_condition(conditions.accumulate_attribute)
-                acci.amount_or_quantity = i
-                acci.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                acci.player = 1
-            if j:
-                accj = relics1.add_condition(conditions.accumulate_attribute)
-                accj.amount_or_quantity = j
-                accj.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                accj.player = 2
-            for n in r1_cond_names:
-                if name != n:
-                    self._add_deactivate(name, n)
-            self._add_activate(name, round_cleanup_name)
-            self._add_activate(name, begin2_name)
-
-        # Capturing 6 relics activates round 3.
-        for i, name in enumerate(r2_cond_names):
-            j = ROUND_RELICS[2] - i
-            relics2 = self._add_trigger(name)
-            relics2.enabled = False
-            self._add_activate(begin2_name, name)
-            if i:
-                acci = relics2.add_condition(conditions.accumulate_attribute)
-                acci.amount_or_quantity = i
-                acci.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                acci.player = 1
-            if j:
-                accj = relics2.add_condition(conditions.accumulate_attribute)
-                accj.amount_or_quantity = j
-                accj.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                accj.player = 2
-            for n in r2_cond_names:
-                if name != n:
-                    self._add_deactivate(name, n)
-            self._add_activate(name, round_cleanup_name)
-            self._add_activate(name, begin3_name)
-
-        # Capturing 9 relics checks which player wins and awards points.
-        for i, name in enumerate(r3_cond_names):
-            j = ROUND_RELICS[3] - i
-            relics3 = self._add_trigger(name)
-            relics3.enabled = False
-            self._add_activate(begin3_name, name)
-            if i:
-                acci = relics3.add_condition(conditions.accumulate_attribute)
-                acci.amount_or_quantity = i
-                acci.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                acci.player = 1
-            if j:
-                accj = relics3.add_condition(conditions.accumulate_attribute)
-                accj.amount_or_quantity = j
-                accj.resource_type_or_tribute_list = (
-                    util_triggers.ACC_ATTR_RELICS)
-                accj.player = 2
-            if i > j:
-                self._add_activate(name, rts.names.p1_wins)
-                self._add_effect_p1_score(relics3, 10)
-            else:
-                self._add_activate(name, rts.names.p2_wins)
-                self._add_effect_p2_score(relics3, 10)
-            self._add_effect_p1_score(relics3, i * 10)
-            self._add_effect_p2_score(relics3, j * 10)
-            for n in r3_cond_names:
-                if name != n:
-                    self._add_deactivate(name, n)
-            self._add_activate(name, round_cleanup_name)
+        # Counts the relics in variables, rather than with a trigger for
+        # every split of the relics between the players. Each count
+        # subtracts the relic from the player's relics, so the condition
+        # holds again when the next relic is captured. A relic taken out
+        # of a Monastery makes the player's relics negative, and is
+        # uncounted, so the sum of the relics and the count is always the
+        # number of relics the player holds.
+        count_names = {}
+        uncount_names = {}
+        for p in (Player.ONE, Player.TWO):
+            count_names[p] = f'{prefix} Capture the Relic P{p.value} Relic'
+            count = self._add_trigger(count_names[p])
+            count.enabled = False
+            count.looping = True
+            self._add_activate(rts.names.begin, count_names[p])
+            captured = count.add_condition(conditions.accumulate_attribute)
+            captured.amount_or_quantity = 1
+            captured.resource_type_or_tribute_list = (
+                util_triggers.ACC_ATTR_RELICS)
+            captured.player = p.value
+            uncount = count.add_effect(effects.modify_resource)
+            uncount.player_source = p.value
+            uncount.quantity = 1
+            uncount.tribute_list = util_triggers.ACC_ATTR_RELICS
+            uncount.item_id = -1
+            uncount.operation = ChangeVarOp.subtract.value
+            for var_name in (f'p{p.value}-relics', f'p{p.value}-relic-points',
+                             'relics-captured'):
+                inc = count.add_effect(effects.change_variable)
+                inc.quantity = 1
+                inc.operation = ChangeVarOp.add.value
+                inc.from_variable = self._var_ids[var_name]
+                inc.message = var_name
+
+            uncount_names[p] = f'{prefix} Capture the Relic P{p.value} Lost'
+            uncount = self._add_trigger(uncount_names[p])
+            uncount.enabled = False
+            uncount.looping = True
+            self._add_activate(rts.names.begin, uncount_names[p])
+            lost = uncount.add_condition(conditions.accumulate_attribute)
+            lost.amount_or_quantity = 0
+            lost.resource_type_or_tribute_list = util_triggers.ACC_ATTR_RELICS
+            lost.player = p.value
+            lost.inverted = True
+            recount = uncount.add_effect(effects.modify_resource)
+            recount.player_source = p.value
+            recount.quantity = 1
+            recount.tribute_list = util_triggers.ACC_ATTR_RELICS
+            recount.item_id = -1
+            recount.operation = ChangeVarOp.add.value
+            for var_name in (f'p{p.value}-relics', f'p{p.value}-relic-points',
+                             'relics-captured'):
+                dec = uncount.add_effect(effects.change_variable)
+                dec.quantity = 1
+                dec.operation = ChangeVarOp.subtract.value
+                dec.from_variable = self._var_ids[var_name]
+                dec.message = var_name
+
+        # Capturing the relics of a round begins the next round.
+        for k, captured_name in captured_names.items():
+            round_captured = self._add_trigger(captured_name)
+            round_captured.enabled = False
+            self._add_activate(begin_names[k], captured_name)
+            total = round_captured.add_condition(conditions.variable_value)
+            total.amount_or_quantity = ROUND_RELICS[k]
+            total.variable = self._var_ids['relics-captured']
+            total.comparison = VarValComp.larger_or_equal.value
+            self._add_activate(captured_name, round_cleanup_name)
+            if k != last_round:
+                self._add_activate(captured_name, begin_names[k + 1])
+
+        # Capturing the last relic checks which player wins. Player 1 has
+        # more relics if they have more than half of them, and ties go to
+        # Player 2.
+        most_names = {
+            p: f'{prefix} Capture the Relic P{p.value} Most Relics'
+            for p in (Player.ONE, Player.TWO)
+        }
+        for p in (Player.ONE, Player.TWO):
+            most = self._add_trigger(most_names[p])
+            most.enabled = False
+            self._add_activate(captured_names[last_round], most_names[p])
+            most_cond = most.add_condition(conditions.variable_value)
+            most_cond.amount_or_quantity = total_relics // 2
+            most_cond.variable = self._var_ids['p1-relics']
+            most_cond.comparison = (VarValComp.larger.value
+                                    if p == Player.ONE
+                                    else VarValComp.less_or_equal.value)
+            most_var = most.add_effect(effects.change_variable)
+            most_var.quantity = 1
+            most_var.operation = ChangeVarOp.set_op.value
+            most_var.from_variable = self._var_ids[f'p{p.value}-most-relics']
+            most_var.message = f'p{p.value}-most-relics'
+            self._add_effect_score(most, p, 10)
+            self._add_deactivate(most_names[p], most_names[other_player(p)])
+            self._add_activate(
+                most_names[p],
+                rts.names.p1_wins if p == Player.ONE else rts.names.p2_wins)
+        for name in (*count_names.values(), *uncount_names.values()):
+            self._add_deactivate(captured_names[last_round], name)
+
+        # Since effects cannot add a variable to a score, the points for
+        # the relics are awarded by one trigger for each power of two,
+        # from the largest down, each adding its points if that many
+        # relics remain.
+        points_names = []
+        for p in (Player.ONE, Player.TWO):
+            points_var = f'p{p.value}-relic-points'
+            for bit in range(total_relics.bit_length() - 1, -1, -1):
+                relics = 1 << bit
+                points_name = (f'{prefix} Capture the Relic'
+                               + f' P{p.value} Points {relics}')
+                points_names.append(points_name)
+                points = self._add_trigger(points_name)
+                points.enabled = False
+                remaining = points.add_condition(conditions.variable_value)
+                remaining.amount_or_quantity = relics
+                remaining.variable = self._var_ids[points_var]
+                remaining.comparison = VarValComp.larger_or_equal.value
+                self._add_effect_score(points, p, relics * 10)
+                use_points = points.add_effect(effects.change_variable)
+                use_points.quantity = relics
+                use_points.operation = ChangeVarOp.subtract.value
+                use_points.from_variable = self._var_ids[points_var]
+                use_points.message = points_var
+                self._add_activate(captured_names[last_round], points_name)
+                self._add_deactivate(rts.names.cleanup, points_name)
 
         # Defeats a player if they lose their Monasteries.
         for p in (Player.ONE, Player.TWO):
@@ -2814,8 +4036,11 @@ class ScnData:
             self._add_deactivate(rts.names.p1_wins, name)
             self._add_deactivate(rts.names.p2_wins, name)
             self._add_deactivate(name, other_name)
-            for cond_name in r1_cond_names + r2_cond_names + r3_cond_names:
-                self._add_deactivate(name, cond_name)
+            for relic_name in (*count_names.values(),
+                               *uncount_names.values(),
+                               *captured_names.values(),
+                               *most_names.values(), *points_names):
+                self._add_deactivate(name, relic_name)
             if p == Player.ONE:
                 self._add_effect_p2_score(lose, 100)
             else:
@@ -3165,6 +4390,9 @@ class ScnData:
 
     def _add_fight(self, index: int, f: Fight) -> None:
         """Adds the fight with the given index."""
+        if self._options.shared_fights and index:
+            self._add_shared_fight(index, f)
+            return
         rts = _RoundTriggers(self, index)
 
         self._add_activate(rts.names.begin, rts.names.p1_wins)
@@ -3187,6 +4415,13 @@ class ScnData:
         Adds the units from the player's unit list to the scenario.
         `index` is the index of the fight in which the units participate.
         Checks that p is Player.ONE or Player.TWO.
+
+        For each unit type, the trigger that scores the kth unit of that
+        type to die is activated by the trigger that scores the (k-1)st
+        unit, so that only one trigger per unit type checks the fight's
+        area at a time, rather than one trigger per unit. The trigger
+        numbered k scores when fewer than k + 1 of the units remain, so
+        the chain runs from the highest number down to 0.
         """
         assert p in (Player.ONE, Player.TWO)
         prefix = f'[R{index}]' if index else '[T]' # Index 0 is the Tiebreaker.
@@ -3195,7 +4430,8 @@ class ScnData:
         ucnts = Counter(u.unit_id for u in ulst)
         for uconst, cnt in ucnts.items():
             uname = units.unit_names[uconst]
-            for k in range(cnt):
+            prev_name = rts.names.begin
+            for k in reversed(range(cnt)):
                 pts_name = (
                     f'{prefix} P{p.value} {util.pretty_print_name(uname)} {k}'
                 )
@@ -3207,7 +4443,9 @@ class ScnData:
                 obj_in_area.amount_or_quantity = k + 1
                 obj_in_area.player = p.value
                 obj_in_area.object_list = uconst
-                self._add_activate(rts.names.begin, pts_name)
+                self._add_activate(prev_name, pts_name)
+                prev_name = pts_name
+                # Any trigger in the chain may be the active one.
                 self._add_deactivate(
                     rts.names.p1_wins if p == Player.ONE else rts.names.p2_wins,
                     pts_name)
@@ -3222,6 +4460,162 @@ class ScnData:
             remove.player_source = p.value
             util_triggers.set_effect_area(remove, 80, 80, 159, 159)
 
+    def _add_shared_fight(self, index: int, f: Fight) -> None:
+        """
+        Adds the fight with the given index, which is ended by the triggers
+        of the shared fight engine. The fight's own triggers only create
+        its units, set the bonus points of the fight engine's variables,
+        and give the units to the players when the fight begins.
+        """
+        rts = _RoundTriggers(self, index, shared_end=True)
+        for (name, __), bonus in zip(FIGHT_BONUS_VARIABLES,
+                                     (f.p1_bonus, f.p2_bonus)):
+            set_bonus = rts.init.add_effect(effects.change_variable)
+            set_bonus.quantity = bonus
+            set_bonus.operation = ChangeVarOp.set_op.value
+            set_bonus.from_variable = self._var_ids[name]
+            set_bonus.message = name
+        for p in (Player.ONE, Player.TWO):
+            self._add_activate(rts.names.begin, _fight_wins_name(p.value))
+        for p, ulst in ((Player.ONE, f.p1_units), (Player.TWO, f.p2_units)):
+            for u in ulst:
+                self._create_unit_sequence(p, u, rts, False)
+            for uconst, cnt in Counter(u.unit_id for u in ulst).items():
+                uname = units.unit_names[uconst]
+                self._add_activate(
+                    rts.names.begin,
+                    _fight_kill_name(p.value, uname, f.points[uname], cnt - 1))
+
+    def _add_fight_engine(self) -> None:
+        """
+        Adds the shared fight engine, the triggers that end every fight
+        other than the tiebreaker, so that the number of triggers of the
+        scenario hardly grows with the number of fights.
+
+        Each fight's init trigger creates its units and sets the
+        FIGHT_BONUS_VARIABLES to the fight's bonus points, and its begin
+        trigger activates the engine's triggers for each player winning
+        and the first of its chains of kill triggers. The engine's kill
+        triggers are shared by all fights with the same number of points
+        for the same unit of the same player. Since effects cannot add
+        a variable to a score, the bonus points are awarded by one trigger
+        for each power of two, from the largest down, each adding its
+        points if that many bonus points remain. The effects that depend
+        on a fight's placement are made by triggers that fire only in
+        that fight's round.
+        """
+        fights = [(index, e) for index, e in enumerate(self._events)
+                  if index and isinstance(e, Fight)]
+        if not fights:
+            return
+        self._add_trigger_header('Fight Engine')
+
+        # Maps (player, unit constant, points) to the largest number of
+        # the units in a fight, and a player to the unit constants.
+        chains = Counter()
+        player_units = defaultdict(set)
+        for __, f in fights:
+            for p, ulst in ((Player.ONE, f.p1_units),
+                            (Player.TWO, f.p2_units)):
+                for uconst, cnt in Counter(u.unit_id for u in ulst).items():
+                    pts = f.points[units.unit_names[uconst]]
+                    key = (p.value, uconst, pts)
+                    chains[key] = max(chains[key], cnt)
+                    player_units[p].add(uconst)
+
+        bonus_bits = range(event.MAX_POINTS.bit_length() - 1, -1, -1)
+        for p in (Player.ONE, Player.TWO):
+            wins_name = _fight_wins_name(p.value)
+            wins = self._add_trigger(wins_name)
+            wins.enabled = False
+            util_triggers.add_cond_pop0(wins, other_player(p).value)
+            self._add_deactivate(
+                wins_name, _fight_wins_name(other_player(p).value))
+            self._add_activate(wins_name, FIGHT_CLEANUP_NAME)
+        for p in (Player.ONE, Player.TWO):
+            bonus_name = FIGHT_BONUS_VARIABLES[p.value - 1][0]
+            for bit in bonus_bits:
+                pts = 1 << bit
+                bonus_bit_name = _fight_bonus_name(p.value, pts)
+                bonus_bit = self._add_trigger(bonus_bit_name)
+                bonus_bit.enabled = False
+                remaining = bonus_bit.add_condition(conditions.variable_value)
+                remaining.amount_or_quantity = pts
+                remaining.variable = self._var_ids[bonus_name]
+                remaining.comparison = VarValComp.larger_or_equal.value
+                self._add_effect_score(bonus_bit, p, pts)
+                use_bonus = bonus_bit.add_effect(effects.change_variable)
+                use_bonus.quantity = pts
+                use_bonus.operation = ChangeVarOp.subtract.value
+                use_bonus.from_variable = self._var_ids[bonus_name]
+                use_bonus.message = bonus_name
+                self._add_activate(_fight_wins_name(p.value), bonus_bit_name)
+                self._add_deactivate(FIGHT_CLEANUP_NAME, bonus_bit_name)
+
+        for (player, uconst, pts), cnt in sorted(chains.items()):
+            uname = units.unit_names[uconst]
+            for k in reversed(range(cnt)):
+                kill_name = _fight_kill_name(player, uname, pts, k)
+                kill = self._add_trigger(kill_name)
+                kill.enabled = False
+                obj_in_area = kill.add_condition(conditions.object_in_area)
+                obj_in_area.inverted = True
+                util_triggers.set_cond_area(obj_in_area, 80, 80, 159, 159)
+                obj_in_area.amount_or_quantity = k + 1
+                obj_in_area.player = player
+                obj_in_area.object_list = uconst
+                if k:
+                    self._add_activate(
+                        kill_name, _fight_kill_name(player, uname, pts, k - 1))
+                self._add_deactivate(_fight_wins_name(player), kill_name)
+                self._add_effect_score(
+                    kill, other_player(Player(player)), pts)
+
+        cleanup = self._add_trigger(FIGHT_CLEANUP_NAME)
+        cleanup.enabled = False
+        util_triggers.add_cond_timer(cleanup, DELAY_CLEANUP)
+        for p in (Player.ONE, Player.TWO):
+            for uconst in sorted(player_units[p]):
+                remove = cleanup.add_effect(effects.remove_object)
+                remove.object_list_unit_id = uconst
+                remove.player_source = p.value
+                util_triggers.set_effect_area(remove, 80, 80, 159, 159)
+        for index, __ in fights:
+            for obj_name in self._round_objectives[index]:
+                self._add_deactivate(FIGHT_CLEANUP_NAME, obj_name)
+        self._add_activate(FIGHT_CLEANUP_NAME, FIGHT_INC_NAME)
+
+        inc = self._add_trigger(FIGHT_INC_NAME)
+        inc.enabled = False
+        util_triggers.add_cond_timer(inc, DELAY_ROUND_AFTER)
+        change_round = inc.add_effect(effects.change_variable)
+        change_round.quantity = 1
+        change_round.operation = ChangeVarOp.add.value
+        change_round.from_variable = self._var_ids['round']
+        change_round.message = 'round'
+
+        hide_name = revealer_hide_name((FIGHT_CENTER_X, FIGHT_CENTER_Y))
+        for index, __ in fights:
+            last = self._placement_holds(Placement.LAST_ROUND, index)
+            before = self._placement_holds(Placement.BEFORE_MINIGAME, index)
+            if not (last or before):
+                continue
+            end_name = _fight_end_name(index)
+            end = self._add_trigger(end_name)
+            end.enabled = False
+            in_round = end.add_condition(conditions.variable_value)
+            in_round.amount_or_quantity = index
+            in_round.variable = self._var_ids['round']
+            in_round.comparison = VarValComp.equal.value
+            if last:
+                # Disables the Round N/N counter for the final round.
+                self._add_deactivate(end_name, ROUND_OBJ_NAME)
+            if before:
+                self._add_activate(end_name, hide_name)
+            self._add_activate(FIGHT_CLEANUP_NAME, end_name)
+            # The trigger of another fight would otherwise remain active.
+            self._add_deactivate(FIGHT_INC_NAME, end_name)
+
 
 def build_scenario(scenario_template: str = SCENARIO_TEMPLATE,
                    unit_template: str = UNIT_TEMPLATE,
@@ -3230,7 +4624,10 @@ def build_scenario(scenario_template: str = SCENARIO_TEMPLATE,
                    arena_template: str = ARENA_TEMPLATE,
                    output: str = OUTPUT,
                    hero: int = REGICIDE_DEFAULT_HERO,
-                   buff: bool = REGICIDE_DEFAULT_BUFF):
+                   buff: bool = REGICIDE_DEFAULT_BUFF,
+                   compression: str = 'max',
+                   jobs: int = None,
+                   options: BuildOptions = None):
     """
     Builds the scenario.
 
@@ -3240,24 +4637,99 @@ def build_scenario(scenario_template: str = SCENARIO_TEMPLATE,
             are added to it.
         unit_template: A template of unit formations to copy for fights.
         output: The output path to which the resulting scenario is written.
+        compression: The name of the compression level with which the
+            output is written, a key of util_scn.COMPRESSION_LEVELS.
+        jobs: The number of worker processes, defaults to the number of
+            CPUs. With more than one job, the rounds' triggers are
+            serialized in the workers; with one, in this process.
+        options: The BuildOptions of the scenario, or None for the
+            default options.
+
+    The modules of the fights are read from and added to module_cache().
     """
-    scn = AoE2Scenario(scenario_template)
-    units_scn = AoE2Scenario(unit_template)
+    jobs = jobs or os.cpu_count() or 1
     fight_data_list = event.load_fight_data(event_json)
+    minigame_names = {e.name for e in fight_data_list
+                      if isinstance(e, Minigame)}
+    # The templates are parsed concurrently. Each unit template is read
+    # in a worker process and only its units are sent back.
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        units_future = executor.submit(util_scn.UnitScenario, unit_template)
+        xbow_future = (executor.submit(util_scn.UnitScenario, xbow_template)
+                       if 'Xbow Timer' in minigame_names else None)
+        arena_future = (executor.submit(util_scn.UnitScenario, arena_template)
+                        if 'Capture the Relic' in minigame_names else None)
+        # The scenario template is the largest file. It is parsed in this
+        # process, so it never needs to be copied between processes.
+        scn = util_scn.read_scenario(scenario_template)
+        units_scn = units_future.result()
+        xbow_scn = xbow_future.result() if xbow_future else None
+        arena_scn = arena_future.result() if arena_future else None
+        scn_data = make_scenario(scn, units_scn, fight_data_list, xbow_scn,
+                                 arena_scn, hero, buff,
+                                 executor if jobs > 1 else None,
+                                 module_cache(), options)
+        scn_data.write_to_file(output, compression)
+
+
+def module_cache() -> ModuleCache:
+    """
+    Returns the persistent cache of the modules of fights, stored in
+    MODULE_CACHE_DIR. The cache's entries are not read after a change to
+    the code that builds the modules.
+    """
+    version = trigger_module.source_digest(
+        sys.modules[__name__], trigger_ir, trigger_module, util,
+        util_triggers, util_units, conditions, effects, units)
+    return ModuleCache(MODULE_CACHE_DIR, version, MODULE_CACHE_MAX_BYTES)
+
+
+def make_scenario(scn: AoE2Scenario, units_scn: util_scn.UnitScenario,
+                  fight_data_list, xbow_scn: util_scn.UnitScenario,
+                  arena_scn: util_scn.UnitScenario,
+                  hero: int = REGICIDE_DEFAULT_HERO,
+                  buff: bool = REGICIDE_DEFAULT_BUFF,
+                  executor: Executor = None,
+                  cache: ModuleCache = None,
+                  options: BuildOptions = None) -> ScnData:
+    """
+    Sets up the Micro Wars scenario from the parsed template scn, and
+    returns it without writing it to a file.
+
+    fight_data_list is the list of events loaded by event.load_fight_data.
+    The fights are made from the units of units_scn, which are moved.
+    xbow_scn and arena_scn are used only if the events contain the Xbow
+    Timer or Capture the Relic minigames, and may be None otherwise.
+    The triggers are serialized by executor, the modules of the fights are
+    cached in cache, and the scenario is built with options, see ScnData.
+    """
+    scn_data = prepare_scenario(scn, units_scn, fight_data_list, xbow_scn,
+                                arena_scn, hero, buff, executor, cache=cache,
+                                options=options)
+    scn_data.setup_rounds()
+    return scn_data
+
+
+def prepare_scenario(scn: AoE2Scenario, units_scn: util_scn.UnitScenario,
+                     fight_data_list, xbow_scn: util_scn.UnitScenario,
+                     arena_scn: util_scn.UnitScenario,
+                     hero: int = REGICIDE_DEFAULT_HERO,
+                     buff: bool = REGICIDE_DEFAULT_BUFF,
+                     executor: Executor = None,
+                     modules: Dict[tuple, TriggerModule] = None,
+                     cache: ModuleCache = None,
+                     options: BuildOptions = None) -> ScnData:
+    """
+    Returns the ScnData for the same arguments as make_scenario, with
+    only the shared setup stages run. Its rounds are not yet set up.
+    The rounds are linked from and added to modules, see ScnData.
+    """
     events = event.make_fights(units_scn, fight_data_list,
                                (FIGHT_CENTER_X, FIGHT_CENTER_Y), FIGHT_OFFSET)
-    xbow_scn = (AoE2Scenario(xbow_template)
-                if any(isinstance(e, Minigame) and e.name == 'Xbow Timer'
-                       for e in events)
-                else None)
-    arena_scn = (AoE2Scenario(arena_template)
-                 if any(isinstance(e, Minigame)
-                        and e.name == 'Capture the Relic'
-                        for e in events)
-                 else None)
-    scn_data = ScnData(scn, events, xbow_scn, arena_scn, hero, buff)
-    scn_data.setup_scenario()
-    scn_data.write_to_file(output)
+    scn_data = ScnData(scn, events, xbow_scn, arena_scn, hero, buff, executor,
+                       modules, cache, options)
+    scn_data.setup_shared_stages()
+    return scn_data
 
 
 def call_build_scenario(args):
@@ -3270,32 +4742,279 @@ def call_build_scenario(args):
     out = args.output[0]
     hero = args.hero[0]
     buff = args.buff
+    compression = args.compression
+    jobs = args.jobs
+
+    check_output(out, [('map', scenario_map), ('units', units_scn),
+                       ('events', event_json), ('xbow', xbow_scn),
+                       ('arena', arena_scn)])
+    check_hero(hero)
 
-    # Checks the output path is different from all input paths.
-    matches = []
-    if out == scenario_map:
-        matches.append('map')
-    if out == units_scn:
-        matches.append('units')
-    if out == event_json:
-        matches.append('events')
-    if out == xbow_scn:
-        matches.append('xbow')
-    if out == arena_scn:
-        matches.append('arena')
+    build_scenario(scenario_template=scenario_map, unit_template=units_scn,
+                   event_json=event_json, output=out, hero=hero, buff=buff,
+                   compression=compression, jobs=jobs,
+                   options=build_options(args))
+
+
+def build_options(args) -> BuildOptions:
+    """Returns the BuildOptions given by the command line args."""
+    return BuildOptions(activation_batch=args.activation_batch or None,
+                        shared_fights=args.shared_fights,
+                        compact_objectives=args.compact_objectives)
+
+
+def check_output(out: str, inputs: Iterable[Tuple[str, str]]) -> None:
+    """
+    Raises a ValueError if the output path out is the same file as any of
+    the input paths. inputs is a list of pairs of the name of an input
+    argument and its path.
+    """
+    matches = [name for name, path in inputs if _same_path(out, path)]
     if matches:
         conflicts = ', '.join(matches)
         msg = f"The output path '{out}' conflicts with: {conflicts}."
         raise ValueError(msg)
-    if hero not in (units.king, UCONST_JOAN_OF_ARC, UCONST_GENGHIS_KHAN):
-        msg = (f'hero is {hero} but must be one of:\n'
-               + f'  {units.king} - King\n'
-               + f'  {UCONST_JOAN_OF_ARC} - Joan\n'
-               + f'  {UCONST_GENGHIS_KHAN} - Khan')
+
+
+def _same_path(path1: str, path2: str) -> bool:
+    """Returns True if path1 and path2 name the same file, False if not."""
+    return (os.path.normcase(os.path.abspath(path1))
+            == os.path.normcase(os.path.abspath(path2)))
+
+
+def check_hero(hero: int) -> None:
+    """Raises a ValueError if hero is not a Regicide hero."""
+    if hero not in REGICIDE_HERO_NAMES:
+        msg = f'hero is {hero} but must be one of:\n' + '\n'.join(
+            f'  {uconst} - {name}'
+            for uconst, name in REGICIDE_HERO_NAMES.items())
         raise ValueError(msg)
 
-    build_scenario(scenario_template=scenario_map, unit_template=units_scn,
-                   event_json=event_json, output=out, hero=hero, buff=buff)
+
+def validate_event_file(units_scn: util_scn.UnitScenario,
+                        event_json: str) -> None:
+    """
+    Checks that the event file event_json can be built using the units
+    from units_scn, without building a scenario.
+
+    The file's fights are loaded and made from a copy of the units, so
+    the same units_scn may be shared when validating several files.
+    Loading checks the number of fights against event.FIGHT_LIMIT and the
+    names of techs and units with util_techs.is_tech and util_units.is_unit.
+    Making the fights checks each fight's point limits and that no tech is
+    researched by multiple fights.
+
+    Raises a ValueError if the event file is invalid.
+    """
+    fight_data_list = event.load_fight_data(event_json)
+    events = event.make_fights(units_scn.copy_units(), fight_data_list,
+                               (FIGHT_CENTER_X, FIGHT_CENTER_Y), FIGHT_OFFSET)
+    if not events:
+        raise ValueError('There are no events.')
+    if isinstance(events[0], Minigame):
+        raise ValueError(
+            f'The tiebreaker cannot be the minigame {events[0].name}.')
+    for e in events:
+        if isinstance(e, Minigame) and e.name not in MINIGAME_NAMES:
+            raise ValueError(f'{e.name} is not a minigame.')
+
+
+def call_validate(args):
+    """
+    Unpacks arguments from command line args and validates the event files.
+
+    The unit template is parsed once and the files are validated
+    concurrently. Prints the result for each file and exits with a
+    nonzero status if any file is invalid.
+    """
+    units_scn = util_scn.UnitScenario(args.units[0])
+
+    def validate(event_json: str) -> str:
+        """Returns an error message for event_json, or None if valid."""
+        try:
+            validate_event_file(units_scn, event_json)
+        except (ValueError, OSError, KeyError, TypeError) as e:
+            return f'{type(e).__name__}: {e}'
+        return None
+
+    with ThreadPoolExecutor() as executor:
+        errors = list(executor.map(validate, args.events))
+    for event_json, error in zip(args.events, errors):
+        print(f'{event_json}: {error if error else "OK"}')
+    if any(errors):
+        sys.exit(1)
+
+
+def revealer_cost(events: List) -> Tuple[int, int]:
+    """
+    Returns the number of times map revealers are created in a scenario
+    with the given events, and the number of effects that create them or
+    activate triggers that hide them. The tiebreaker is the event at
+    index 0, and the other events are the rounds in order.
+
+    A fight creates revealers only if it is the first round, or if the
+    round before it is a minigame, and activates the hide trigger only if
+    the round after it is a minigame. A minigame always does both.
+    """
+    cycles, num_effects = 0, 0
+    num_rounds = len(events) - 1
+    for index, e in enumerate(events):
+        num_revealers = 2 * len(map_revealer_pos(event_center(e)))
+        if isinstance(e, Minigame):
+            cycles += 1
+            num_effects += num_revealers + 1
+            continue
+        if index == 1 or isinstance(events[index - 1], Minigame):
+            cycles += 1
+            num_effects += num_revealers
+        if index != num_rounds and isinstance(events[index + 1], Minigame):
+            num_effects += 1
+    return cycles, num_effects
+
+
+def camera_transitions(events: List) -> int:
+    """
+    Returns the number of times the players' views are changed to a
+    different area of the map in a scenario with the given events,
+    including the change from the last round to the tiebreaker.
+    """
+    return sum(event_center(prev) != event_center(e)
+               for prev, e in zip(events[-1:] + events[:-1], events))
+
+
+def order_events(items: List[List], after: Dict[str, int] = None,
+                 before: Dict[str, int] = None,
+                 max_run: int = None) -> List[int]:
+    """
+    Returns the indices of items in the order that places the minigames
+    between the fights with the fewest map revealer cycles, then with the
+    fewest revealer effects, as given by revealer_cost.
+
+    Each item is the list of rounds made from an entry of an event file:
+    one or two fights, or a single minigame. The first item is the
+    tiebreaker and remains first. The fights remain in the same order,
+    since each fight is loaded from the tile of the unit template with the
+    fight's index, and may depend on the techs researched by the fights
+    before it. Of the orders with the same cost, the order is chosen that
+    moves the minigames the fewest rounds from their indices in items.
+
+    A minigame named in after is placed only at a round index greater
+    than its value, and a minigame named in before only at an index less
+    than its value. At most max_run minigames are placed consecutively,
+    unless max_run is None.
+
+    Raises a ValueError if the tiebreaker is not a fight, if a name in
+    after or before is not one of the minigames, if max_run is less than
+    1, or if no order satisfies the constraints.
+    """
+    after = after if after else {}
+    before = before if before else {}
+    fights = [k for k, item in enumerate(items)
+              if not isinstance(item[0], Minigame)]
+    games = [k for k, item in enumerate(items)
+             if isinstance(item[0], Minigame)]
+    if not fights or fights[0] != 0:
+        raise ValueError('The tiebreaker must be a fight.')
+    game_names = {items[k][0].name for k in games}
+    for name in itertools.chain(after, before):
+        if name not in game_names:
+            raise ValueError(f'{name} is not one of the minigames.')
+    if max_run is not None and max_run < 1:
+        raise ValueError(f'max_run {max_run} must be positive.')
+
+    # prefix[f] is the number of rounds of the first f fights.
+    prefix = [0] + list(itertools.accumulate(len(items[k]) for k in fights))
+    input_index = [0] + list(itertools.accumulate(len(item)
+                                                  for item in items))
+    fight_revealers = 2 * len(map_revealer_pos(event_center(items[0][0])))
+    all_games = (1 << len(games)) - 1
+
+    def add(a: Tuple[int, ...], b: Tuple[int, ...]) -> Tuple[int, ...]:
+        """Returns the elementwise sum of a and b."""
+        return tuple(x + y for x, y in zip(a, b))
+
+    @functools.lru_cache(maxsize=None)
+    def best(f: int, placed: int, run: int):
+        """
+        Returns the (cycles, effects, moves) cost and the order of the
+        items after the first f fights and the minigames whose bits are
+        set in placed, where the last run minigames are consecutive.
+        Returns None if there is no such order.
+        """
+        index = prefix[f] + bin(placed).count('1')
+        if f == len(fights) and placed == all_games:
+            # The tiebreaker creates revealers if the last round is a
+            # minigame.
+            return ((1, fight_revealers, 0) if run else (0, 0, 0)), ()
+        options = []
+        if f < len(fights):
+            rest = best(f + 1, placed, 0)
+            if rest is not None:
+                creates = int(index == 1 or run > 0)
+                cost = (creates, creates * fight_revealers, 0)
+                options.append((add(cost, rest[0]), (fights[f],) + rest[1]))
+        if max_run is None or run < max_run:
+            for bit, k in enumerate(games):
+                name = items[k][0].name
+                if (placed & (1 << bit)
+                        or index <= after.get(name, -1)
+                        or index >= before.get(name, math.inf)):
+                    continue
+                rest = best(f, placed | (1 << bit), run + 1)
+                if rest is None:
+                    continue
+                # The round before hides its revealers if it is a fight.
+                revealers = 2 * len(map_revealer_pos(event_center(
+                    items[k][0])))
+                cost = (1, revealers + 1 + int(not run),
+                        abs(index - input_index[k]))
+                options.append((add(cost, rest[0]), (k,) + rest[1]))
+        return min(options) if options else None
+
+    result = best(1, 0, 0)
+    if result is None:
+        raise ValueError('No order of the events satisfies the constraints.')
+    return [0] + list(result[1])
+
+
+def call_order(args):
+    """
+    Unpacks arguments from command line args, orders the events of the
+    event file, and writes the ordered event file.
+    """
+    event_json = args.events[0]
+    out = args.output[0]
+    check_output(out, [('events', event_json), ('units', args.units[0])])
+    units_scn = util_scn.UnitScenario(args.units[0])
+    validate_event_file(units_scn, event_json)
+
+    with open(event_json) as json_file:
+        entries = json.loads(json_file.read())
+    fight_data_list = event.load_fight_data(event_json)
+    events = event.make_fights(units_scn.copy_units(), fight_data_list,
+                               (FIGHT_CENTER_X, FIGHT_CENTER_Y), FIGHT_OFFSET)
+    # Groups the two rounds of each asymmetrical fight.
+    items = []
+    for e in events:
+        if isinstance(e, Fight) and e.mirror is not None:
+            items[-1].append(e)
+        else:
+            items.append([e])
+
+    after = {name: int(n) for name, n in args.after}
+    before = {name: int(n) for name, n in args.before}
+    order = order_events(items, after, before, args.max_run)
+
+    with open(out, 'w') as json_file:
+        json.dump([entries[k] for k in order], json_file, indent=4)
+        json_file.write('\n')
+
+    ordered = [e for k in order for e in items[k]]
+    for path, evs in ((event_json, events), (out, ordered)):
+        cycles, num_effects = revealer_cost(evs)
+        print(f'{path}: {cycles} revealer cycles,'
+              + f' {num_effects} revealer effects,'
+              + f' {camera_transitions(evs)} camera transitions.')
 
 
 def build_publish_files(args):
@@ -3306,36 +5025,207 @@ def build_publish_files(args):
     raise AssertionError('Not implemented.')
 
 
-def build_minigames(args): # pylint: disable=unused-argument
+def build_minigames(args):
     """
     Builds each minigame as an individual file, as well as one file
     with all of the minigames.
+
+    The scenario and unit templates are parsed once and shared by all
+    builds. The shared setup stages run once for each distinct pair of
+    unit template and event file, and variants with the same pair continue
+    from a checkpoint. Each distinct round is built once, and is linked
+    into every variant that contains it, so the composite variants, such
+    as the one with all minigames, are only linked from the rounds of the
+    variants before them. The scenarios are written by write_pipelined,
+    compressed with the level named by args.compression, and their
+    triggers are serialized by args.jobs worker processes, the modules
+    of their fights are cached, and they are built with the options
+    given by build_options(args), as in build_scenario.
+    """
+    jobs = args.jobs or os.cpu_count() or 1
+    # Tuples of the unit template, event file, and output file to build.
+    variants = [
+        # Individual minigames.
+        *((UNIT_TEMPLATE, event_json, f'{name}.aoe2scenario')
+          for name, event_json in INDIVIDUAL_MINIGAME_EVENTS.items()),
+        # All minigames.
+        (UNIT_TEMPLATE, ALL_MINIGAMES_EVENTS, ALL_MINIGAMES_OUTPUT),
+        # Feudal
+        ('unit-feudal.aoe2scenario', 'events-feudal.json',
+         'Feudal Skirmishes.aoe2scenario'),
+        # Castle
+        ('unit-castle.aoe2scenario', 'events-castle.json',
+         'Castle Warfare.aoe2scenario'),
+        # Imperial
+        ('unit-imperial.aoe2scenario', 'events-imperial.json',
+         'Imperial Conquest.aoe2scenario'),
+        # Fights Only
+        (UNIT_TEMPLATE, 'events-fights.json', 'Fights Only.aoe2scenario'),
+        # Full
+        (UNIT_TEMPLATE, 'events.json', 'Full.aoe2scenario'),
+    ]
+    # Parses each unit template once, before the writer thread starts,
+    # so the worker processes are never forked while a write is running.
+    # The same workers then serialize the triggers.
+    template_paths = {ut for ut, __, __ in variants}
+    template_paths.update((XBOW_TEMPLATE, ARENA_TEMPLATE))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {path: executor.submit(util_scn.UnitScenario, path)
+                   for path in template_paths}
+        template_scn = util_scn.read_scenario(SCENARIO_TEMPLATE)
+        templates = {path: future.result() for path, future in futures.items()}
+        serializer = executor if jobs > 1 else None
+        modules: Dict[tuple, TriggerModule] = {}
+        cache = module_cache()
+        options = build_options(args)
+
+        def builds():
+            """Yields each variant's ScnData and output file, in order."""
+            # The number of remaining variants for each distinct input pair.
+            # A checkpoint is kept only while another variant still needs it.
+            remaining = Counter((ut, ev) for ut, ev, __ in variants)
+            checkpoints: Dict[Tuple[str, str], ScnData] = {}
+            for unit_template, event_json, output in variants:
+                key = (unit_template, event_json)
+                if key not in checkpoints:
+                    checkpoints[key] = prepare_scenario(
+                        util_scn.copy_scenario(template_scn),
+                        templates[unit_template].copy_units(),
+                        event.load_fight_data(event_json),
+                        templates[XBOW_TEMPLATE], templates[ARENA_TEMPLATE],
+                        executor=serializer, modules=modules,
+                        cache=cache, options=options)
+                remaining[key] -= 1
+                scn_data = (checkpoints[key].checkpoint() if remaining[key]
+                            else checkpoints.pop(key))
+                scn_data.setup_rounds()
+                yield scn_data, output
+
+        write_pipelined(builds(), args.compression)
+
+
+def build_matrix(args):
     """
-    # Individual minigames.
-    for name, event_json in INDIVIDUAL_MINIGAME_EVENTS.items():
-        build_scenario(SCENARIO_TEMPLATE, UNIT_TEMPLATE, event_json,
-                       XBOW_TEMPLATE, ARENA_TEMPLATE, f'{name}.aoe2scenario')
-    # All minigames.
-    build_scenario(SCENARIO_TEMPLATE, UNIT_TEMPLATE, ALL_MINIGAMES_EVENTS,
-                   XBOW_TEMPLATE, ARENA_TEMPLATE, ALL_MINIGAMES_OUTPUT)
-    # Feudal
-    build_scenario(SCENARIO_TEMPLATE, 'unit-feudal.aoe2scenario',
-                   'events-feudal.json', XBOW_TEMPLATE, ARENA_TEMPLATE,
-                   'Feudal Skirmishes.aoe2scenario')
-    # Castle
-    build_scenario(SCENARIO_TEMPLATE, 'unit-castle.aoe2scenario',
-                   'events-castle.json', XBOW_TEMPLATE, ARENA_TEMPLATE,
-                   'Castle Warfare.aoe2scenario')
-    # Imperial
-    build_scenario(SCENARIO_TEMPLATE, 'unit-imperial.aoe2scenario',
-                   'events-imperial.json', XBOW_TEMPLATE, ARENA_TEMPLATE,
-                   'Imperial Conquest.aoe2scenario')
-    # Fights Only
-    build_scenario(SCENARIO_TEMPLATE, UNIT_TEMPLATE, 'events-fights.json',
-                   XBOW_TEMPLATE, ARENA_TEMPLATE, 'Fights Only.aoe2scenario')
-    # Full
-    build_scenario(SCENARIO_TEMPLATE, UNIT_TEMPLATE, 'events.json',
-                   XBOW_TEMPLATE, ARENA_TEMPLATE, 'Full.aoe2scenario')
+    Builds the cross product of the Regicide heroes in args.hero, the
+    buff settings in args.buff, and the event files in args.events.
+
+    For each event file, the rounds before the Regicide round are set up
+    once, and each hero and buff combination continues from a checkpoint,
+    so only the Regicide round is built for every combination. The
+    rounds after it are built once and linked into each combination.
+    Each output is written to args.output_dir as
+    '<event file name> <hero>.aoe2scenario', with ' Buffed' before the
+    extension if the hero is buffed. An event file without a Regicide
+    round is built once, to '<event file name>.aoe2scenario'. The
+    triggers are serialized by args.jobs worker processes, the modules
+    of the fights are cached, and the scenarios are built with the
+    options given by build_options(args), as in build_scenario.
+
+    Raises a ValueError before building if an output path is the same as
+    an input path or as another output path, such as for two event files
+    with the same name in different directories.
+    """
+    heroes = list(dict.fromkeys(args.hero))
+    for hero in heroes:
+        check_hero(hero)
+    buffs = list(dict.fromkeys(b == 'on' for b in args.buff))
+    combinations = list(itertools.product(heroes, buffs))
+    output_dir = args.output_dir[0]
+    jobs = args.jobs or os.cpu_count() or 1
+
+    # Maps each event file to its fights and its output paths, one for each
+    # combination, or a single path if the file has no Regicide round.
+    outputs: Dict[str, Tuple[list, List[str]]] = {}
+    for event_json in dict.fromkeys(args.events):
+        fight_data_list = event.load_fight_data(event_json)
+        name = os.path.splitext(os.path.basename(event_json))[0]
+        paths = []
+        if not any(isinstance(e, Minigame) and e.name == 'Regicide'
+                   for e in fight_data_list):
+            paths.append(os.path.join(output_dir, f'{name}.aoe2scenario'))
+        else:
+            for hero, buff in combinations:
+                variant = f'{name} {REGICIDE_HERO_NAMES[hero]}'
+                if buff:
+                    variant += ' Buffed'
+                paths.append(os.path.join(output_dir,
+                                          f'{variant}.aoe2scenario'))
+        outputs[event_json] = (fight_data_list, paths)
+    inputs = [('map', args.map[0]), ('units', args.units[0]),
+              ('xbow', args.xbow[0]), ('arena', args.arena[0])]
+    inputs.extend(('events', event_json) for event_json in outputs)
+    written = []
+    for event_json, (__, paths) in outputs.items():
+        for out in paths:
+            check_output(out, inputs + written)
+            written.append((f'output of {event_json}', out))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        units_future = executor.submit(util_scn.UnitScenario, args.units[0])
+        xbow_future = executor.submit(util_scn.UnitScenario, args.xbow[0])
+        arena_future = executor.submit(util_scn.UnitScenario, args.arena[0])
+        template_scn = util_scn.read_scenario(args.map[0])
+        units_scn = units_future.result()
+        xbow_scn = xbow_future.result()
+        arena_scn = arena_future.result()
+        serializer = executor if jobs > 1 else None
+        modules: Dict[tuple, TriggerModule] = {}
+        cache = module_cache()
+        options = build_options(args)
+
+        def builds():
+            """Yields each combination's ScnData and output file, in order."""
+            for event_json, (fight_data_list, paths) in outputs.items():
+                base = prepare_scenario(
+                    util_scn.copy_scenario(template_scn),
+                    units_scn.copy_units(), fight_data_list,
+                    xbow_scn, arena_scn, executor=serializer, modules=modules,
+                    cache=cache, options=options)
+                regicide_index = base.regicide_index
+                if regicide_index is None:
+                    print(f'{event_json} has no Regicide round,'
+                          + ' building it once.')
+                    base.setup_rounds()
+                    yield base, paths[0]
+                    continue
+                base.setup_rounds(regicide_index)
+                for k, ((hero, buff), out) in enumerate(
+                        zip(combinations, paths)):
+                    # The last combination continues from the base itself.
+                    is_last = k == len(combinations) - 1
+                    scn_data = base if is_last else base.checkpoint()
+                    scn_data.set_regicide(hero, buff)
+                    scn_data.setup_rounds()
+                    yield scn_data, out
+
+        write_pipelined(builds(), args.compression)
+
+
+def write_pipelined(builds: Iterable[Tuple[ScnData, str]],
+                    compression: str) -> None:
+    """
+    Writes each ScnData yielded by builds to the output file paired with it,
+    compressed with the level named by compression.
+
+    Each scenario is written on a background thread while builds sets up
+    the next one. At most WRITE_QUEUE_DEPTH built scenarios wait to be
+    written at a time, so the next scenario is not requested until there
+    is room for it.
+    """
+    builds = iter(builds)
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending = deque()
+        while True:
+            if len(pending) >= WRITE_QUEUE_DEPTH:
+                pending.popleft().result()
+            build = next(builds, None)
+            if build is None:
+                break
+            scn_data, output = build
+            pending.append(writer.submit(scn_data.write_to_file, output,
+                                         compression))
+        for write in pending:
+            write.result()
 
 
 def scratch(args): # pylint: disable=unused-argument
@@ -3377,16 +5267,152 @@ def main():
         '--output', '-o', nargs=1, default=[OUTPUT],
         help='Filepath to which the output is written, must differ from all input files.' #pylint: disable=line-too-long
     )
+    parser_build.add_argument(
+        '--compression', choices=list(util_scn.COMPRESSION_LEVELS),
+        default='max',
+        help='Compression level of the output, fast is for development builds.'
+    )
+    parser_build.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='Number of worker processes, defaults to the number of CPUs.'
+    )
+    parser_build.add_argument(
+        '--activation-batch', type=int, default=0,
+        help='Maximum number of triggers activated at once, 0 for no maximum.'
+        + ' The others are activated in the next ticks, try'
+        + f' {ACTIVATION_BATCH_SIZE}. Defaults to 0.'
+    )
+    parser_build.add_argument(
+        '--shared-fights', action='store_true',
+        help='Pass this flag to end all fights with shared triggers.'
+        + ' Pays off only for long lists of fights; with a few fights,'
+        + ' the scenario file grows.'
+    )
+    parser_build.add_argument(
+        '--compact-objectives', action='store_true',
+        help='Pass this flag to keep the objective triggers that are'
+        + ' enabled for the whole match to a minimum.'
+    )
     parser_build.set_defaults(func=call_build_scenario)
 
+    parser_validate = subparsers.add_parser(
+        'validate', help='Checks event files without building.')
+    parser_validate.add_argument('events', nargs='+',
+                                 help='Filepaths to the event json files.')
+    parser_validate.add_argument(
+        '--units', nargs=1, default=[UNIT_TEMPLATE],
+        help='Filepath to the unit template input file.')
+    parser_validate.set_defaults(func=call_validate)
+
+    parser_order = subparsers.add_parser(
+        'order', help='Orders the events to reduce map revealer changes.')
+    parser_order.add_argument('events', nargs=1,
+                              help='Filepath to the event json file.')
+    parser_order.add_argument('--units', nargs=1, default=[UNIT_TEMPLATE],
+                              help='Filepath to the unit template input file.')
+    parser_order.add_argument(
+        '--output', '-o', nargs=1, required=True,
+        help='Filepath to which the ordered event file is written.'
+    )
+    parser_order.add_argument(
+        '--after', nargs=2, action='append', default=[],
+        metavar=('MINIGAME', 'N'),
+        help='Places the minigame after round N, may be repeated.'
+    )
+    parser_order.add_argument(
+        '--before', nargs=2, action='append', default=[],
+        metavar=('MINIGAME', 'N'),
+        help='Places the minigame before round N, may be repeated.'
+    )
+    parser_order.add_argument(
+        '--max-run', type=int, default=None,
+        help='The maximum number of consecutive minigames.'
+    )
+    parser_order.set_defaults(func=call_order)
+
     parser_publish = subparsers.add_parser('publish',
                                            help='Creates mod upload files.')
     parser_publish.set_defaults(func=build_publish_files)
 
     parser_minigames = subparsers.add_parser('minigames',
                                              help='Creates minigame scenarios.')
+    parser_minigames.add_argument(
+        '--compression', choices=list(util_scn.COMPRESSION_LEVELS),
+        default='max',
+        help='Compression level of the outputs, fast is for development builds.'
+    )
+    parser_minigames.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='Number of worker processes, defaults to the number of CPUs.'
+    )
+    parser_minigames.add_argument(
+        '--activation-batch', type=int, default=0,
+        help='Maximum number of triggers activated at once, 0 for no maximum.'
+        + ' The others are activated in the next ticks, try'
+        + f' {ACTIVATION_BATCH_SIZE}. Defaults to 0.'
+    )
+    parser_minigames.add_argument(
+        '--shared-fights', action='store_true',
+        help='Pass this flag to end all fights with shared triggers.'
+        + ' Pays off only for long lists of fights; with a few fights,'
+        + ' the scenario file grows.'
+    )
+    parser_minigames.add_argument(
+        '--compact-objectives', action='store_true',
+        help='Pass this flag to keep the objective triggers that are'
+        + ' enabled for the whole match to a minimum.'
+    )
     parser_minigames.set_defaults(func=build_minigames)
 
+    parser_matrix = subparsers.add_parser(
+        'matrix', help='Builds every combination of Regicide hero and buff.')
+    parser_matrix.add_argument('--map', nargs=1, default=[SCENARIO_TEMPLATE],
+                               help='Filepath to the map template input file.')
+    parser_matrix.add_argument('--units', nargs=1, default=[UNIT_TEMPLATE],
+                               help='Filepath to the unit template input file.')
+    parser_matrix.add_argument('--events', nargs='+',
+                               default=[event.DEFAULT_FILE],
+                               help='Filepaths to the event json files.')
+    parser_matrix.add_argument('--xbow', nargs=1, default=[XBOW_TEMPLATE],
+                               help='Filepath to the xbow timer units file.')
+    parser_matrix.add_argument('--arena', nargs=1, default=[ARENA_TEMPLATE],
+                               help='Filepath to the arena units file.')
+    parser_matrix.add_argument('--hero', nargs='+', type=int,
+                               default=list(REGICIDE_HERO_NAMES),
+                               help='The heroes to use for the Regicide minigame.') #pylint: disable=line-too-long
+    parser_matrix.add_argument('--buff', nargs='+', choices=('off', 'on'),
+                               default=['off', 'on'],
+                               help='Whether to buff the Regicide hero.')
+    parser_matrix.add_argument('--output-dir', nargs=1, default=['.'],
+                               help='Directory to which the outputs are written.') #pylint: disable=line-too-long
+    parser_matrix.add_argument(
+        '--compression', choices=list(util_scn.COMPRESSION_LEVELS),
+        default='max',
+        help='Compression level of the outputs, fast is for development builds.'
+    )
+    parser_matrix.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='Number of worker processes, defaults to the number of CPUs.'
+    )
+    parser_matrix.add_argument(
+        '--activation-batch', type=int, default=0,
+        help='Maximum number of triggers activated at once, 0 for no maximum.'
+        + ' The others are activated in the next ticks, try'
+        + f' {ACTIVATION_BATCH_SIZE}. Defaults to 0.'
+    )
+    parser_matrix.add_argument(
+        '--shared-fights', action='store_true',
+        help='Pass this flag to end all fights with shared triggers.'
+        + ' Pays off only for long lists of fights; with a few fights,'
+        + ' the scenario file grows.'
+    )
+    parser_matrix.add_argument(
+        '--compact-objectives', action='store_true',
+        help='Pass this flag to keep the objective triggers that are'
+        + ' enabled for the whole match to a minimum.'
+    )
+    parser_matrix.set_defaults(func=build_matrix)
+
     parser_scratch = subparsers.add_parser('scratch', help='Runs a test.')
     parser_scratch.set_defaults(func=scratch)
 
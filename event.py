@@ -114,10 +114,16 @@ class Fight:
     """
 
     def __init__(self, fight_data: FightData,
-                 p1_units: List[UnitStruct], p2_units: List[UnitStruct]):
+                 p1_units: List[UnitStruct], p2_units: List[UnitStruct],
+                 mirror: 'Fight' = None):
         """
         Initializes a new fight with the fight data and unit lists.
 
+        If mirror is not None, this fight is the second round of an
+        asymmetrical fight, and mirror is its first round. Then p1_units
+        are player 2's units of mirror and p2_units are player 1's units
+        of mirror, in the same order, flipped across the fight's center.
+
         Raise a ValueError if a player has no units, if the total
         possible point values exceed the max limit, or if there is
         no point value for some unit in the fight.
@@ -126,6 +132,7 @@ class Fight:
         self.points = fight_data.points
         self.p1_units = p1_units
         self.p2_units = p2_units
+        self.mirror = mirror
 
         if not self.p1_units:
             raise ValueError('Player 1 has no units.')
@@ -229,11 +236,12 @@ def make_fights(units_scn: AoE2Scenario, event_data,
 
             util_units.center_units(p1_units, center, offset)
             util_units.center_units(p2_units, center, -offset)
-            events.append(Fight(fd, p1_units, p2_units))
+            first = Fight(fd, p1_units, p2_units)
+            events.append(first)
 
             util_units.center_units_flip(p1_units2, center, -offset)
             util_units.center_units_flip(p2_units2, center, offset)
-            events.append(Fight(fd, p1_units2, p2_units2))
+            events.append(Fight(fd, p1_units2, p2_units2, first))
         for tech in fd.techs:
             if tech in techs:
                 raise ValueError(f'Tech {tech} is researched multiple times.')
@@ -0,0 +1,304 @@
+"""
+Tests the helper functions of building the scenario.
+
+GNU General Public License v3.0: See the LICENSE file.
+"""
+
+
+import itertools
+from nose.tools import eq_, raises
+from event import Minigame
+# pylint: disable=protected-access
+from build_scenario import (
+    ROUND_RELICS, BuildOptions, ScnData, _ctr_rounds_text, _name_player,
+    _player_order, _swap_player_names, camera_transitions, order_events,
+    revealer_cost
+)
+
+
+def _fight() -> object:
+    """
+    Returns a stand-in for a fight. Ordering the events only checks
+    whether an event is a minigame.
+    """
+    return object()
+
+
+def _items(spec: str):
+    """
+    Returns the items of an event file given by spec, a string with a
+    character for each item: 'f' for a fight, 'a' for an asymmetrical
+    fight with two rounds, or a digit k for the kth of a list of minigames.
+    """
+    names = ['Steal the Bacon', 'Tower Battlefield', 'Galley Micro',
+             'Xbow Timer', 'Capture the Relic']
+    items = []
+    for c in spec:
+        if c == 'f':
+            items.append([_fight()])
+        elif c == 'a':
+            items.append([_fight(), _fight()])
+        else:
+            items.append([Minigame(names[int(c)], [])])
+    return items
+
+
+def _flatten(items, order):
+    """Returns the events of the items in the given order."""
+    return [e for k in order for e in items[k]]
+
+
+def _is_fight_order(items, order) -> bool:
+    """Returns True if the fights of items keep their order in order."""
+    fights = [k for k in order if not isinstance(items[k][0], Minigame)]
+    return fights == sorted(fights)
+
+
+def _brute_force_cost(items):
+    """
+    Returns the smallest revealer_cost of an order of items with the
+    tiebreaker first and the fights in order.
+    """
+    return min(revealer_cost(_flatten(items, (0,) + rest))
+               for rest in itertools.permutations(range(1, len(items)))
+               if _is_fight_order(items, (0,) + rest))
+
+
+def test_swap_player_names0():
+    eq_('[R3] P2 Archer 0', _swap_player_names('[R3] P1 Archer 0'))
+
+
+def test_swap_player_names1():
+    eq_('[R3] Player 1 Wins Round',
+        _swap_player_names('[R3] Player 2 Wins Round'))
+
+
+def test_swap_player_names2():
+    eq_('[R3] P2 Defeated with 1 P1 Points Scored',
+        _swap_player_names('[R3] P1 Defeated with 1 P2 Points Scored'))
+
+
+def test_swap_player_names3():
+    eq_('[R3] Begin Round P12', _swap_player_names('[R3] Begin Round P12'))
+
+
+def test_swap_player_names_twice():
+    name = '[R3] Player 1 Defeated with 7 P2 Points Scored'
+    eq_(name, _swap_player_names(_swap_player_names(name)))
+
+
+def test_name_player():
+    eq_(2, _name_player('[R3] P2 Archer 0'))
+    eq_(1, _name_player('[R3] Player 1 Wins Round'))
+    eq_(0, _name_player('[R3] Begin Round'))
+
+
+def test_player_order_empty():
+    eq_([], _player_order([]))
+
+
+def test_player_order_unchanged():
+    eq_([0, 1, 2, 3, 4], _player_order([0, 1, 1, 2, 2]))
+
+
+def test_player_order_pair():
+    eq_([2, 3, 0, 1], _player_order([2, 2, 1, 1]))
+
+
+def test_player_order_neither():
+    eq_([0, 2, 1, 3], _player_order([0, 2, 1, 0]))
+
+
+def test_player_order_pairs():
+    eq_([1, 0, 3, 2], _player_order([2, 1, 2, 1]))
+
+
+def test_player_order_bounds():
+    eq_([0, 1, 2, 3], _player_order([2, 1, 1, 2], bounds=[1]))
+
+
+def test_player_order_bound_splits_segment():
+    eq_([1, 0, 2, 3], _player_order([2, 1, 1, 0], bounds=[2]))
+
+
+def test_revealer_cost_fights():
+    events = [_fight(), _fight(), _fight()]
+    cycles, num_effects = revealer_cost(events)
+    eq_(1, cycles)
+    eq_(2 * 19 * 19, num_effects)
+
+
+def test_revealer_cost_minigame():
+    events = _flatten(_items('f0f'), [0, 1, 2])
+    cycles, num_effects = revealer_cost(events)
+    # The minigame, and the fight after it.
+    eq_(2, cycles)
+    # The tiebreaker hides its revealers before the minigame.
+    eq_(2 * (2 * 19 * 19) + 2, num_effects)
+
+
+def test_camera_transitions():
+    eq_(0, camera_transitions(_flatten(_items('fff'), [0, 1, 2])))
+    eq_(2, camera_transitions(_flatten(_items('ff0'), [0, 1, 2])))
+    eq_(4, camera_transitions(_flatten(_items('f0f1'), [0, 1, 2, 3])))
+
+
+def test_order_events_tiebreaker_first():
+    items = _items('f01ff')
+    eq_(0, order_events(items)[0])
+
+
+def test_order_events_fights_in_order():
+    items = _items('f0a1f2af')
+    order = order_events(items)
+    eq_(sorted(order), list(range(len(items))))
+    assert _is_fight_order(items, order)
+
+
+def test_order_events_minimal():
+    for spec in ('f01ff', 'f0f1f2', 'ff012f', 'fa0a1', 'f0123'):
+        items = _items(spec)
+        order = order_events(items)
+        eq_(_brute_force_cost(items), revealer_cost(_flatten(items, order)))
+
+
+def test_order_events_after():
+    items = _items('f0fff')
+    order = order_events(items, after={'Steal the Bacon': 3})
+    rounds = _flatten(items, order)
+    assert rounds.index(items[1][0]) > 3
+
+
+def test_order_events_before():
+    items = _items('fff0f')
+    order = order_events(items, before={'Steal the Bacon': 2})
+    rounds = _flatten(items, order)
+    assert rounds.index(items[3][0]) < 2
+
+
+@raises(ValueError)
+def test_order_events_max_run_unsatisfiable():
+    order_events(_items('f012'), max_run=2)
+
+
+def test_order_events_max_run():
+    items = _items('f012ff')
+    order = order_events(items, max_run=1)
+    for k, j in zip(order, order[1:]):
+        assert not (isinstance(items[k][0], Minigame)
+                    and isinstance(items[j][0], Minigame))
+
+
+@raises(ValueError)
+def test_order_events_tiebreaker_minigame():
+    order_events(_items('0ff'))
+
+
+@raises(ValueError)
+def test_order_events_unknown_after():
+    order_events(_items('f0f'), after={'Regicide': 1})
+
+
+@raises(ValueError)
+def test_order_events_unknown_before():
+    order_events(_items('f0f'), before={'Regicide': 1})
+
+
+@raises(ValueError)
+def test_order_events_max_run_error():
+    order_events(_items('f0f'), max_run=0)
+
+
+@raises(ValueError)
+def test_order_events_unsatisfiable():
+    order_events(_items('f0f'), after={'Steal the Bacon': 5})
+
+
+def _batched_data(num_targets: int, size: int) -> ScnData:
+    """
+    Returns the triggers of a scenario with a trigger 'Source' that
+    activates num_targets triggers, batched by size.
+    """
+    data = ScnData(None, [], None, None,
+                   options=BuildOptions(activation_batch=size))
+    data._add_trigger('Before')
+    data._add_trigger('Source')
+    for k in range(num_targets):
+        data._add_trigger(f'Target {k}')
+        data._add_activate('Source', f'Target {k}')
+        data._add_deactivate('Before', f'Target {k}')
+    data._add_activation_batches()
+    return data
+
+
+def test_activation_batches_ids():
+    data = _batched_data(10, 4)
+    ids = data._trigger_ids
+    eq_(list(range(len(ids))),
+        [trigger.trigger_id for trigger in data._new_triggers])
+    for trigger in data._new_triggers:
+        eq_(trigger.trigger_id, ids[trigger._name])
+    activator = 'Source'
+    for k in range(1, 3):
+        batch = f'Source Activation Batch {k}'
+        assert batch in data._activate_triggers[activator]
+        assert ids[batch] < ids[activator]
+        activator = batch
+    eq_('Source Activation Batch 3' in ids, False)
+    eq_(0, ids['Before'])
+
+
+def test_activation_batches_targets():
+    data = _batched_data(10, 4)
+    activated = set()
+    for targets in data._activate_triggers.values():
+        assert len(targets) <= 4
+        activated |= {t for t in targets if t.startswith('Target')}
+    eq_({f'Target {k}' for k in range(10)}, activated)
+    for k in range(1, 3):
+        assert (f'Source Activation Batch {k}'
+                in data._deactivate_triggers['Before'])
+
+
+def test_activation_batches_off():
+    data = _batched_data(10, None)
+    eq_(10, len(data._activate_triggers['Source']))
+
+
+def _objectives_data(compact: bool) -> ScnData:
+    """
+    Returns a scenario with only a tiebreaker and the objectives,
+    which are compact if compact is True.
+    """
+    data = ScnData(None, [_fight()], None, None,
+                   options=BuildOptions(compact_objectives=compact))
+    data._var_ids['p1-wins'] = 0
+    data._var_ids['p2-wins'] = 1
+    data._add_objectives()
+    return data
+
+
+def test_objectives_polling_triggers():
+    eq_(4, _objectives_data(False).num_polling_triggers)
+
+
+def test_compact_objectives_polling_triggers():
+    data = _objectives_data(True)
+    eq_(1, data.num_polling_triggers)
+    eq_({'[O] Objectives Title', '[O] Tiebreaker'},
+        data._round_polling_triggers(0))
+
+
+def test_ctr_rounds_text():
+    eq_('There are 3 rounds, each with 3 relics to capture.',
+        _ctr_rounds_text(ROUND_RELICS))
+
+
+def test_ctr_rounds_text_uneven():
+    eq_('There are 3 rounds, with 2, 3 and 5 relics to capture.',
+        _ctr_rounds_text({1: 2, 2: 5, 3: 10}))
+
+
+def test_ctr_rounds_text_one_round():
+    eq_('There is 1 round, with 1 relic to capture.',
+        _ctr_rounds_text({1: 1}))
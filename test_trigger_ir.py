@@ -0,0 +1,99 @@
+"""
+Tests lowering the trigger representation to the library's objects.
+
+GNU General Public License v3.0: See the LICENSE file.
+"""
+
+
+import pickle
+from nose.tools import eq_, raises
+from AoE2ScenarioParser.datasets import conditions, effects
+from trigger_ir import ConditionIR, EffectIR, TriggerIR
+
+
+def _make_trigger() -> TriggerIR:
+    """Returns a trigger with a condition and an effect."""
+    trigger = TriggerIR('Test', 3)
+    trigger.description = 'Description'
+    trigger.looping = 1
+    trigger.enabled = 0
+    cond = trigger.add_condition(conditions.variable_value)
+    cond.variable = 5
+    cond.amount_or_quantity = 2
+    effect = trigger.add_effect(effects.change_variable)
+    effect.quantity = 4
+    effect.from_variable = 5
+    effect.message = 'variable'
+    return trigger
+
+
+def test_lower_trigger():
+    trigger = _make_trigger()
+    lowered = trigger.lower()
+    eq_(trigger.name, lowered.name)
+    eq_(trigger.description, lowered.description)
+    eq_(trigger.short_description, lowered.short_description)
+    eq_(3, lowered.trigger_id)
+    eq_(1, lowered.looping)
+    eq_(0, lowered.enabled)
+    eq_([0], lowered.condition_order)
+    eq_([0], lowered.effect_order)
+
+
+def test_lower_condition():
+    lowered = _make_trigger().lower().conditions
+    eq_(1, len(lowered))
+    eq_(conditions.variable_value, lowered[0].condition_type)
+    eq_(5, lowered[0].variable)
+    eq_(2, lowered[0].amount_or_quantity)
+    eq_(ConditionIR(0).comparison, lowered[0].comparison)
+
+
+def test_lower_effect():
+    lowered = _make_trigger().lower().effects
+    eq_(1, len(lowered))
+    eq_(effects.change_variable, lowered[0].effect_type)
+    eq_(4, lowered[0].quantity)
+    eq_(5, lowered[0].from_variable)
+    eq_('variable', lowered[0].message)
+
+
+def test_lower_pickled():
+    trigger = pickle.loads(pickle.dumps(_make_trigger()))
+    lowered = trigger.lower()
+    eq_('Test\x00', lowered.name)
+    eq_(5, lowered.conditions[0].variable)
+    eq_(4, lowered.effects[0].quantity)
+
+
+def test_copy_trigger():
+    trigger = _make_trigger()
+    copied = trigger.copy('Copy', 7)
+    eq_('Copy\x00', copied.name)
+    eq_(7, copied.trigger_id)
+    eq_(trigger.description, copied.description)
+    eq_(trigger.looping, copied.looping)
+    eq_([], copied.conditions)
+    eq_([], copied.effects)
+
+
+def test_substitute():
+    effect = EffectIR(effects.change_variable)
+    effect.from_variable = 5
+    effect.quantity = 5
+    substituted = effect.substitute({5: 8})
+    eq_(8, substituted.from_variable)
+    eq_(8, substituted.quantity)
+    eq_(5, effect.from_variable)
+    assert effect.substitute({6: 8}) is effect
+
+
+def test_default_not_set():
+    effect = EffectIR(effects.change_variable)
+    eq_(False, effect.is_set('quantity'))
+    eq_(EffectIR(effects.change_variable).lower().quantity, effect.quantity)
+
+
+@raises(AttributeError)
+def test_unknown_attribute():
+    ConditionIR(conditions.variable_value).not_an_attribute = 1
@@ -0,0 +1,76 @@
+"""
+Tests the persistent cache of trigger modules.
+
+GNU General Public License v3.0: See the LICENSE file.
+"""
+
+
+import os
+import tempfile
+from nose.tools import eq_
+from trigger_module import ModuleCache, TriggerModule
+
+
+def _make_module(index: int) -> TriggerModule:
+    """Returns a module for the round at index with a single trigger."""
+    module = TriggerModule(index, {'round': 5})
+    module.add_trigger(f'[R{index}] Begin Round')
+    return module
+
+
+def _entry_size(cache_dir: str) -> int:
+    """Returns the size of a cache entry of a module from _make_module."""
+    cache = ModuleCache(cache_dir, 'size', 1 << 20)
+    cache.put((0,), _make_module(0))
+    return os.path.getsize(cache._path((0,))) # pylint: disable=protected-access
+
+
+def _set_age(cache: ModuleCache, key: tuple, age: int) -> None:
+    """Sets the time the entry with the given key was last used."""
+    os.utime(cache._path(key), (age, age)) # pylint: disable=protected-access
+
+
+def test_cache_get():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ModuleCache(cache_dir, 'v1', 1 << 20)
+        cache.put(('key',), _make_module(1))
+        module = cache.get(('key',))
+        eq_(1, module.index)
+        eq_({'round': 5}, module.var_ids)
+        eq_(['[R1] Begin Round\x00'], [t.name for t in module.triggers])
+
+
+def test_cache_miss():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ModuleCache(cache_dir, 'v1', 1 << 20)
+        eq_(None, cache.get(('key',)))
+
+
+def test_cache_version():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ModuleCache(cache_dir, 'v1', 1 << 20).put(('key',), _make_module(1))
+        eq_(None, ModuleCache(cache_dir, 'v2', 1 << 20).get(('key',)))
+
+
+def test_cache_evict_least_recent():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        size = _entry_size(os.path.join(cache_dir, 'size'))
+        cache = ModuleCache(os.path.join(cache_dir, 'cache'), 'v1', 2 * size)
+        cache.put((1,), _make_module(1))
+        _set_age(cache, (1,), 1000)
+        cache.put((2,), _make_module(2))
+        _set_age(cache, (2,), 2000)
+        # Reading the first entry makes the second the least recently used.
+        eq_(1, cache.get((1,)).index)
+        cache.put((3,), _make_module(3))
+        eq_(1, cache.get((1,)).index)
+        eq_(None, cache.get((2,)))
+        eq_(3, cache.get((3,)).index)
+
+
+def test_cache_evict_all():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ModuleCache(cache_dir, 'v1', 0)
+        cache.put((1,), _make_module(1))
+        eq_(None, cache.get((1,)))
+        eq_([], os.listdir(cache_dir))
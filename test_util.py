@@ -9,7 +9,7 @@ import math
 import random
 from nose.tools import assert_almost_equal, eq_, raises
 from util import (
-    flip_angle_h, pretty_print_name, min_point, max_point
+    flip_angle_h, pretty_print_name, min_point, max_point, allocate_slots
 )
 
 
@@ -129,3 +129,24 @@ def test_max_point2():
 
 def test_max_point3():
     eq_((23, 11), max_point([(5, 7), (6, 6), (0, 11), (23, 3), (5, 5)]))
+
+
+def test_allocate_slots0():
+    eq_([], allocate_slots([]))
+
+
+def test_allocate_slots1():
+    eq_([0, 1, 0, 1], allocate_slots([(1, 1), (1, 1), (2, 2), (2, 2)]))
+
+
+def test_allocate_slots2():
+    eq_([0, 1, 2, 1], allocate_slots([(0, 5), (1, 2), (2, 4), (3, 6)]))
+
+
+def test_allocate_slots3():
+    eq_([0, 0], allocate_slots([(4, 4), (1, 3)]))
+
+
+@raises(ValueError)
+def test_allocate_slots_error():
+    allocate_slots([(3, 2)])
@@ -0,0 +1,255 @@
+"""
+A lightweight representation of triggers, conditions, and effects.
+
+The scenario library's condition and effect objects store every attribute
+of every condition and effect type. The classes in this module store only
+the attributes that are changed from their defaults, and they are lowered
+to the library's objects once a group of triggers is finished. They can be
+pickled, so a group of triggers can be lowered in a worker process.
+
+GNU General Public License v3.0: See the LICENSE file.
+"""
+
+
+import copy
+import inspect
+import sys
+from typing import Any, Dict, List
+from AoE2ScenarioParser.objects.condition_obj import ConditionObject
+from AoE2ScenarioParser.objects.effect_obj import EffectObject
+from AoE2ScenarioParser.objects.trigger_obj import TriggerObject
+
+
+def _defaults(cls, type_name: str) -> Dict[str, Any]:
+    """
+    Returns a dict mapping the name of each attribute of the library class
+    cls, other than its type attribute type_name, to its default value.
+    """
+    return {
+        name: param.default
+        for name, param in inspect.signature(cls).parameters.items()
+        if name != type_name
+    }
+
+
+# Default values of the attributes of a condition.
+_CONDITION_DEFAULTS = _defaults(ConditionObject, 'condition_type')
+
+
+# Default values of the attributes of an effect.
+_EFFECT_DEFAULTS = _defaults(EffectObject, 'effect_type')
+
+
+def _intern(value):
+    """Returns value, interned if it is a string."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _null_terminate(s: str) -> str:
+    """
+    Returns s as the library's trigger setters store it: with a trailing
+    null character appended. The empty string is returned unchanged.
+    """
+    if not s:
+        return s
+    return s + '\x00' if s[-1] != '\x00' else ''
+
+
+class _Record:
+    """
+    Base class of conditions and effects that store only the attributes
+    that are set, with the remaining attributes read from defaults.
+    """
+
+    __slots__ = ('_fields',)
+
+    # Maps each attribute name to its default value.
+    _DEFAULTS: Dict[str, Any] = {}
+
+    def __init__(self):
+        """Initializes a new record with all attributes at their defaults."""
+        self._fields = {}
+
+    def __getattr__(self, name: str):
+        # Only called for names that are not found on the instance.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._fields.get(name, self._DEFAULTS[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value) -> None:
+        if name in self._DEFAULTS:
+            self._fields[sys.intern(name)] = _intern(value)
+        elif hasattr(type(self), name):
+            # Slots are descriptors on the class.
+            object.__setattr__(self, name, value)
+        else:
+            msg = f'{type(self).__name__} has no attribute {name}.'
+            raise AttributeError(msg)
+
+    def is_set(self, name: str) -> bool:
+        """Returns True if attribute name is set, not at its default."""
+        return name in self._fields
+
+    def copy(self):
+        """Returns a copy of this record that can be modified separately."""
+        record = copy.copy(self)
+        record._fields = dict(self._fields)
+        return record
+
+    def substitute(self, values: Dict[Any, Any]):
+        """
+        Returns a copy of this record in which each attribute whose value is
+        a key of values is set to the corresponding value, or this record
+        itself if no attribute's value is a key of values.
+        """
+        changed = {name: values[value] for name, value in self._fields.items()
+                   if value in values}
+        if not changed:
+            return self
+        record = self.copy()
+        record._fields.update(changed)
+        return record
+
+
+class ConditionIR(_Record):
+    """An instance represents a condition of a trigger."""
+
+    __slots__ = ('condition_type',)
+
+    _DEFAULTS = _CONDITION_DEFAULTS
+
+    def __init__(self, condition_type: int):
+        """Initializes a new condition of type condition_type."""
+        super().__init__()
+        self.condition_type = condition_type
+
+    def lower(self) -> ConditionObject:
+        """Returns the library condition object this condition represents."""
+        return ConditionObject(self.condition_type, **self._fields)
+
+
+class EffectIR(_Record):
+    """An instance represents an effect of a trigger."""
+
+    __slots__ = ('effect_type',)
+
+    _DEFAULTS = _EFFECT_DEFAULTS
+
+    def __init__(self, effect_type: int):
+        """Initializes a new effect of type effect_type."""
+        super().__init__()
+        self.effect_type = effect_type
+
+    def lower(self) -> EffectObject:
+        """Returns the library effect object this effect represents."""
+        return EffectObject(self.effect_type, **self._fields)
+
+
+class TriggerIR:
+    """
+    An instance represents a trigger, with the same attributes and
+    methods for adding conditions and effects as the library's triggers.
+    """
+
+    __slots__ = (
+        'trigger_id', '_name', '_description', '_short_description',
+        'description_stid', 'short_description_stid', 'display_as_objective',
+        'display_on_screen', 'description_order', 'enabled', 'looping',
+        'header', 'mute_objectives', 'conditions', 'effects',
+    )
+
+    def __init__(self, name: str, trigger_id: int):
+        """Initializes a new trigger with the given name and id."""
+        self.trigger_id = trigger_id
+        self.name = name
+        self.description = ''
+        self.short_description = ''
+        self.description_stid = -1
+        self.short_description_stid = -1
+        self.display_as_objective = 0
+        self.display_on_screen = 0
+        self.description_order = 0
+        self.enabled = 1
+        self.looping = 0
+        self.header = 0
+        self.mute_objectives = 0
+        self.conditions: List[ConditionIR] = []
+        self.effects: List[EffectIR] = []
+
+    @property
+    def name(self) -> str:
+        """Returns this trigger's null-terminated name."""
+        return _null_terminate(self._name)
+
+    @name.setter
+    def name(self, val: str) -> None:
+        self._name = val
+
+    @property
+    def description(self) -> str:
+        """Returns this trigger's null-terminated description."""
+        return _null_terminate(self._description)
+
+    @description.setter
+    def description(self, val: str) -> None:
+        self._description = val
+
+    @property
+    def short_description(self) -> str:
+        """Returns this trigger's null-terminated short description."""
+        return _null_terminate(self._short_description)
+
+    @short_description.setter
+    def short_description(self, val: str) -> None:
+        self._short_description = val
+
+    def add_condition(self, condition_type: int) -> ConditionIR:
+        """Appends a new condition of condition_type and returns it."""
+        cond = ConditionIR(condition_type)
+        self.conditions.append(cond)
+        return cond
+
+    def add_effect(self, effect_type: int) -> EffectIR:
+        """Appends a new effect of effect_type and returns it."""
+        effect = EffectIR(effect_type)
+        self.effects.append(effect)
+        return effect
+
+    def copy(self, name: str, trigger_id: int) -> 'TriggerIR':
+        """
+        Returns a copy of this trigger with the given name and id, and with
+        no conditions or effects. Its other attributes are the same as this
+        trigger's.
+        """
+        trigger = TriggerIR(name, trigger_id)
+        for attr in self.__slots__:
+            if attr not in ('trigger_id', '_name', 'conditions', 'effects'):
+                setattr(trigger, attr, getattr(self, attr))
+        return trigger
+
+    def lower(self) -> TriggerObject:
+        """Returns the library trigger object this trigger represents."""
+        # The library's initializer null-terminates the strings.
+        return TriggerObject(
+            self._name,
+            description=self._description,
+            description_stid=self.description_stid,
+            display_as_objective=self.display_as_objective,
+            short_description=self._short_description,
+            short_description_stid=self.short_description_stid,
+            display_on_screen=self.display_on_screen,
+            description_order=self.description_order,
+            enabled=self.enabled,
+            looping=self.looping,
+            header=self.header,
+            mute_objectives=self.mute_objectives,
+            conditions_list=[cond.lower() for cond in self.conditions],
+            condition_order=list(range(len(self.conditions))),
+            effects_list=[effect.lower() for effect in self.effects],
+            effect_order=list(range(len(self.effects))),
+            trigger_id=self.trigger_id,
+        )
+
@@ -0,0 +1,324 @@
+"""
+Relocatable trigger modules for the rounds of a scenario.
+
+A module holds the triggers of a single round, built once, together with
+the parts of those triggers that depend on where the round is placed in a
+scenario: the ids of the triggers it activates and deactivates, the round
+index, the technologies that earlier rounds have already researched, and
+effects that are added only next to certain other rounds. These parts are
+filled in when the module is linked into a scenario, so the same module
+can be linked into every scenario that contains its round, at any index.
+
+Modules can be kept across builds in a ModuleCache.
+
+GNU General Public License v3.0: See the LICENSE file.
+"""
+
+
+from collections import defaultdict
+import enum
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from AoE2ScenarioParser.datasets.players import Player
+from trigger_ir import ConditionIR, EffectIR, TriggerIR
+
+
+# A condition or an effect of a trigger.
+Record = Union[ConditionIR, EffectIR]
+
+
+class Symbol(enum.Enum):
+    """A value of a condition or effect that is filled in when linking."""
+
+    # The index of the round into which the module is linked.
+    ROUND_INDEX = enum.auto()
+
+
+class Placement(enum.Enum):
+    """
+    A condition on the position of a round in its scenario. Parts of a
+    module with a placement are linked only if the condition holds.
+    """
+
+    # The round is the first round.
+    FIRST_ROUND = enum.auto()
+
+    # The round is the last round, not counting the tiebreaker.
+    LAST_ROUND = enum.auto()
+
+    # The round is the first round, or the round before it is a minigame.
+    # For the tiebreaker, the round before it is the last round.
+    AFTER_MINIGAME = enum.auto()
+
+    # The round is not the last round, and the round after it is a minigame.
+    BEFORE_MINIGAME = enum.auto()
+
+
+class EffectBlock:
+    """
+    A sequence of effects of a module's trigger that is linked only if its
+    placement holds.
+    """
+
+    def __init__(self, placement: Placement):
+        """Initializes a new empty block with the given placement."""
+        self.placement = placement
+        self.effects: List[EffectIR] = []
+
+    def add_effect(self, effect_type: int) -> EffectIR:
+        """Appends a new effect of effect_type and returns it."""
+        effect = EffectIR(effect_type)
+        self.effects.append(effect)
+        return effect
+
+
+class ResearchSlot:
+    """
+    The effects of a module's trigger that research a technology. The
+    effects are linked only if no earlier trigger researches it.
+    """
+
+    def __init__(self, tech_name: str):
+        """Initializes a new slot for researching tech_name."""
+        self.tech_name = tech_name
+
+
+class TriggerModule:
+    """
+    An instance represents the triggers of a round, built for the round
+    at index, with the parts that depend on the round's placement held
+    separately so they can be filled in by a linker.
+
+    The triggers' ids are their indices in the module. The triggers refer
+    to other triggers only by the names in links. The conditions and
+    effects of the triggers are shared by every scenario into which the
+    module is linked, so they must not be modified after the module is
+    built.
+    """
+
+    def __init__(self, index: int, var_ids: Dict[str, int]):
+        """
+        Initializes a new empty module for the round at index, with the
+        variable ids given by var_ids.
+        """
+        self.index = index
+        self.var_ids = dict(var_ids)
+        self.triggers: List[TriggerIR] = []
+
+        # (activate, source, target, placement) tuples, in the order in
+        # which they are added. Activates target if activate is True,
+        # or deactivates it otherwise. The placement may be None.
+        self.links: List[Tuple[bool, str, str, Placement]] = []
+
+        # Maps the index of a trigger to the list of (position, slot) pairs
+        # of the effects to insert before the effect at position.
+        self.slots: Dict[
+            int, List[Tuple[int, Union[EffectBlock, ResearchSlot]]]
+        ] = defaultdict(list)
+
+        # The research slots, in the order in which they are added.
+        self.researches: List[ResearchSlot] = []
+
+        # (player, reference id) pairs of the units that the round
+        # replaces with triggers, and are removed from the scenario.
+        self.removed_units: List[Tuple[Player, int]] = []
+
+        self._names = set()
+
+    def add_trigger(self, name: str) -> TriggerIR:
+        """
+        Appends a new trigger named name and returns it.
+        Raises a ValueError if the module already has a trigger named name.
+        """
+        return self._append(TriggerIR(name, len(self.triggers)))
+
+    def add_link(self, activate: bool, source: str, target: str,
+                 placement: Placement = None) -> None:
+        """
+        Adds an activation of target by source if activate is True, or a
+        deactivation otherwise. If placement is not None, the link is
+        made only if the placement holds.
+        """
+        self.links.append((activate, source, target, placement))
+
+    def add_block(self, trigger: TriggerIR,
+                  placement: Placement) -> EffectBlock:
+        """
+        Returns a new block of effects with the given placement, to be
+        inserted after trigger's current effects.
+        """
+        block = EffectBlock(placement)
+        self._add_slot(trigger, block)
+        return block
+
+    def add_research(self, trigger: TriggerIR, tech_name: str) -> None:
+        """
+        Adds a slot for researching tech_name after trigger's current
+        effects.
+        """
+        slot = ResearchSlot(tech_name)
+        self._add_slot(trigger, slot)
+        self.researches.append(slot)
+
+    def remove_unit(self, p: Player, reference_id: int) -> None:
+        """Adds the unit of p with reference_id to the removed units."""
+        self.removed_units.append((p, reference_id))
+
+    def transform(self, rename: Callable[[str], str],
+                  remap: Callable[[Record], Record],
+                  order: List[int] = None) -> 'TriggerModule':
+        """
+        Returns a new module for the same round, in which each trigger,
+        and each trigger named in a link, is renamed by rename, and each
+        condition and effect, including those of blocks, is replaced by
+        remap. The new module's triggers are this module's triggers in
+        the order of their indices in order, or in the same order if
+        order is None. The removed units are the same.
+        """
+        if order is None:
+            order = range(len(self.triggers))
+        module = TriggerModule(self.index, self.var_ids)
+        new_ids = {}
+        for k in order:
+            source = self.triggers[k]
+            trigger = module._append(source.copy(
+                rename(source.name.rstrip('\x00')), len(module.triggers)))
+            new_ids[k] = trigger.trigger_id
+            trigger.conditions = [remap(c) for c in source.conditions]
+            trigger.effects = [remap(e) for e in source.effects]
+        researches = {}
+        for slot in self.researches:
+            researches[slot] = ResearchSlot(slot.tech_name)
+            module.researches.append(researches[slot])
+        for k, slots in self.slots.items():
+            for position, slot in slots:
+                if isinstance(slot, ResearchSlot):
+                    new_slot = researches[slot]
+                else:
+                    new_slot = EffectBlock(slot.placement)
+                    new_slot.effects = [remap(e) for e in slot.effects]
+                module.slots[new_ids[k]].append((position, new_slot))
+        module.links = [(activate, rename(source), rename(target), placement)
+                        for activate, source, target, placement in self.links]
+        module.removed_units = list(self.removed_units)
+        return module
+
+    def _append(self, trigger: TriggerIR) -> TriggerIR:
+        """
+        Appends trigger, whose id is the number of triggers in the module,
+        and returns it.
+        Raises a ValueError if the module already has a trigger with the
+        same name.
+        """
+        name = trigger.name.rstrip('\x00')
+        if name in self._names:
+            raise ValueError(f'{name} is already the name of a trigger.')
+        self._names.add(name)
+        self.triggers.append(trigger)
+        return trigger
+
+    def _add_slot(self, trigger: TriggerIR,
+                  slot: Union[EffectBlock, ResearchSlot]) -> None:
+        """Adds slot after trigger's current effects."""
+        if self.triggers[trigger.trigger_id] is not trigger:
+            raise ValueError(f'{trigger.name} is not in the module.')
+        self.slots[trigger.trigger_id].append((len(trigger.effects), slot))
+
+
+def source_digest(*modules) -> str:
+    """
+    Returns the SHA-256 hash of the source files of the given modules,
+    in order, as a hexadecimal string.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+class ModuleCache:
+    """
+    A persistent cache of built modules, stored as one pickled file per
+    module in a directory. Each file is named by the SHA-256 hash of the
+    module's key and of the cache's version, so entries written by a
+    different version of the code that builds the modules are never read.
+
+    The least recently used entries are removed when the files in the
+    directory exceed a maximum total size.
+    """
+
+    # Extension of the files of the cache's entries.
+    SUFFIX = '.module'
+
+    def __init__(self, cache_dir: str, version: str, max_bytes: int):
+        """
+        Initializes a cache of the modules in cache_dir, whose entries are
+        written by the given version of the code, and whose files total
+        at most max_bytes. The directory is created when the first entry
+        is written.
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+        self.max_bytes = max_bytes
+
+    def _path(self, key: tuple) -> str:
+        """Returns the path of the file of the entry with the given key."""
+        digest = hashlib.sha256(repr((self.version, key)).encode())
+        return os.path.join(self.cache_dir,
+                            f'{digest.hexdigest()}{self.SUFFIX}')
+
+    def get(self, key: tuple) -> Optional[TriggerModule]:
+        """
+        Returns the module with the given key, or None if the cache has no
+        entry for key, or if its entry cannot be read.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as entry:
+                module = pickle.load(entry)
+            # Marks the entry as recently used.
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return module
+
+    def put(self, key: tuple, module: TriggerModule) -> None:
+        """
+        Adds module to the cache with the given key, then removes the least
+        recently used entries while the cache exceeds its maximum size.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Writes to a temporary file first, so concurrent builds never
+        # read a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(module, tmp_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used entries until the total size of
+        the entries is at most max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue # Removed by a concurrent build.
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -5,6 +5,7 @@ GNU General Public License v3.0: See the LICENSE file.
 """
 
 
+import heapq
 import math
 from typing import List, Tuple
 
@@ -66,3 +67,35 @@ def max_point(points: List[Tuple[int, int]]) -> Tuple[int, int]:
     x = max(a for a, __ in points)
     y = max(b for __, b in points)
     return x, y
+
+
+def allocate_slots(ranges: List[Tuple[int, int]]) -> List[int]:
+    """
+    Returns a list of the slots assigned to the live ranges in ranges,
+    where each range is a (start, end) pair of the first and last times
+    at which the range is live. Ranges that are live at the same time are
+    assigned different slots, and a slot is reused once its range ends.
+
+    The ranges are assigned in order of their starts, each to the least
+    slot that is free, so the number of slots used is the maximum number
+    of ranges that are live at the same time.
+    Raises a ValueError if a range ends before it starts.
+    """
+    for start, end in ranges:
+        if end < start:
+            raise ValueError(f'The range ({start}, {end}) ends before it starts.') # pylint: disable=line-too-long
+    slots = [0] * len(ranges)
+    live = [] # Heap of the (end, slot) pairs of the live ranges.
+    free = [] # Heap of the free slots below num_slots.
+    num_slots = 0
+    for k in sorted(range(len(ranges)), key=lambda k: ranges[k][0]):
+        start, end = ranges[k]
+        while live and live[0][0] < start:
+            heapq.heappush(free, heapq.heappop(live)[1])
+        if free:
+            slots[k] = heapq.heappop(free)
+        else:
+            slots[k] = num_slots
+            num_slots += 1
+        heapq.heappush(live, (end, slots[k]))
+    return slots
@@ -6,11 +6,50 @@ GNU General Public License v3.0: See the LICENSE file.
 """
 
 
-from typing import Tuple
+import copy
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+import functools
+import hashlib
+import mmap
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Tuple, Union
+import zlib
+from AoE2ScenarioParser import aoe2_scenario
 from AoE2ScenarioParser.aoe2_scenario import AoE2Scenario
+from AoE2ScenarioParser.helper import generator, helper, parser
+from AoE2ScenarioParser.helper.retriever import find_retriever
+from AoE2ScenarioParser.objects.aoe2_object_manager import AoE2ObjectManager
+from AoE2ScenarioParser.objects.trigger_obj import TriggerObject
+from AoE2ScenarioParser.objects.units_obj import UnitsObject
+from AoE2ScenarioParser.pieces.file_header import FileHeaderPiece
+from AoE2ScenarioParser.pieces.map import MapPiece
+from AoE2ScenarioParser.pieces.triggers import TriggerPiece
+from AoE2ScenarioParser.pieces.units import UnitsPiece
 
 # TODO don't access _parsed_data directly
 
+# Directory in which the decompressed data of scenario files is cached.
+INFLATE_CACHE_DIR = '.scn-cache'
+
+# Maps the name of a compression option to its zlib compression level.
+# The scenario library always uses the 'max' level.
+COMPRESSION_LEVELS = {
+    'fast': zlib.Z_BEST_SPEED,
+    'default': zlib.Z_DEFAULT_COMPRESSION,
+    'max': zlib.Z_BEST_COMPRESSION,
+}
+
+# Names of the pieces of a scenario's data that are never modified after the
+# scenario is parsed. Copies of a scenario share these pieces.
+READ_ONLY_PIECES = (
+    'MessagesPiece', 'CinematicsPiece', 'BackgroundImagePiece',
+    'PlayerDataTwoPiece', 'GlobalVictoryPiece', 'DiplomacyPiece',
+    'OptionsPiece', 'MapPiece',
+)
+
+
 def get_and_inc_unit_id(scn: AoE2Scenario) -> None:
     """Returns the scenarios next unit id and increments the unit id counter."""
     data_header = scn._parsed_data['DataHeaderPiece']
@@ -28,3 +67,445 @@ def map_dimensions(scn: AoE2Scenario) -> Tuple[int, int]:
     width = map_piece.retrievers[9].data
     height = map_piece.retrievers[10].data
     return width, height
+
+
+def inflate(file_data: bytes, header_length: int,
+            cache_dir: str = INFLATE_CACHE_DIR) -> memoryview:
+    """
+    Returns the decompressed data of a scenario file, i.e. everything after
+    the file's header. file_data is the contents of the file, and
+    header_length is the number of bytes in its uncompressed header.
+
+    The decompressed data is cached in cache_dir, in a file named by the
+    SHA-256 hash of file_data, and is returned as a view of a read-only
+    memory map of that file. Later reads of the same scenario skip the
+    decompression and share their pages with other builds.
+    If cache_dir is None, the data is decompressed without caching.
+    """
+    if cache_dir is None:
+        return memoryview(
+            zlib.decompress(file_data[header_length:], -zlib.MAX_WBITS))
+    digest = hashlib.sha256(file_data).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{digest}.inflated')
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        data = zlib.decompress(file_data[header_length:], -zlib.MAX_WBITS)
+        # Writes to a temporary file first, so concurrent builds never
+        # read a partially written cache entry.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, cache_path)
+    with open(cache_path, 'rb') as cache_file:
+        # The view keeps the memory map open after the file is closed.
+        return memoryview(
+            mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def read_scenario(file_path: str,
+                  cache_dir: str = INFLATE_CACHE_DIR) -> AoE2Scenario:
+    """
+    Returns the scenario parsed from the file at file_path.
+
+    Equivalent to AoE2Scenario(file_path), but the decompressed data is
+    read through the inflate cache in cache_dir.
+    """
+    with open(file_path, 'rb') as scn_file:
+        file_data = scn_file.read()
+    header_length = parser.calculate_length(
+        generator.create_generator(file_data, 1),
+        FileHeaderPiece(parser.Parser()).retrievers)
+    # Fills in the fields set by AoE2Scenario.__init__, which always
+    # decompresses the file.
+    # pylint: disable=protected-access
+    scn = AoE2Scenario.__new__(AoE2Scenario)
+    scn._file = file_data
+    scn._file_header = file_data[:header_length]
+    scn._file_data = inflate(file_data, header_length, cache_dir)
+    scn.parser = parser.Parser()
+    scn._read_file(log_reading=False)
+    scn.object_manager = AoE2ObjectManager(
+        scn._parsed_header, scn._parsed_data, log_parsing=False)
+    # pylint: enable=protected-access
+    return scn
+
+
+def read_only_memo(scn: AoE2Scenario) -> Dict[int, Any]:
+    """
+    Returns a memo for copy.deepcopy that shares, rather than copies,
+    the parts of scn that are never modified after it is parsed:
+    the raw file data, the file header, and the READ_ONLY_PIECES.
+
+    The unit and trigger structs that were parsed from the file are shared
+    as well, since write_scenario replaces them with structs reconstructed
+    from the scenario's objects.
+    """
+    # pylint: disable=protected-access
+    shared = [scn._file, scn._file_header, scn._file_data, scn.parser]
+    shared.extend(scn._parsed_header.values())
+    shared.extend(scn._parsed_data[name] for name in READ_ONLY_PIECES)
+    units_piece = scn._parsed_data['UnitsPiece']
+    shared.append(find_retriever(units_piece.retrievers, 'Player Units').data)
+    trigger_piece = scn._parsed_data['TriggerPiece']
+    shared.append(find_retriever(trigger_piece.retrievers, 'Trigger data').data)
+    # pylint: enable=protected-access
+    return {id(obj): obj for obj in shared}
+
+
+def copy_scenario(scn: AoE2Scenario) -> AoE2Scenario:
+    """
+    Returns a copy of scn that can be modified independently of scn.
+    Copying is much faster than parsing the scenario file again.
+    """
+    return copy.deepcopy(scn, read_only_memo(scn))
+
+
+def write_scenario(scn: AoE2Scenario, file_path: str,
+                   compression: str = 'max',
+                   triggers: 'TriggerStream' = None) -> int:
+    """
+    Writes scn to file_path, compressing its data with the compression
+    level named by compression, a key of COMPRESSION_LEVELS.
+    If triggers is not None, it holds the scenario's flushed triggers.
+    Returns the number of bytes written.
+
+    Produces the same bytes as scn.write_to_file when compression is 'max',
+    but serializes in linear time: the library concatenates every field
+    onto a single growing bytes object. The data is deflated to the file
+    one field at a time, rather than being held in memory all at once.
+    """
+    level = COMPRESSION_LEVELS[compression]
+    # pylint: disable=protected-access
+    if triggers is None:
+        scn.object_manager.reconstruct(log_reconstructing=False)
+        trigger_data = None
+    else:
+        triggers.reconstruct()
+        trigger_data = triggers.trigger_data_retriever
+    header = []
+    for piece in scn._parsed_header.values():
+        for retriever in piece.retrievers:
+            _retriever_to_chunks(retriever, header)
+    header_bytes = b''.join(header)
+    size = len(header_bytes)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    with open(file_path, 'wb') as scn_file:
+        scn_file.write(header_bytes)
+
+        def write_data(data: bytes) -> None:
+            """Compresses data and writes it to the file."""
+            nonlocal size
+            compressed = compressor.compress(data)
+            size += len(compressed)
+            scn_file.write(compressed)
+
+        for piece in scn._parsed_data.values():
+            for retriever in piece.retrievers:
+                if retriever is trigger_data:
+                    for data in triggers.flushed_data():
+                        write_data(data)
+                chunks = []
+                _retriever_to_chunks(retriever, chunks)
+                write_data(b''.join(chunks))
+        write_data(scn._suffix)
+        compressed = compressor.flush()
+        size += len(compressed)
+        scn_file.write(compressed)
+    # pylint: enable=protected-access
+    return size
+
+
+# Memoizes the library's parsing of a datatype string, which otherwise
+# dominates the time spent serializing structs.
+_type_length = functools.lru_cache(maxsize=None)(parser.datatype_to_type_length)
+
+
+def _retriever_to_chunks(retriever, chunks: List[bytes]) -> None:
+    """
+    Appends the bytes of retriever's data to chunks.
+    Structs are expanded field by field, so no bytes are copied more
+    than once.
+
+    Raises a ValueError if the retriever has no data.
+    """
+    if retriever.data is None:
+        raise ValueError(f'No data found in retriever {retriever.name}.')
+    var_type, __ = _type_length(retriever.datatype.var)
+    if var_type != 'struct':
+        chunks.append(parser.retriever_to_bytes(retriever))
+        return
+    if isinstance(retriever.data, list):
+        retriever.datatype.repeat = len(retriever.data)
+        structs = retriever.data
+    else:
+        structs = [retriever.data] * retriever.datatype.repeat
+    for struct in structs:
+        for struct_retriever in struct.retrievers:
+            _retriever_to_chunks(struct_retriever, chunks)
+
+
+def _serialize_triggers(triggers) -> bytes:
+    """
+    Returns the deflated bytes of the trigger data for triggers, a list
+    of objects whose lower method returns a library trigger object.
+
+    Runs independently of any scenario, so it may run in a worker process.
+    """
+    piece = TriggerPiece()
+    retriever = find_retriever(piece.retrievers, 'Trigger data')
+    retriever.data = []
+    for trigger in triggers:
+        TriggerObject._reconstruct_object( # pylint: disable=protected-access
+            {'TriggerPiece': piece}, None, trigger=trigger.lower())
+    chunks = []
+    _retriever_to_chunks(retriever, chunks)
+    compressor = zlib.compressobj(
+        zlib.Z_BEST_SPEED, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(b''.join(chunks)) + compressor.flush()
+
+
+class TriggerStream:
+    """
+    Serializes the triggers of a scenario as they are finished, so that
+    they need not be kept in memory until the scenario is written.
+
+    The triggers with ids less than the watermark have been flushed: they
+    are held only as compressed bytes, one fragment per flush, and are
+    represented by None in the scenario's trigger manager. If the stream
+    has an executor, fragments are serialized by its workers while the
+    next triggers are created, and are merged in the order they were
+    flushed. Pass the stream to write_scenario to write the scenario.
+    """
+
+    def __init__(self, scn: AoE2Scenario, executor: Executor = None):
+        """
+        Initializes a new stream with no flushed triggers for scn.
+        Triggers are serialized by executor, or in this process if
+        executor is None.
+        """
+        self._scn = scn
+        self._executor = executor
+        # Each fragment is either bytes or a future of bytes.
+        self._fragments: List[Union[bytes, Future]] = []
+        self._watermark = 0
+
+    def __deepcopy__(self, memo):
+        # Executors and futures cannot be copied, so the copy shares the
+        # executor and waits for the pending fragments.
+        stream = TriggerStream(copy.deepcopy(self._scn, memo), self._executor)
+        stream._fragments = list(self._fragment_bytes())
+        stream._watermark = self._watermark
+        return stream
+
+    @property
+    def watermark(self) -> int:
+        """Returns the number of flushed triggers."""
+        return self._watermark
+
+    @property
+    def trigger_data_retriever(self):
+        """Returns the retriever for the scenario's trigger data."""
+        # pylint: disable=protected-access
+        piece = self._scn._parsed_data['TriggerPiece']
+        return find_retriever(piece.retrievers, 'Trigger data')
+
+    def flush(self, triggers) -> None:
+        """
+        Serializes triggers, a list of objects whose lower method returns
+        a library trigger object, and advances the watermark past them.
+
+        Raises a ValueError if the triggers' ids do not continue from the
+        last trigger in the scenario's trigger manager.
+        """
+        trigger_data = self._scn.object_manager.trigger_manager.trigger_data
+        for index, trigger in enumerate(triggers, len(trigger_data)):
+            if trigger.trigger_id != index:
+                msg = (f'Trigger {trigger.name} has id {trigger.trigger_id}, '
+                       + f'but would be flushed to index {index}.')
+                raise ValueError(msg)
+        if not triggers:
+            return
+        if self._executor is None:
+            self._fragments.append(_serialize_triggers(triggers))
+        else:
+            self._fragments.append(
+                self._executor.submit(_serialize_triggers, triggers))
+        trigger_data.extend([None] * len(triggers))
+        self._watermark = len(trigger_data)
+
+    def _fragment_bytes(self) -> Iterator[bytes]:
+        """Yields the compressed fragments, waiting for pending ones."""
+        for fragment in self._fragments:
+            if isinstance(fragment, Future):
+                fragment = fragment.result()
+            yield fragment
+
+    def flushed_data(self) -> Iterator[bytes]:
+        """Yields the serialized bytes of the flushed triggers, in order."""
+        for fragment in self._fragment_bytes():
+            yield zlib.decompress(fragment, -zlib.MAX_WBITS)
+
+    def reconstruct(self) -> None:
+        """
+        Reconstructs the scenario's pieces from its objects, including
+        only the triggers that have not been flushed in the trigger data.
+        """
+        mgr = self._scn.object_manager
+        # pylint: disable=protected-access
+        parsed_data = self._scn._parsed_data
+        objects = mgr._objects
+        UnitsObject._reconstruct_object(parsed_data, objects)
+        retriever = self.trigger_data_retriever
+        retriever.data = []
+        trigger_data = mgr.trigger_manager.trigger_data
+        for trigger in trigger_data[self._watermark:]:
+            TriggerObject._reconstruct_object(parsed_data, objects,
+                                              trigger=trigger)
+        # pylint: enable=protected-access
+        piece = parsed_data['TriggerPiece']
+        find_retriever(piece.retrievers,
+                       'Number of triggers').data = len(trigger_data)
+        display_order = find_retriever(piece.retrievers,
+                                       'Trigger display order array')
+        helper.update_order_array(parser.listify(display_order.data),
+                                  len(trigger_data))
+
+
+class _ByteGenerator:
+    """
+    A generator over the bytes of a scenario file, one byte at a time.
+
+    Behaves as the generators used by the scenario parser, but also
+    supports jumping ahead, so fixed size sections of the file can be
+    passed over without decoding them.
+    """
+
+    def __init__(self, data):
+        """
+        Initializes a new generator over data, starting at byte 0.
+        data may be bytes or a memoryview.
+        """
+        self._data = data
+        self.pos = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        if self.pos >= len(self._data):
+            raise StopIteration
+        self.pos += 1
+        return self._data[self.pos - 1:self.pos]
+
+    def skip(self, n: int) -> None:
+        """
+        Advances the generator by n bytes.
+
+        Raises a ValueError if fewer than n bytes remain.
+        """
+        if self.pos + n > len(self._data):
+            raise ValueError(f'Cannot skip {n} bytes at position {self.pos}.')
+        self.pos += n
+
+
+class _ObjectManager:
+    """Holds the unit manager of a partially parsed scenario."""
+
+    def __init__(self, unit_manager: UnitsObject):
+        """Initializes an object manager with the given unit manager."""
+        self.unit_manager = unit_manager
+
+
+class UnitScenario:
+    """
+    The units of a scenario file, read without parsing the entire file.
+
+    Provides the object_manager.unit_manager interface of AoE2Scenario
+    for reading the units of template scenarios. The map's terrain tiles
+    are skipped and the pieces following the units (the triggers) are
+    not parsed, so a UnitScenario cannot be written to a file.
+    """
+
+    def __init__(self, file_path: str, cache_dir: str = INFLATE_CACHE_DIR):
+        """
+        Reads the units from the scenario file at file_path.
+        The decompressed data is read through the inflate cache in
+        cache_dir, see inflate.
+        """
+        with open(file_path, 'rb') as scn_file:
+            file_data = scn_file.read()
+        # A single parser is used, as later pieces depend on values
+        # saved by earlier pieces, such as the scenario version.
+        psr = parser.Parser()
+        parsed_data = OrderedDict()
+
+        # pylint: disable=protected-access
+        header_generator = _ByteGenerator(file_data)
+        for piece_type in aoe2_scenario._header_structure:
+            piece_type(psr).set_data_from_generator(header_generator)
+
+        data = inflate(file_data, header_generator.pos, cache_dir)
+        data_generator = _ByteGenerator(data)
+        for piece_type in aoe2_scenario._file_structure:
+            piece = piece_type(psr)
+            parsed_data[piece_type.__name__] = piece
+            if piece_type is MapPiece:
+                _read_map(psr, piece, data_generator)
+            else:
+                piece.set_data_from_generator(data_generator)
+            if piece_type is UnitsPiece:
+                break
+
+        # Only the units are kept, so a UnitScenario is small and can be
+        # pickled, e.g. to return it from a worker process.
+        self.object_manager = _ObjectManager(
+            UnitsObject._parse_object(parsed_data))
+        # pylint: enable=protected-access
+
+    def copy_units(self) -> 'UnitScenario':
+        """
+        Returns a UnitScenario with a deep copy of this scenario's units.
+
+        Use a copy when the units are to be mutated, e.g. by
+        event.make_fights.
+        """
+        scn = copy.copy(self)
+        scn.object_manager = _ObjectManager(
+            copy.deepcopy(self.object_manager.unit_manager))
+        return scn
+
+
+def _read_map(psr: parser.Parser, map_piece: MapPiece,
+              data_generator: _ByteGenerator) -> None:
+    """
+    Reads the data of map_piece from the generator, skipping over the
+    bytes of the terrain tiles. The terrain data is left empty.
+    """
+    width = height = 0
+    for retriever in map_piece.retrievers:
+        if retriever.name == 'Terrain data':
+            retriever.set_data([])
+            data_generator.skip(width * height * _struct_length(retriever))
+            continue
+        retriever.set_data(psr.retrieve_value(data_generator, retriever))
+        if retriever.name == 'Map Width':
+            width = retriever.data
+        elif retriever.name == 'Map Height':
+            height = retriever.data
+
+
+def _struct_length(retriever) -> int:
+    """
+    Returns the number of bytes in one struct of the retriever's type.
+
+    Raises a ValueError if the struct does not have a fixed length.
+    """
+    struct = retriever.datatype.var()
+    length = 0
+    for field in struct.retrievers:
+        datatype, field_length = parser.datatype_to_type_length(
+            field.datatype.var)
+        if datatype in ('struct', 'str') or field.set_repeat is not None:
+            raise ValueError(f'Field {field.name} has a variable length.')
+        length += field_length * field.datatype.repeat
+    return length
@@ -7,9 +7,7 @@ GNU General Public License v3.0: See the LICENSE file.
 
 from enum import Enum
 from AoE2ScenarioParser.datasets import conditions, effects
-from AoE2ScenarioParser.objects.condition_obj import ConditionObject
-from AoE2ScenarioParser.objects.effect_obj import EffectObject
-from AoE2ScenarioParser.objects.trigger_obj import TriggerObject
+from trigger_ir import ConditionIR, EffectIR, TriggerIR
 
 
 # Index of Food in the accumulate attribute condition list.
@@ -61,7 +59,7 @@ class TimerUnits(Enum):
     seconds = 2
 
 
-def add_cond_destroy_obj(trigger: TriggerObject, unit_id: int) -> None:
+def add_cond_destroy_obj(trigger: TriggerIR, unit_id: int) -> None:
     """
     Adds a condition to trigger that the unit with id unit_id is destroyed.
     """
@@ -69,7 +67,7 @@ def add_cond_destroy_obj(trigger: TriggerObject, unit_id: int) -> None:
     destroy_obj.unit_object = unit_id
 
 
-def add_cond_gaia_defeated(trigger: TriggerObject) -> None:
+def add_cond_gaia_defeated(trigger: TriggerIR) -> None:
     """
     Adds a condition to trigger that the gaia player is defeated.
 
@@ -80,7 +78,7 @@ def add_cond_gaia_defeated(trigger: TriggerObject) -> None:
     gaia_defeated.player = 0
 
 
-def add_cond_hp0(trigger: TriggerObject, uid: int) -> None:
+def add_cond_hp0(trigger: TriggerIR, uid: int) -> None:
     """
     Adds a condition to trigger that the unit with id number uid
     has 0 Hit Points.
@@ -95,7 +93,7 @@ def add_cond_hp0(trigger: TriggerObject, uid: int) -> None:
     hp0.unit_object = uid
 
 
-def add_cond_pop0(trigger: TriggerObject, player: int) -> None:
+def add_cond_pop0(trigger: TriggerIR, player: int) -> None:
     """Adds a condition to trigger that the player has population 0."""
     pop0 = trigger.add_condition(conditions.accumulate_attribute)
     pop0.player = player
@@ -104,19 +102,19 @@ def add_cond_pop0(trigger: TriggerObject, player: int) -> None:
     pop0.inverted = True
 
 
-def add_cond_timer(trigger: TriggerObject, num_seconds: int) -> None:
+def add_cond_timer(trigger: TriggerIR, num_seconds: int) -> None:
     """Adds a timer condition to trigger to wait num_seconds seconds."""
     timer = trigger.add_condition(conditions.timer)
     timer.timer = num_seconds
 
 
-def add_effect_activate(source: TriggerObject, target: int) -> None:
+def add_effect_activate(source: TriggerIR, target: int) -> None:
     """Adds an effect to source to activate the trigger with index target."""
     activate = source.add_effect(effects.activate_trigger)
     activate.trigger_id = target
 
 
-def add_effect_change_own_unit(trigger: TriggerObject, source: int, target: int,
+def add_effect_change_own_unit(trigger: TriggerIR, source: int, target: int,
                                uid: int) -> None:
     """
     Adds an effect to trigger to change the ownership of the unit with
@@ -129,19 +127,19 @@ def add_effect_change_own_unit(trigger: TriggerObject, source: int, target: int,
     change_own.number_of_units_selected = 1
 
 
-def add_effect_deactivate(source: TriggerObject, target: int) -> None:
+def add_effect_deactivate(source: TriggerIR, target: int) -> None:
     """Adds an effect to source to dectivate the trigger with index target."""
     deactivate = source.add_effect(effects.deactivate_trigger)
     deactivate.trigger_id = target
 
 
-def add_effect_delcare_victory(trigger: TriggerObject, player: int) -> None:
+def add_effect_delcare_victory(trigger: TriggerIR, player: int) -> None:
     """Adds to trigger an effect to Declare Victory to the player."""
     declare_victory = trigger.add_effect(effects.declare_victory)
     declare_victory.player_source = player
 
 
-def add_effect_modify_res(trigger: TriggerObject, quantity: int,
+def add_effect_modify_res(trigger: TriggerIR, quantity: int,
                           tribute_list: int) -> None:
     """
     Adds an effect to trigger to set the quantity of resource at the
@@ -156,7 +154,7 @@ def add_effect_modify_res(trigger: TriggerObject, quantity: int,
         modify_res.operation = ChangeVarOp.set_op.value
 
 
-def add_effect_remove_obj(trigger: TriggerObject, unit_id: int,
+def add_effect_remove_obj(trigger: TriggerIR, unit_id: int,
                           player: int) -> None:
     """
     Adds to trigger an effect to remove the unit with it unit_id.
@@ -168,7 +166,7 @@ def add_effect_remove_obj(trigger: TriggerObject, unit_id: int,
     remove_obj.selected_object_id = unit_id
 
 
-def add_effect_research_tech(trigger: TriggerObject, tech_id: int,
+def add_effect_research_tech(trigger: TriggerIR, tech_id: int,
                              player: int) -> None:
     """
     Adds to trigger an effect to research the technology given by tech_id
@@ -180,7 +178,7 @@ def add_effect_research_tech(trigger: TriggerObject, tech_id: int,
     res_tech.force_research_technology = True
 
 
-def add_effect_teleport(trigger: TriggerObject, unit_id: int,
+def add_effect_teleport(trigger: TriggerIR, unit_id: int,
                         x: int, y: int, player: int) -> None:
     """
     Adds to trigger an effect to teleport the unit specificed by unit_id
@@ -195,7 +193,7 @@ def add_effect_teleport(trigger: TriggerObject, unit_id: int,
     teleport.location_y = y
 
 
-def set_cond_area(cond: ConditionObject,
+def set_cond_area(cond: ConditionIR,
                   x1: int, y1: int, x2: int, y2: int) -> None:
     """
     Sets the area selected by cond to minimum (x1, y1) and maximum (x2, y2).
@@ -206,7 +204,7 @@ def set_cond_area(cond: ConditionObject,
     cond.area_2_y = y2
 
 
-def set_effect_area(effect: EffectObject,
+def set_effect_area(effect: EffectIR,
                     x1: int, y1: int, x2: int, y2: int) -> None:
     """
     Sets the area selected by effect to minimum (x1, y1) and maximum (x2, y2).
@@ -6,7 +6,7 @@ GNU General Public License v3.0: See the LICENSE file.
 
 
 import math
-from typing import List, Tuple
+from typing import Callable, Iterable, List, Tuple
 from AoE2ScenarioParser.aoe2_scenario import AoE2Scenario
 from AoE2ScenarioParser.pieces.structs.unit import UnitStruct
 from AoE2ScenarioParser.datasets import units
@@ -53,6 +53,47 @@ def remove(scn: AoE2Scenario, unit: UnitStruct, p: Player) -> None:
     scn.object_manager.unit_manager.get_player_units(p).remove(unit)
 
 
+def filter_units(scn: AoE2Scenario, p: Player,
+                 pred: Callable[[UnitStruct], bool]) -> List[UnitStruct]:
+    """
+    Removes every unit of player p for which pred returns True.
+
+    The player's unit list is rebuilt in place in a single pass, rather
+    than searching the list once per removed unit.
+    Returns the list of removed units, in their original order.
+    """
+    ulst = scn.object_manager.unit_manager.get_player_units(p)
+    kept = []
+    removed = []
+    for unit in ulst:
+        (removed if pred(unit) else kept).append(unit)
+    if removed:
+        ulst[:] = kept
+    return removed
+
+
+def remove_units(scn: AoE2Scenario, ulst: Iterable[UnitStruct],
+                 p: Player) -> None:
+    """
+    Removes all units in ulst from the given player in the scenario.
+
+    Units are matched by identity, so the player's unit list is traversed
+    only once regardless of the number of units removed.
+    Raises a ValueError if some unit in ulst does not exist, in which case
+    no units are removed.
+    """
+    targets = {id(unit): unit for unit in ulst}
+    if not targets:
+        return
+    player_units = scn.object_manager.unit_manager.get_player_units(p)
+    kept = [unit for unit in player_units if id(unit) not in targets]
+    if len(player_units) - len(kept) != len(targets):
+        present = {id(unit) for unit in player_units}
+        missing = [u for k, u in targets.items() if k not in present]
+        raise ValueError(f'Units {missing} do not belong to player {p}.')
+    player_units[:] = kept
+
+
 def get_units_array(scn: AoE2Scenario, player: int) -> List[UnitStruct]:
     """
     Returns the array of units in scenario for the given player.